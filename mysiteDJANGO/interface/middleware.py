@@ -14,7 +14,7 @@ class GroupRedirectMiddleware(MiddlewareMixin):
         current_url_name = resolve(request.path_info).url_name
         
         # List of URLs to exclude from redirection
-        excluded_urls = ['login', 'signup', 'logout', 'admin']
+        excluded_urls = ['login', 'signup', 'logout', 'admin', 'ingest_status', 'class_query', 'class_answer', 'answer_cache_stats', 'metrics_export']
         
         if current_url_name in excluded_urls:
             return None
@@ -1,3 +1,115 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import Group, User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from transcript.models import IngestFile
+
+
+@override_settings(PIPELINE_METRICS_ENABLED=False)
+class IngestStatusTests(TestCase):
+    def setUp(self):
+        self.url = reverse('ingest_status', args=['job-1'])
+        IngestFile.objects.create(
+            job_id='job-1', file_name='syllabus.pdf', blob_name='Intro_Bio_data/Intro_Bio_PDFs/syllabus.pdf',
+            kind='pdf', stem='syllabus', size=3, stage='uploaded',
+        )
+
+    def login(self, group_name):
+        user = User.objects.create_user(username=group_name.lower(), password='pw')
+        user.groups.add(Group.objects.get_or_create(name=group_name)[0])
+        self.client.force_login(user)
+
+    def test_anonymous_is_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_student_is_refused(self):
+        self.login('Students')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @mock.patch('interface.views.AsyncResult')
+    def test_professor_sees_job_files(self, async_result):
+        async_result.return_value.state = 'PROGRESS'
+        async_result.return_value.info = {'stage': 'uploading'}
+        async_result.return_value.failed.return_value = False
+        self.login('Professors')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([f['file_name'] for f in response.json()['files']], ['syllabus.pdf'])
+
+
+@mock.patch('interface.views.metrics.render_openmetrics', return_value='# EOF\n')
+class MetricsExportTests(TestCase):
+    def setUp(self):
+        self.url = reverse('metrics_export')
+
+    @override_settings(PIPELINE_METRICS_TOKEN='')
+    def test_closed_without_token_or_login(self, render):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(PIPELINE_METRICS_TOKEN='')
+    def test_professor_session_without_token(self, render):
+        user = User.objects.create_user(username='prof', password='pw')
+        user.groups.add(Group.objects.get_or_create(name='Professors')[0])
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(PIPELINE_METRICS_TOKEN='secret')
+    def test_token_required_when_set(self, render):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class ClassQueryTests(TestCase):
+    def setUp(self):
+        self.url = reverse('class_query', args=['Intro Bio'])
+        user = User.objects.create_user(username='student', password='pw')
+        user.groups.add(Group.objects.get_or_create(name='Intro Bio')[0])
+        self.client.force_login(user)
+
+    @override_settings(RETRIEVAL_MAX_TOP_K=50)
+    @mock.patch('interface.views.retrieval.search')
+    def test_k_out_of_range_is_refused(self, search):
+        for k in ('0', '-3', '51'):
+            self.assertEqual(self.client.get(self.url, {'q': 'midterm', 'k': k}).status_code, 400)
+        search.assert_not_called()
+
+    @mock.patch('transcript.retrieval.embed_question', return_value=np.ones(8, dtype=np.float32))
+    def test_class_without_index_is_not_found(self, embed_question):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        #a fresh local store, not whatever this process built before
+        with mock.patch.dict('transcript.clients._instances', clear=True), self.settings(
+            VECTOR_STORE='local', LOCAL_VECTOR_STORE_DIR=directory, PINECONE_SHARED_INDEX='', RETRIEVAL_HYBRID=False,
+        ):
+            response = self.client.get(self.url, {'q': 'midterm'})
+        self.assertEqual(response.status_code, 404)
+
+
+class AnswerCacheStatsTests(TestCase):
+    def setUp(self):
+        self.url = reverse('answer_cache_stats', args=['Intro Bio'])
+
+    def test_anonymous_is_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_student_is_refused(self):
+        user = User.objects.create_user(username='student', password='pw')
+        user.groups.add(Group.objects.get_or_create(name='Intro Bio')[0])
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @mock.patch('interface.views.answer_cache.stats', return_value={'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'entries': 2})
+    def test_professor_sees_stats(self, stats):
+        user = User.objects.create_user(username='prof', password='pw')
+        user.groups.add(Group.objects.get_or_create(name='Professors')[0])
+        self.client.force_login(user)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['hits'], 3)
+        stats.assert_called_once_with('Intro_Bio_data')
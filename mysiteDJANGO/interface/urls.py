@@ -11,6 +11,11 @@ urlpatterns = [
     path('student/dashboard/', views.student_dashboard, name='student_dashboard'),
     path('class/select/', views.CreateMyModelView.as_view(), name='class_select'),  # URL for form submission
     path('class/<str:class_choice>/', views.class_selection, name='class_selection'),  # Define the new URL
+    path('class/<str:class_choice>/query/', views.class_query, name='class_query'),  # top-k chunks for a question
+    path('class/<str:class_choice>/answer/', views.class_answer, name='class_answer'),  # streamed answer (SSE, async)
+    path('class/<str:class_choice>/answer/cache/', views.answer_cache_stats, name='answer_cache_stats'),  # hit/miss counters
+    path('ingest/<str:job_id>/status/', views.ingest_status, name='ingest_status'),  # JSON progress for background ingest
+    path('metrics/', views.metrics_export, name='metrics_export'),  # OpenMetrics scrape of pipeline task metrics
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
 
 ]
@@ -23,26 +23,27 @@ from django.views.generic.edit import CreateView
 #django urls imports
 from django.urls import reverse_lazy
 
-#django core imports
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-
 #builtin imports
 import os
-import zipfile
-import shutil
 import csv
+import hmac
+import json
+import time
+import tempfile
 
 #misc. django imports
 from django.shortcuts import render, redirect
-from django.http import HttpResponseNotFound
-
-#import blob client
-from azure.storage.blob import BlobClient
+from django.http import HttpResponse, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
 
 #importing celery tasks
-from transcript.tasks import process_uploaded_files, documents_to_partition, whisper_transcription, upload_transcriptions, upload_partitions,create_pinecone_index, unstructured_pipeline
-from celery import chain, signature
+from transcript.tasks import ingest_class_data
+from transcript.progress import job_files
+from transcript import answer_cache, metrics, retrieval
+from transcript.clients import get_llm_provider
+from transcript.llm import build_messages, describe_source
+from transcript.vector_store import IndexNotFound
+from asgiref.sync import sync_to_async
+from celery.result import AsyncResult
 import logging
 
 #initialize logger
@@ -157,105 +158,19 @@ def upload_class_data(request):
         
         #set the folder (blob) name to the class selected
         class_name = str(Group.objects.get(id = selected_class))
-        base_azure_path = f'{class_name.replace(" ", "_")}_data'
-        
-        # Ensure 'temp' directory exists before saving the file
-        temp_dir = 'temp'
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-
-        # Save the uploaded .zip file temporarily
-        temp_zip_path = os.path.join(temp_dir, uploaded_zip.name)
-        with open(temp_zip_path, 'wb') as temp_zip:
-            for chunk in uploaded_zip.chunks():
-                temp_zip.write(chunk)
-
-        #Folder mapping, only file types specified if not in dict (misc.)
-        folder_mapping = {
-            ".pdf" : f'{class_name.replace(" ", "_")}_PDFs',
-            ".mp4" : f'{class_name.replace(" ", "_")}_MP4s',
-        }#
-
-        #blob paths for transcriptions
-        MP4_paths = []
-        PDF_paths = []
 
-        # Extract the .zip file and iterate over files
-        with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
-            zip_ref.extractall('temp_unzipped')  # Extract to a temporary location
+        #stage the zip in its own scratch directory, the ingest worker streams it into blob storage
+        os.makedirs(settings.INGEST_SCRATCH_DIR, exist_ok=True)
+        scratch_dir = tempfile.mkdtemp(prefix='ingest_', dir=settings.INGEST_SCRATCH_DIR)
+        zip_path = os.path.join(scratch_dir, os.path.basename(uploaded_zip.name))
+        with open(zip_path, 'wb') as staged_zip:
+            for chunk in uploaded_zip.chunks():
+                staged_zip.write(chunk)
 
-            for root, dirs, files in os.walk('temp_unzipped'):
-                for file_name in files:
-                    
-                    #skip that annoying _MAC_OS folder
-                    if '__MACOSX' in root:
-                        continue
-                    
-                    # Determine the relative path within the folder
-                    relative_path = os.path.relpath(os.path.join(root, file_name), 'temp_unzipped')
+        job = ingest_class_data.delay(zip_path, class_name)
+        request.session['ingest_job_id'] = job.id
 
-                    #Folder mapping by file type
-                    file_suffix = os.path.splitext(file_name)[1].lower()
-                    folder_name = folder_mapping.get(file_suffix, 'Other')
-                    
-                    #blob path storage for transcriptions
-                    if folder_name == f'{class_name.replace(" ", "_")}_MP4s':
-                        full_blob_name = f'{base_azure_path}/{folder_name}/{file_name}'
-                        MP4_paths.append(full_blob_name)
-                    
-                    #blob path storage for PDFS
-                    elif folder_name == f'{class_name.replace(" ", "_")}_PDFs':
-                        full_blob_name = f'{base_azure_path}/{folder_name}/{file_name}'
-                        PDF_paths.append(full_blob_name)
-
-                    #azure file path
-                    azure_path = os.path.join(base_azure_path, folder_name, file_name)
-
-                    #Checking if a file exists before uploading
-                    blob_name = f'{base_azure_path}/{folder_name}/{file_name}'
-                    connection_string = settings.AZURE_CONNECTION_STRING
-                    container_name = settings.AZURE_CONTAINER
-                    blob = BlobClient.from_connection_string(conn_str=connection_string,
-                                                            container_name=container_name,
-                                                            blob_name=blob_name )
-
-                    #check if current file already exists, if not upload
-                    if not blob.exists():
-
-                        # Open and read each file, then save to Azure Blob Storage
-                        with open(os.path.join(root, file_name), 'rb') as file:
-                            file_content = ContentFile(file.read())
-                            default_storage.save(azure_path, file_content)
-
-                    else:
-                        messages.error(request, f'{file_name} already exists in class data')
-
-        # Call the background task to transcribe any mp4 files
-        if MP4_paths:
-            blob_class = base_azure_path
-            transcript_chain = chain(
-                process_uploaded_files.s(blob_class, MP4_paths, PDF_paths),
-                whisper_transcription.s(),
-                upload_transcriptions.s(),
-                documents_to_partition.s(),
-                upload_partitions.s(),
-                create_pinecone_index.s(),
-                unstructured_pipeline.s()).apply_async()
-            
-        else:
-            blob_class = base_azure_path
-            data = (blob_class, MP4_paths, PDF_paths)
-            partition_chain = chain(
-                documents_to_partition.s(data),
-                upload_partitions.s(),
-                create_pinecone_index.s(),
-                unstructured_pipeline.s()).apply_async()
-            
-        # Clean up temporary files and folder after upload
-        os.remove(temp_zip_path)
-        shutil.rmtree('temp_unzipped')
-
-        messages.success(request, 'Class data folder uploaded to Azure Blob Storage successfully!')
+        messages.success(request, f'Class data folder received, ingesting in the background (job {job.id})')
         
     return class_data_form, class_select_form
 
@@ -291,9 +206,179 @@ def prof_dashboard(request):
             context["class_data_form"] = class_data_form
             context["class_select_form"] = class_select_form  
     
+    #most recent background ingest, if any
+    context['ingest_job_id'] = request.session.get('ingest_job_id')
+
     # Render the response at the end
     return render(request, 'groups/prof_dashboard.html', context)
 
+def ingest_status(request, job_id):
+    """JSON progress for a background ingest job: transfer counters plus each file's pipeline stage.
+
+    For professors and admins, who are the ones uploading class data; professors aren't scoped
+    to classes here (any of them can upload to any class), so that is the job's owner check too.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'login required'}, status=401)
+    if not request.user.groups.filter(name__in=['Professors', 'Admin']).exists():
+        return JsonResponse({'error': 'professors only'}, status=403)
+
+    result = AsyncResult(job_id)
+    meta = result.info if isinstance(result.info, dict) else {}
+    files = job_files(job_id)
+
+    if not files and result.state == 'PENDING':
+        return JsonResponse({'job_id': job_id, 'error': 'unknown job'}, status=404)
+
+    return JsonResponse({
+        'job_id': job_id,
+        'state': result.state,
+        'stage': meta.get('stage'),
+        'files_total': meta.get('files_total', len(files)),
+        'files_uploaded': meta.get('files_uploaded', 0),
+        'bytes_total': meta.get('bytes_total', 0),
+        'bytes_transferred': meta.get('bytes_transferred', 0),
+        'reused': meta.get('reused', []),
+        'existing': meta.get('existing', []),
+        'error': str(result.info) if result.failed() else None,
+        'files': files,
+        'metrics': pipeline_metrics(job_id),
+    })
+
+def pipeline_metrics(job_id):
+    """Per-task totals of the job's pipeline so far, or None when metrics are off or unreachable."""
+    if not settings.PIPELINE_METRICS_ENABLED:
+        return None
+    try:
+        return metrics.chain_summary(job_id)
+    except Exception:
+        return None
+
+def metrics_export(request):
+    """Pipeline task metrics of every worker, for a Prometheus scrape with PIPELINE_METRICS_TOKEN.
+
+    Without a token configured, only professors and admins can read them from a logged-in session.
+    """
+    token = settings.PIPELINE_METRICS_TOKEN
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    elif not request.user.groups.filter(name__in=['Professors', 'Admin']).exists():
+        return HttpResponse(status=403)
+    return HttpResponse(
+        metrics.render_openmetrics(),
+        content_type='application/openmetrics-text; version=1.0.0; charset=utf-8',
+    )
+
+def class_query(request, class_choice):
+    """JSON top-k chunks from the class index for ?q=<question>&k=<count>, for members of the class."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'login required'}, status=401)
+    if not request.user.groups.filter(name__in=[class_choice, 'Professors', 'Admin']).exists():
+        return JsonResponse({'error': 'not a member of this class'}, status=403)
+
+    question = request.GET.get('q', '').strip()
+    if not question:
+        return JsonResponse({'error': 'missing question (q)'}, status=400)
+    try:
+        top_k = int(request.GET.get('k', settings.RETRIEVAL_TOP_K))
+    except ValueError:
+        return JsonResponse({'error': 'k must be an integer'}, status=400)
+    if not 1 <= top_k <= settings.RETRIEVAL_MAX_TOP_K:
+        return JsonResponse({'error': f'k must be between 1 and {settings.RETRIEVAL_MAX_TOP_K}'}, status=400)
+
+    started = time.perf_counter()
+    try:
+        results = retrieval.search(retrieval.pipeline_class_name(class_choice), question, top_k)
+    except IndexNotFound:
+        return JsonResponse({'error': 'this class has no indexed material yet'}, status=404)
+    return JsonResponse({
+        'class': class_choice,
+        'question': question,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def class_answer(request, class_choice):
+    """Answer ?q=<question> from the class index, streamed over Server-Sent Events.
+
+    Async under ASGI, so an open chat holds no worker thread. Events: 'sources' (the retrieved
+    chunks, sent before generation starts), one 'token' per text delta, then 'done' or 'error'.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'login required'}, status=401)
+    if not await user.groups.filter(name__in=[class_choice, 'Professors', 'Admin']).aexists():
+        return JsonResponse({'error': 'not a member of this class'}, status=403)
+
+    question = request.GET.get('q', '').strip()
+    if not question:
+        return JsonResponse({'error': 'missing question (q)'}, status=400)
+
+    #embedding, cache and retrieval are blocking I/O, run them off the event loop without serializing on the sync thread
+    class_name = retrieval.pipeline_class_name(class_choice)
+    vector = await sync_to_async(retrieval.embed_question, thread_sensitive=False)(question)
+    cached = None
+    if settings.ANSWER_CACHE_ENABLED:
+        try:
+            cached = await sync_to_async(answer_cache.lookup, thread_sensitive=False)(class_name, vector)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed for {class_name}: {e}")
+
+    if cached:
+        async def events():
+            #a near-identical question was answered already, replay it
+            yield sse_event('sources', cached['sources'])
+            yield sse_event('token', {'text': cached['answer']})
+            yield sse_event('done', {'cached': True})
+    else:
+        results = await sync_to_async(retrieval.search, thread_sensitive=False)(class_name, question, vector=vector)
+        provider = get_llm_provider()
+        sources = [
+            {'rank': rank, 'score': result['score'], 'label': describe_source(result['source']), **result['source']}
+            for rank, result in enumerate(results, start=1)
+        ]
+
+        async def events():
+            yield sse_event('sources', sources)
+            tokens = []
+            try:
+                async for token in provider.stream(build_messages(question, results)):
+                    tokens.append(token)
+                    yield sse_event('token', {'text': token})
+            except Exception as e:
+                logger.error(f"Answer generation failed for {class_choice}: {e}", exc_info=True)
+                yield sse_event('error', {'error': 'answer generation failed'})
+                return
+            yield sse_event('done', {'cached': False})
+
+            if settings.ANSWER_CACHE_ENABLED:
+                try:
+                    await sync_to_async(answer_cache.store, thread_sensitive=False)(
+                        class_name, question, vector, ''.join(tokens), sources
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not cache answer for {class_name}: {e}")
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+def answer_cache_stats(request, class_choice):
+    """JSON hit/miss counters of a class's answer cache, for professors and admins."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'login required'}, status=401)
+    if not request.user.groups.filter(name__in=['Professors', 'Admin']).exists():
+        return JsonResponse({'error': 'professors only'}, status=403)
+    stats = answer_cache.stats(retrieval.pipeline_class_name(class_choice))
+    return JsonResponse({'class': class_choice, **stats})
+
 def student_dashboard(request):
     if request.method == 'POST':
         form = SelectClassForm(request.POST)
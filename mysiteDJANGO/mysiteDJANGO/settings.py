@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "accounts",
     "interface",
+    "transcript",
     "files",
     "storages",
     "background_task",
@@ -174,4 +175,117 @@ PINECONE_API_KEY = env('PINECONE_API_KEY')
 UNSTRUCTURED_API_KEY = env('UNSTRUCTURED_API_KEY')
 UNSTRUCTURED_URL = env('UNSTRUCTURED_URL')
 OPENAI_API_KEY = env("OPENAI_API_KEY")
-AZURE_SAS_TOKEN = env("AZURE_SAS_TOKEN")
\ No newline at end of file
+AZURE_SAS_TOKEN = env("AZURE_SAS_TOKEN")
+
+#audio extraction mode, 'stream' demuxes blobs straight to 16 kHz PCM, 'moviepy' downloads and re-encodes to mp3
+AUDIO_EXTRACTION_MODE = env('AUDIO_EXTRACTION_MODE', default='stream')
+
+#batched whisper engine, number of 30 s speech windows per encoder pass
+TRANSCRIPTION_BATCH_SIZE = env.int('TRANSCRIPTION_BATCH_SIZE', default=8)
+TRANSCRIPTION_LANGUAGE = env('TRANSCRIPTION_LANGUAGE', default='en')
+
+#videos per extract -> transcribe chain: 1 (the default) keeps one chain per video, so a failure or retry touches one
+#video; more packs short clips into fuller whisper batches at the cost of retrying the whole group together
+TRANSCRIPTION_FILES_PER_TASK = env.int('TRANSCRIPTION_FILES_PER_TASK', default=1)
+
+#transcription backend: 'openai-whisper' (fp32) or 'faster-whisper' (CTranslate2, int8 on CPU by default)
+TRANSCRIPTION_BACKEND = env('TRANSCRIPTION_BACKEND', default='openai-whisper')
+TRANSCRIPTION_MODEL = env('TRANSCRIPTION_MODEL', default='base')
+TRANSCRIPTION_COMPUTE_TYPE = env('TRANSCRIPTION_COMPUTE_TYPE', default='')
+
+#per-job scratch space for uploaded zips, must be visible to the celery workers running ingest_class_data
+INGEST_SCRATCH_DIR = env('INGEST_SCRATCH_DIR', default=str(BASE_DIR / 'temp' / 'ingest'))
+
+#blob transfer layer: files moved at once per task, and parallel blocks per large blob
+BLOB_TRANSFER_WORKERS = env.int('BLOB_TRANSFER_WORKERS', default=8)
+BLOB_BLOCK_CONCURRENCY = env.int('BLOB_BLOCK_CONCURRENCY', default=4)
+
+#pages per unstructured partition run; documents are packed into balanced batches under this quota
+UNSTRUCTURED_PAGE_QUOTA = env.int('UNSTRUCTURED_PAGE_QUOTA', default=1000)
+
+#vector writes: pinecone caps requests at 2MB, about 30 text-embedding-3-large vectors with metadata
+VECTOR_UPSERT_BATCH_SIZE = env.int('VECTOR_UPSERT_BATCH_SIZE', default=30)
+VECTOR_WRITE_WORKERS = env.int('VECTOR_WRITE_WORKERS', default=4)
+#one ledger sync per class at a time; the redis lock expires after (and waiters give up after) this long
+LEDGER_LOCK_REDIS_URL = env('LEDGER_LOCK_REDIS_URL', default=CELERY_BROKER_URL)
+LEDGER_LOCK_TIMEOUT_S = env.int('LEDGER_LOCK_TIMEOUT_S', default=60 * 60)
+#write each class into its own namespace, so one index can host many classes
+PINECONE_NAMESPACE_PER_CLASS = env.bool('PINECONE_NAMESPACE_PER_CLASS', default=False)
+#one index for every class, each class in its own namespace; create it once with manage.py bootstrap_vector_index
+PINECONE_SHARED_INDEX = env('PINECONE_SHARED_INDEX', default='')
+
+#vector store: 'pinecone' (hosted) or 'local' (IVF index over memory-mapped arrays, one directory per index)
+VECTOR_STORE = env('VECTOR_STORE', default='pinecone')
+LOCAL_VECTOR_STORE_DIR = env('LOCAL_VECTOR_STORE_DIR', default=str(BASE_DIR / 'temp' / 'vector_store'))
+#how the local store keeps vectors: 'float32', 'float16', 'int8' (scalar quantized) or 'pq' (product quantized,
+#one byte per LOCAL_VECTOR_STORE_PQ_SUBSPACES slice, 0 = dimension / 8)
+LOCAL_VECTOR_STORE_CODEC = env('LOCAL_VECTOR_STORE_CODEC', default='float16')
+LOCAL_VECTOR_STORE_PQ_SUBSPACES = env.int('LOCAL_VECTOR_STORE_PQ_SUBSPACES', default=0)
+#lossy codecs rerank RERANK x top_k candidates exactly against a float16 copy of every vector, which takes
+#more disk than the codes save; 0 keeps no copy (check the trade with manage.py evaluate_vector_compression)
+LOCAL_VECTOR_STORE_RERANK = env.int('LOCAL_VECTOR_STORE_RERANK', default=0)
+#IVF lists scanned per query; more is slower with better recall (check with manage.py benchmark_vector_store)
+LOCAL_VECTOR_STORE_NPROBE = env.int('LOCAL_VECTOR_STORE_NPROBE', default=8)
+#buffered writes folded into the lists once a namespace has this many (or as many as it holds)
+LOCAL_VECTOR_STORE_COMPACT_AFTER = env.int('LOCAL_VECTOR_STORE_COMPACT_AFTER', default=1000)
+
+#chunk embedder: 'openai' (hosted), 'onnx' (local model directory with model.onnx + tokenizer.json, CPU)
+#or 'hashing' (no model, for offline runs); the vector index dimension follows it
+EMBEDDING_BACKEND = env('EMBEDDING_BACKEND', default='openai')
+EMBEDDING_MODEL = env('EMBEDDING_MODEL', default='text-embedding-3-large')
+EMBEDDING_DIMENSION = env.int('EMBEDDING_DIMENSION', default=0)
+EMBEDDING_BATCH_SIZE = env.int('EMBEDDING_BATCH_SIZE', default=64)
+
+#embedding cache keyed by (embedder, normalized chunk text): 'disk' (sqlite per host), 'redis' or '' to disable
+EMBEDDING_CACHE = env('EMBEDDING_CACHE', default='disk')
+EMBEDDING_CACHE_DIR = env('EMBEDDING_CACHE_DIR', default=str(BASE_DIR / 'temp' / 'embedding_cache'))
+EMBEDDING_CACHE_REDIS_URL = env('EMBEDDING_CACHE_REDIS_URL', default=CELERY_BROKER_URL)
+EMBEDDING_CACHE_MAX_MB = env.int('EMBEDDING_CACHE_MAX_MB', default=512)
+EMBEDDING_CACHE_DTYPE = env('EMBEDDING_CACHE_DTYPE', default='float16')
+
+#partition transcripts and text-layer pdfs in-process; only scans and layout-heavy pdfs go to the unstructured API
+LOCAL_PARTITIONING = env.bool('LOCAL_PARTITIONING', default=True)
+LOCAL_CHUNK_SIMILARITY_THRESHOLD = env.float('LOCAL_CHUNK_SIMILARITY_THRESHOLD', default=0.5)
+#sentence embeddings that drive similarity merging; by default the (cached) chunk embedder itself,
+#'hashing' only as an explicit offline fallback, its vectors carry too little meaning to merge on
+LOCAL_CHUNK_EMBEDDING_BACKEND = env('LOCAL_CHUNK_EMBEDDING_BACKEND', default=EMBEDDING_BACKEND)
+LOCAL_CHUNK_EMBEDDING_MODEL = env('LOCAL_CHUNK_EMBEDDING_MODEL', default='')
+
+#question answering retrieval: default/maximum chunks per query, latency budget checked by benchmark_retrieval
+RETRIEVAL_TOP_K = env.int('RETRIEVAL_TOP_K', default=5)
+RETRIEVAL_MAX_TOP_K = env.int('RETRIEVAL_MAX_TOP_K', default=50)
+RETRIEVAL_P95_BUDGET_MS = env.int('RETRIEVAL_P95_BUDGET_MS', default=300)
+#build the embedder and index connection when a web process starts instead of on the first question
+RETRIEVAL_WARM_UP = env.bool('RETRIEVAL_WARM_UP', default=False)
+PINECONE_POOL_THREADS = env.int('PINECONE_POOL_THREADS', default=4)
+
+#hybrid retrieval: fuse vector and BM25 rankings by reciprocal rank; candidates taken from each side
+RETRIEVAL_HYBRID = env.bool('RETRIEVAL_HYBRID', default=True)
+RETRIEVAL_FUSION_CANDIDATES = env.int('RETRIEVAL_FUSION_CANDIDATES', default=20)
+RRF_K = env.int('RRF_K', default=60)
+#local copies of the per-class lexical indexes (memory-mapped), and how often to look for a newer build
+LEXICAL_INDEX_DIR = env('LEXICAL_INDEX_DIR', default=str(BASE_DIR / 'temp' / 'lexical_index'))
+LEXICAL_REFRESH_S = env.int('LEXICAL_REFRESH_S', default=60)
+
+#answer generation for the streamed chat endpoint: 'openai' or 'stub' (local, deterministic, for tests)
+LLM_PROVIDER = env('LLM_PROVIDER', default='openai')
+LLM_MODEL = env('LLM_MODEL', default='gpt-4o-mini')
+LLM_MAX_TOKENS = env.int('LLM_MAX_TOKENS', default=512)
+LLM_TEMPERATURE = env.float('LLM_TEMPERATURE', default=0.2)
+LLM_STUB_DELAY_MS = env.int('LLM_STUB_DELAY_MS', default=0)
+
+#semantic cache of answers per class, in the broker's redis; cleared whenever the class index changes
+ANSWER_CACHE_ENABLED = env.bool('ANSWER_CACHE_ENABLED', default=True)
+ANSWER_CACHE_REDIS_URL = env('ANSWER_CACHE_REDIS_URL', default=CELERY_BROKER_URL)
+ANSWER_CACHE_THRESHOLD = env.float('ANSWER_CACHE_THRESHOLD', default=0.95)
+ANSWER_CACHE_TTL_S = env.int('ANSWER_CACHE_TTL_S', default=24 * 60 * 60)
+ANSWER_CACHE_MAX_ENTRIES = env.int('ANSWER_CACHE_MAX_ENTRIES', default=1000)
+
+#per-task pipeline metrics, summed in redis and served at /metrics in OpenMetrics format
+PIPELINE_METRICS_ENABLED = env.bool('PIPELINE_METRICS_ENABLED', default=True)
+PIPELINE_METRICS_REDIS_URL = env('PIPELINE_METRICS_REDIS_URL', default=CELERY_BROKER_URL)
+#how long each task's and chain's records are kept, and how many recent chains get their own chain_id series
+PIPELINE_METRICS_RETENTION_S = env.int('PIPELINE_METRICS_RETENTION_S', default=7 * 24 * 60 * 60)
+PIPELINE_METRICS_RECENT_CHAINS = env.int('PIPELINE_METRICS_RECENT_CHAINS', default=50)
+#bearer token the scraper must send to /metrics; without one only logged-in professors and admins can read it
+PIPELINE_METRICS_TOKEN = env('PIPELINE_METRICS_TOKEN', default='')
@@ -0,0 +1,177 @@
+#per-class semantic cache of generated answers, kept in the broker's redis
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from transcript.clients import get_redis
+from transcript.embedding_cache import normalize_text
+
+#logging for the answer cache
+logger = logging.getLogger(__name__)
+
+#question vectors of a class, mirrored in-process and caught up from the class's change log
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+#change log entries kept per class; a mirror further behind than this reloads every vector
+LOG_LENGTH = 10000
+
+
+class _Mirror:
+    """A process's copy of a class's question vectors, as of change log entry last (None: no log yet)."""
+
+    def __init__(self, last, vectors):
+        self.last = last
+        self.vectors = vectors
+        self.ids = list(vectors)
+        self.matrix = np.stack(list(vectors.values())) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def _key(class_name, part):
+    return f"answer_cache:{class_name}:{part}"
+
+
+def _redis():
+    return get_redis(settings.ANSWER_CACHE_REDIS_URL)
+
+
+def _decode(vector):
+    return np.frombuffer(vector, dtype=np.float16).astype(np.float32)
+
+
+def _load(redis, class_name):
+    """Every vector of the class; the log position is read first, so writes in between are replayed later."""
+    newest = redis.xrevrange(_key(class_name, "log"), count=1)
+    stored = redis.hgetall(_key(class_name, "vectors"))
+    return _Mirror(newest[0][0] if newest else None, {entry_id.decode(): _decode(vector) for entry_id, vector in stored.items()})
+
+
+def _catch_up(redis, class_name, mirror):
+    """Apply the log entries written since the mirror's position; None if they were trimmed or the log reset."""
+    entries = redis.xrange(_key(class_name, "log"), min=mirror.last, max="+")
+    if not entries or entries[0][0] != mirror.last:
+        return None
+    if len(entries) == 1:
+        return mirror
+
+    vectors = dict(mirror.vectors)
+    added = {}
+    for _, fields in entries[1:]:
+        for entry_id in fields[b"ids"].decode().split(","):
+            if fields[b"op"] == b"add":
+                added[entry_id] = True
+            else:
+                vectors.pop(entry_id, None)
+                added.pop(entry_id, None)
+    #only the new vectors cross the network; an id removed since is simply missing
+    if added:
+        added = list(added)
+        for entry_id, vector in zip(added, redis.hmget(_key(class_name, "vectors"), added)):
+            if vector is not None:
+                vectors[entry_id] = _decode(vector)
+    return _Mirror(entries[-1][0], vectors)
+
+
+def _question_vectors(redis, class_name):
+    """(ids, matrix) of the class's cached questions, from the local mirror brought up to date."""
+    with _mirrors_lock:
+        mirror = _mirrors.get(class_name)
+    updated = _catch_up(redis, class_name, mirror) if mirror and mirror.last else None
+    if updated is None:
+        updated = _load(redis, class_name)
+    if updated is not mirror:
+        with _mirrors_lock:
+            _mirrors[class_name] = updated
+    return updated.ids, updated.matrix
+
+
+def _log(pipeline, class_name, op, entry_ids):
+    pipeline.xadd(_key(class_name, "log"), {"op": op, "ids": ",".join(entry_ids)}, maxlen=LOG_LENGTH, approximate=True)
+
+
+def lookup(class_name, vector):
+    """The cached answer to the most similar earlier question, if it clears the threshold and hasn't expired."""
+    redis = _redis()
+    ids, matrix = _question_vectors(redis, class_name)
+
+    entry = None
+    if ids and matrix.shape[1] == len(vector):
+        similarities = matrix @ np.asarray(vector, dtype=np.float32)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= settings.ANSWER_CACHE_THRESHOLD:
+            data = redis.get(_key(class_name, f"answer:{ids[best]}"))
+            if data is None:
+                #expired by TTL, drop its vector too
+                _remove(redis, class_name, [ids[best]])
+            else:
+                entry = json.loads(data)
+                redis.zadd(_key(class_name, "lru"), {ids[best]: time.time()})
+
+    redis.incr(_key(class_name, "hits" if entry else "misses"))
+    return entry
+
+
+def store(class_name, question, vector, answer, sources):
+    """Cache an answer under its question's vector.
+
+    Vectors of answers past their TTL are purged, then the least recently used entries past the size bound.
+    """
+    redis = _redis()
+    entry_id = hashlib.sha256(normalize_text(question).lower().encode()).hexdigest()[:16]
+    entry = {"question": question, "answer": answer, "sources": sources}
+    now = time.time()
+
+    pipeline = redis.pipeline()
+    pipeline.hset(_key(class_name, "vectors"), entry_id, np.asarray(vector, dtype=np.float16).tobytes())
+    pipeline.set(_key(class_name, f"answer:{entry_id}"), json.dumps(entry), ex=settings.ANSWER_CACHE_TTL_S)
+    pipeline.zadd(_key(class_name, "lru"), {entry_id: now})
+    pipeline.zadd(_key(class_name, "expires"), {entry_id: now + settings.ANSWER_CACHE_TTL_S})
+    _log(pipeline, class_name, "add", [entry_id])
+    pipeline.execute()
+
+    expired = [entry_id.decode() for entry_id in redis.zrangebyscore(_key(class_name, "expires"), 0, now)]
+    _remove(redis, class_name, expired)
+
+    overflow = redis.zcard(_key(class_name, "lru")) - settings.ANSWER_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        oldest = [entry_id.decode() for entry_id, _ in redis.zpopmin(_key(class_name, "lru"), overflow)]
+        _remove(redis, class_name, oldest)
+
+
+def _remove(redis, class_name, entry_ids):
+    if not entry_ids:
+        return
+    pipeline = redis.pipeline()
+    pipeline.hdel(_key(class_name, "vectors"), *entry_ids)
+    pipeline.zrem(_key(class_name, "lru"), *entry_ids)
+    pipeline.zrem(_key(class_name, "expires"), *entry_ids)
+    pipeline.delete(*[_key(class_name, f"answer:{entry_id}") for entry_id in entry_ids])
+    _log(pipeline, class_name, "remove", entry_ids)
+    pipeline.execute()
+
+
+def invalidate(class_name):
+    """Forget every cached answer of a class, e.g. after its index gained or lost vectors."""
+    redis = _redis()
+    entry_ids = [entry_id.decode() for entry_id in redis.hkeys(_key(class_name, "vectors"))]
+    _remove(redis, class_name, entry_ids)
+    #mirrors no longer find their position in the log and reload
+    redis.delete(_key(class_name, "vectors"), _key(class_name, "lru"), _key(class_name, "expires"), _key(class_name, "log"))
+    logger.info(f"Invalidated {len(entry_ids)} cached answers for {class_name}")
+
+
+def stats(class_name):
+    redis = _redis()
+    hits = int(redis.get(_key(class_name, "hits")) or 0)
+    misses = int(redis.get(_key(class_name, "misses")) or 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "entries": redis.hlen(_key(class_name, "vectors")),
+    }
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class TranscriptConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "transcript"
+
+    def ready(self):
+        from django.conf import settings
+
+        #web processes that serve questions build the embedder and index connection before the first one
+        if settings.RETRIEVAL_WARM_UP:
+            from transcript.retrieval import warm_up_in_background
+            warm_up_in_background()
@@ -0,0 +1,111 @@
+#streaming audio extraction for lecture videos
+import logging
+import struct
+import subprocess
+
+import numpy as np
+from imageio_ffmpeg import get_ffmpeg_exe
+
+from transcript import metrics
+
+#logging for audio extraction
+logger = logging.getLogger(__name__)
+
+#whisper consumes 16 kHz mono 16-bit PCM
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
+def is_streamable(blob_client, blob_size):
+    """Walk the top-level MP4 boxes with ranged reads; True if 'moov' precedes 'mdat'."""
+    offset = 0
+    while offset + 8 <= blob_size:
+        header = blob_client.download_blob(offset=offset, length=min(16, blob_size - offset)).readall()
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+
+        #64-bit box size lives right after the type, size 0 runs to end of file
+        if box_size == 1 and len(header) >= 16:
+            box_size = struct.unpack(">Q", header[8:16])[0]
+        elif box_size == 0:
+            box_size = blob_size - offset
+
+        if box_type == b"moov":
+            return True
+        if box_type == b"mdat" or box_size < 8:
+            return False
+        offset += box_size
+    return False
+
+
+def _output_args(output_path):
+    return [
+        "-vn",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-acodec", "pcm_s16le",
+        "-f", "s16le",
+        "-y", output_path,
+    ]
+
+
+def extract_audio(blob_client, output_path, sas_token=None):
+    """Demux the audio track of a video blob straight into raw 16 kHz mono PCM at output_path.
+
+    Fast-start MP4s are piped into ffmpeg one ranged chunk at a time; files with the
+    index at the end are handed to ffmpeg as a signed URL so it can seek with its own
+    range requests. Either way the video is never held in memory or written to disk.
+    """
+    ffmpeg = get_ffmpeg_exe()
+    blob_size = blob_client.get_blob_properties().size
+    metrics.record(bytes_in=blob_size)
+
+    if is_streamable(blob_client, blob_size):
+        logger.info(f"Streaming {blob_client.blob_name} into ffmpeg ({blob_size} bytes)")
+        command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *_output_args(output_path)]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for chunk in blob_client.download_blob().chunks():
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            #ffmpeg exited early, the return code below carries the reason
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        stderr = process.stderr.read()
+        process.wait()
+    else:
+        if not sas_token:
+            raise ValueError(f"{blob_client.blob_name} is not fast-start and no SAS token was given")
+        logger.info(f"Seeking {blob_client.blob_name} over ranged HTTP reads ({blob_size} bytes)")
+        source_url = f"{blob_client.url}?{sas_token.lstrip('?')}"
+        command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-i", source_url, *_output_args(output_path)]
+        process = subprocess.run(command, stderr=subprocess.PIPE)
+        stderr = process.stderr
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed for {blob_client.blob_name}: {stderr.decode(errors='replace').strip()}")
+    return output_path
+
+
+def load_pcm(path):
+    """Load raw s16le PCM written by extract_audio as the float32 array whisper expects."""
+    return np.fromfile(path, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def open_audio(path):
+    """Open extracted audio for random access; raw PCM is memory-mapped instead of loaded."""
+    if path.endswith(".pcm"):
+        return np.memmap(path, dtype=np.int16, mode="r")
+
+    #legacy mp3 path decodes through whisper's ffmpeg loader
+    import whisper
+    return whisper.load_audio(path)
+
+
+def to_float(samples):
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return np.asarray(samples, dtype=np.float32)
@@ -0,0 +1,117 @@
+#pluggable transcription backends behind whisper_transcription
+import logging
+import os
+
+from django.conf import settings
+
+from transcript.audio import open_audio, to_float
+
+#logging for transcription backends
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBackend:
+    """Common interface: transcribe_many(paths) -> {path: {"text", "segments"}}."""
+
+    engine = None
+    default_compute_type = None
+
+    def __init__(self, model_size, compute_type=None, batch_size=8, language="en"):
+        self.model_size = model_size
+        self.compute_type = compute_type or self.default_compute_type
+        self.batch_size = batch_size
+        self.language = language
+
+    @property
+    def descriptor(self):
+        """What produced a transcript, stored with it so results are reproducible."""
+        return {
+            "engine": self.engine,
+            "model": self.model_size,
+            "compute_type": self.compute_type,
+        }
+
+    def transcribe_many(self, paths):
+        raise NotImplementedError
+
+    def transcribe(self, path):
+        return self.transcribe_many([path])[path]
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """openai-whisper in fp32 on CPU, driven by the batched VAD engine."""
+
+    engine = "openai-whisper"
+    default_compute_type = "float32"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import whisper
+        from transcript.engine import BatchedWhisperEngine
+
+        self.model = whisper.load_model(self.model_size, device="cpu")
+        self.batched_engine = BatchedWhisperEngine(self.model, batch_size=self.batch_size, language=self.language)
+
+    def transcribe_many(self, paths):
+        return self.batched_engine.transcribe_many(paths)
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 runtime via faster-whisper, int8-quantized on CPU by default."""
+
+    engine = "faster-whisper"
+    default_compute_type = "int8"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            from faster_whisper import BatchedInferencePipeline, WhisperModel
+        except ImportError as e:
+            raise ImportError("TRANSCRIPTION_BACKEND='faster-whisper' requires the faster-whisper package") from e
+
+        model = WhisperModel(
+            self.model_size,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=os.cpu_count() or 0,
+        )
+        #batched pipeline does its own VAD windowing before batching encoder passes
+        self.pipeline = BatchedInferencePipeline(model=model)
+
+    def transcribe_many(self, paths):
+        results = {}
+        for path in paths:
+            audio = to_float(open_audio(path))
+            #the batched pipeline defaults to one segment per vad chunk, ask for real segment timestamps
+            segments, _ = self.pipeline.transcribe(
+                audio, batch_size=self.batch_size, language=self.language, without_timestamps=False
+            )
+            segments = [(segment.start, segment.end, segment.text.strip()) for segment in segments if segment.text.strip()]
+            results[path] = {
+                "text": " ".join(text for _, _, text in segments),
+                "segments": segments,
+            }
+        return results
+
+
+BACKENDS = {
+    OpenAIWhisperBackend.engine: OpenAIWhisperBackend,
+    FasterWhisperBackend.engine: FasterWhisperBackend,
+}
+
+
+def get_backend():
+    """Build the transcription backend selected in settings."""
+    try:
+        backend_class = BACKENDS[settings.TRANSCRIPTION_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown TRANSCRIPTION_BACKEND {settings.TRANSCRIPTION_BACKEND!r}, choose from {sorted(BACKENDS)}")
+
+    backend = backend_class(
+        settings.TRANSCRIPTION_MODEL,
+        compute_type=settings.TRANSCRIPTION_COMPUTE_TYPE or None,
+        batch_size=settings.TRANSCRIPTION_BATCH_SIZE,
+        language=settings.TRANSCRIPTION_LANGUAGE,
+    )
+    logger.info(f"Loaded transcription backend {backend.descriptor}")
+    return backend
@@ -0,0 +1,176 @@
+#local, in-process partitioning and similarity chunking for transcripts and text-layer pdfs
+import hashlib
+import logging
+import os
+import re
+
+import numpy as np
+
+from transcript.partitions import BlobRangeReader
+
+#logging for local chunking
+logger = logging.getLogger(__name__)
+
+#pages sampled, and text they must average, for a pdf to count as having a usable text layer
+TEXT_LAYER_SAMPLE_PAGES = 3
+TEXT_LAYER_MIN_CHARS = 200
+
+#sentence ends followed by whitespace and something that can start a sentence
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+
+FILETYPES = {
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+}
+
+
+def cut_text(text, max_characters):
+    """Pieces of text of at most max_characters, cut at the last space that fits (mid-word if none does)."""
+    pieces = []
+    while len(text) > max_characters:
+        cut = text.rfind(" ", 0, max_characters)
+        cut = cut if cut > 0 else max_characters
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def split_sentences(text, max_characters):
+    """Split text into sentences on punctuation and blank lines; overlong sentences are cut at spaces."""
+    sentences = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            sentences.extend(cut_text(sentence, max_characters))
+    return sentences
+
+
+def split_segment(start, end, text, max_characters):
+    """Cut an overlong transcript segment into pieces that fit a chunk, sharing its time range by length."""
+    pieces = cut_text(text, max_characters)
+    total = sum(map(len, pieces))
+    segments, done = [], 0
+    for piece in pieces:
+        piece_start = start + (end - start) * done / total
+        done += len(piece)
+        segments.append((piece_start, start + (end - start) * done / total, piece))
+    return segments
+
+
+def chunk_spans(texts, vectors, similarity_threshold, max_characters, new_after_n_chars,
+                combine_under_n_chars, overlap):
+    """Group consecutive units (sentences or transcript segments) into chunks while they stay on topic.
+
+    A unit joins the current chunk unless that would pass max_characters, the chunk is already
+    past new_after_n_chars, or (once the chunk has combine_under_n_chars) its cosine similarity
+    to the chunk's mean embedding drops below similarity_threshold. vectors are the L2-normalized
+    unit embeddings. Each new chunk repeats trailing units of the previous one, up to overlap
+    characters. Returns inclusive (first, last) unit index spans.
+    """
+    spans = []
+    first, centroid = 0, None
+
+    for index, (text, vector) in enumerate(zip(texts, vectors)):
+        if index > first:
+            length = len(" ".join(texts[first:index]))
+            #a chunk holding only the previous chunk's overlap has no topic yet
+            similarity = 1.0 if centroid is None else float(centroid @ vector / max(np.linalg.norm(centroid), 1e-12))
+            if (length + 1 + len(text) > max_characters
+                    or length >= new_after_n_chars
+                    or (length >= combine_under_n_chars and similarity < similarity_threshold)):
+                spans.append((first, index - 1))
+                first, centroid = index, None
+                while (first - 1 > spans[-1][0]
+                       and len(" ".join(texts[first - 1:index])) <= overlap
+                       and len(" ".join(texts[first - 1:index + 1])) <= max_characters):
+                    first -= 1
+
+        centroid = vector.copy() if centroid is None else centroid + vector
+
+    if len(texts) > first:
+        spans.append((first, len(texts) - 1))
+    return spans
+
+
+def page_texts(path):
+    """(page number, text) for every page of a text-layer pdf, or the whole file as page 1."""
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        return [(number, page.extract_text() or "") for number, page in enumerate(PdfReader(path).pages, start=1)]
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [(1, f.read())]
+
+
+def has_text_layer(blob_client, size):
+    """Whether a pdf blob has extractable text, from a few sample pages read through ranged GETs."""
+    from pypdf import PdfReader
+
+    pages = PdfReader(BlobRangeReader(blob_client, size)).pages
+    sample = [pages[number] for number in range(min(TEXT_LAYER_SAMPLE_PAGES, len(pages)))]
+    if not sample:
+        return False
+    characters = sum(len((page.extract_text() or "").strip()) for page in sample)
+    return characters / len(sample) >= TEXT_LAYER_MIN_CHARS
+
+
+def _element(filename, index, text, metadata):
+    element_id = hashlib.sha256(f"{filename}\0{index}\0{text}".encode()).hexdigest()[:32]
+    return {"type": "CompositeElement", "element_id": element_id, "text": text, "metadata": metadata}
+
+
+def partition_document(path, filename, sentence_embedder, similarity_threshold=0.5, max_characters=1000,
+                       new_after_n_chars=750, combine_under_n_chars=250, overlap=100):
+    """Chunk a local transcript or text-layer pdf into unstructured-style CompositeElement dicts."""
+    filetype = FILETYPES.get(os.path.splitext(filename)[1].lower(), "text/plain")
+    elements = []
+    for page_number, text in page_texts(path):
+        sentences = split_sentences(text, max_characters)
+        if not sentences:
+            continue
+        spans = chunk_spans(
+            sentences, sentence_embedder.embed(sentences), similarity_threshold, max_characters,
+            new_after_n_chars, combine_under_n_chars, overlap,
+        )
+        for first, last in spans:
+            chunk = " ".join(sentences[first:last + 1])
+            metadata = {"filename": filename, "filetype": filetype, "page_number": page_number}
+            elements.append(_element(filename, len(elements), chunk, metadata))
+    return elements
+
+
+def partition_segments(segments, filename, video, sentence_embedder, similarity_threshold=0.5,
+                       max_characters=1000, new_after_n_chars=750, combine_under_n_chars=250, overlap=100):
+    """Chunk timestamped transcript segments on segment boundaries; each chunk carries its time range.
+
+    A segment longer than max_characters (whisper without timestamps gives one per window) is cut
+    into pieces first, with times interpolated by length.
+    """
+    segments = [
+        piece
+        for start, end, text in segments if text.strip()
+        for piece in split_segment(start, end, " ".join(text.split()), max_characters)
+    ]
+    if not segments:
+        return []
+
+    texts = [text for _, _, text in segments]
+    spans = chunk_spans(
+        texts, sentence_embedder.embed(texts), similarity_threshold, max_characters,
+        new_after_n_chars, combine_under_n_chars, overlap,
+    )
+    elements = []
+    for first, last in spans:
+        chunk = " ".join(texts[first:last + 1])
+        metadata = {
+            "filename": filename,
+            "filetype": "text/plain",
+            "video": video,
+            "start_s": segments[first][0],
+            "end_s": segments[last][1],
+        }
+        elements.append(_element(filename, len(elements), chunk, metadata))
+    return elements
@@ -0,0 +1,122 @@
+#lazily initialized, per-process clients for the pipeline's heavy resources
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+#logging for client initialization
+logger = logging.getLogger(__name__)
+
+_instances = {}
+#reentrant, a factory may build another resource (an index handle needs its vector store)
+_lock = threading.RLock()
+
+
+def _singleton(name, factory):
+    """Build a resource on first use in this process; forked celery children build their own."""
+    key = (name, os.getpid())
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                logger.info(f"Initializing {name} in process {os.getpid()}")
+                instance = _instances[key] = factory()
+    return instance
+
+
+#transfers are split into blocks of this size, so streamed uploads never buffer a whole file
+BLOB_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def _blob_service_client():
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(
+        settings.AZURE_CONNECTION_STRING,
+        max_block_size=BLOB_BLOCK_SIZE,
+        max_single_put_size=BLOB_BLOCK_SIZE,
+    )
+
+
+def _pinecone():
+    from pinecone import Pinecone
+    return Pinecone(api_key=settings.PINECONE_API_KEY, pool_threads=settings.PINECONE_POOL_THREADS)
+
+
+def _transcription_backend():
+    from transcript.backends import get_backend
+    return get_backend()
+
+
+def _embedder():
+    from transcript.embedders import embedder_key, get_embedder
+    from transcript.embedding_cache import CachedEmbedder, get_cache
+
+    embedder = get_embedder()
+    cache = get_cache()
+    return CachedEmbedder(embedder, cache, embedder_key()) if cache else embedder
+
+
+def _sentence_embedder():
+    from transcript.embedders import EMBEDDERS
+
+    #only used to compare neighbouring sentences while chunking, a small local model (onnx) is enough
+    embedder_class = EMBEDDERS[settings.LOCAL_CHUNK_EMBEDDING_BACKEND]
+    return embedder_class(settings.LOCAL_CHUNK_EMBEDDING_MODEL, batch_size=settings.EMBEDDING_BATCH_SIZE)
+
+
+def _vector_store():
+    from transcript.vector_store import get_store
+    return get_store()
+
+
+def _llm_provider():
+    from transcript.llm import get_provider
+    return get_provider()
+
+
+def get_blob_service_client():
+    return _singleton("blob service client", _blob_service_client)
+
+
+def get_container_client():
+    return get_blob_service_client().get_container_client(settings.AZURE_CONTAINER)
+
+
+def get_pinecone():
+    return _singleton("pinecone client", _pinecone)
+
+
+def get_transcription_backend():
+    return _singleton("transcription backend", _transcription_backend)
+
+
+def get_embedder():
+    return _singleton("embedder", _embedder)
+
+
+def get_sentence_embedder():
+    if settings.LOCAL_CHUNK_EMBEDDING_BACKEND == settings.EMBEDDING_BACKEND:
+        return get_embedder()
+    return _singleton("sentence embedder", _sentence_embedder)
+
+
+def get_vector_store():
+    return _singleton("vector store", _vector_store)
+
+
+def get_index(index_name):
+    """One index handle per name and process, so queries reuse its HTTP pool or memory-mapped files."""
+    return _singleton(f"vector index {index_name}", lambda: get_vector_store().index(index_name))
+
+
+def get_llm_provider():
+    return _singleton("llm provider", _llm_provider)
+
+
+def get_redis(url):
+    def connect():
+        import redis
+        return redis.Redis.from_url(url)
+    return _singleton(f"redis {url}", connect)
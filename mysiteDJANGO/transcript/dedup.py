@@ -0,0 +1,125 @@
+#content-addressed index so re-uploaded or renamed files reuse earlier pipeline outputs
+import hashlib
+import json
+import logging
+import os
+
+from transcript.embedders import embedder_key
+from transcript.models import ContentLink, ContentRecord
+from transcript.transfer import upload_from_file
+
+#logging for the content index
+logger = logging.getLogger(__name__)
+
+#cached embedded chunks live next to the data, keyed by content hash
+CONTENT_INDEX_PREFIX = "content_index"
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def hash_file(file):
+    """Stream a binary file object through SHA-256; returns (hex digest, size in bytes)."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def file_kind(file_name):
+    return os.path.splitext(file_name)[1].lower().lstrip(".") or "other"
+
+
+def find_record(sha256):
+    """The record for these bytes if they were stored before, without linking anything."""
+    return ContentRecord.objects.filter(sha256=sha256).first()
+
+
+def stored_copy(record, blob_name):
+    """A blob other than blob_name currently linked to record's bytes, to copy from; None if there is none.
+
+    source_blob alone isn't enough, the blob first stored under it may since have been overwritten.
+    """
+    link = record.links.exclude(blob_name=blob_name).first()
+    return link.blob_name if link else None
+
+
+def link_content(sha256, size, class_name, blob_name):
+    """Record that blob_name in class_name holds these bytes; returns (record, seen_before)."""
+    record, created = ContentRecord.objects.get_or_create(
+        sha256=sha256,
+        defaults={"size": size, "kind": file_kind(blob_name), "source_blob": blob_name},
+    )
+    link, link_created = ContentLink.objects.get_or_create(
+        class_name=class_name,
+        blob_name=blob_name,
+        defaults={"record": record},
+    )
+    #a blob name that now holds different bytes, the ledger sees the new hash and re-indexes it
+    if not link_created and link.record_id != record.id:
+        link.record = record
+        link.save(update_fields=["record"])
+    return record, not created
+
+
+def record_for_blob(class_name, blob_name):
+    link = ContentLink.objects.select_related("record").filter(class_name=class_name, blob_name=blob_name).first()
+    return link.record if link else None
+
+
+def link_existing(source_blob, class_name, blob_name):
+    """Link blob_name in class_name to whatever record is already stored under source_blob."""
+    record = ContentRecord.objects.filter(links__blob_name=source_blob).first()
+    if record:
+        link_content(record.sha256, record.size, class_name, blob_name)
+    return record
+
+
+def register_transcript(class_name, transcript_file, blob_name):
+    """Index a freshly uploaded transcript and attach it to the video it came from."""
+    with open(transcript_file, "rb") as f:
+        sha256, size = hash_file(f)
+    record, _ = link_content(sha256, size, class_name, blob_name)
+
+    #transcript files are named '<video stem>_transcription.txt'
+    video_stem = os.path.basename(transcript_file).rsplit("_transcription", 1)[0]
+    video_links = ContentLink.objects.select_related("record").filter(class_name=class_name, record__kind="mp4")
+    for link in video_links:
+        if os.path.splitext(os.path.basename(link.blob_name))[0] == video_stem and not link.record.transcript_blob:
+            link.record.transcript_blob = blob_name
+            link.record.save(update_fields=["transcript_blob"])
+            logger.info(f"Linked transcript {blob_name} to video {link.blob_name}")
+    return record
+
+
+def chunks_blob_name(sha256):
+    """Cached chunks are embedder-specific, so the configured embedder is part of the blob name."""
+    return f"{CONTENT_INDEX_PREFIX}/{sha256}/{embedder_key()}/elements.json"
+
+
+def has_chunks(record):
+    return record.chunks_blob == chunks_blob_name(record.sha256)
+
+
+def cache_chunks(container_client, class_name, output_directory):
+    """Store each document's embedded chunks from a pipeline run under its content hash."""
+    links = {
+        os.path.basename(link.blob_name): link
+        for link in ContentLink.objects.select_related("record").filter(class_name=class_name)
+    }
+    for root, _, files in os.walk(output_directory):
+        for output_name in files:
+            document_name = output_name[:-len(".json")] if output_name.endswith(".json") else output_name
+            link = links.get(document_name)
+            if link is None or has_chunks(link.record):
+                continue
+
+            chunks_blob = chunks_blob_name(link.record.sha256)
+            upload_from_file(container_client, os.path.join(root, output_name), chunks_blob)
+            link.record.chunks_blob = chunks_blob
+            link.record.save(update_fields=["chunks_blob"])
+            logger.info(f"Cached embedded chunks for {link.blob_name} at {chunks_blob}")
+
+
+def load_chunks(container_client, record):
+    return json.loads(container_client.get_blob_client(record.chunks_blob).download_blob().readall())
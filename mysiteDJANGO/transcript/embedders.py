@@ -0,0 +1,200 @@
+#pluggable chunk embedders behind unstructured_pipeline and the vector index
+import hashlib
+import json
+import logging
+import os
+import re
+
+import numpy as np
+from django.conf import settings
+
+#logging for embedders
+logger = logging.getLogger(__name__)
+
+#output sizes of the hosted models, used when no dimension is configured
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class Embedder:
+    """Common interface: embed(texts) -> float32 array of shape (len(texts), dimension), rows L2-normalized."""
+
+    engine = None
+
+    def __init__(self, model, dimension=None, batch_size=64):
+        self.model = model
+        self.dimension = dimension
+        self.batch_size = batch_size
+
+    @property
+    def descriptor(self):
+        """What produced a vector, so cached chunks and indexes are only reused with the same embedder."""
+        return {
+            "engine": self.engine,
+            "model": self.model,
+            "dimension": self.dimension,
+        }
+
+    def embed_batch(self, texts):
+        raise NotImplementedError
+
+    def embed(self, texts):
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        vectors = np.concatenate([
+            np.asarray(self.embed_batch(texts[start:start + self.batch_size]), dtype=np.float32)
+            for start in range(0, len(texts), self.batch_size)
+        ])
+        #models trained for it (text-embedding-3, nomic, mxbai) keep their quality when truncated
+        vectors = vectors[:, :self.dimension]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class OpenAIEmbedder(Embedder):
+    """Hosted OpenAI embeddings, one request per batch; v3 models shorten vectors server-side."""
+
+    engine = "openai"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.dimension = self.dimension or OPENAI_DIMENSIONS.get(self.model)
+        if self.dimension is None:
+            raise ValueError(f"Set EMBEDDING_DIMENSION for OpenAI model {self.model!r}")
+
+    def embed_batch(self, texts):
+        extra = {"dimensions": self.dimension} if self.model.startswith("text-embedding-3") else {}
+        #the API rejects empty strings
+        response = self.client.embeddings.create(model=self.model, input=[text or " " for text in texts], **extra)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class OnnxEmbedder(Embedder):
+    """A local sentence-embedding model exported to ONNX, run on CPU with mean pooling.
+
+    model is a directory holding model.onnx and tokenizer.json, e.g. an optimum export
+    of sentence-transformers/all-MiniLM-L6-v2; nothing is fetched over the network.
+    """
+
+    engine = "onnx"
+    max_length = 256
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND='onnx' requires the onnxruntime and tokenizers packages") from e
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 0
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(self.model, "model.onnx"),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.enable_padding()
+
+        native_dimension = self.embed_batch(["dimension probe"]).shape[1]
+        self.dimension = min(self.dimension or native_dimension, native_dimension)
+
+    def embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        #mean over real tokens only, padding is masked out
+        mask = attention_mask[..., None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature hashing of words and word pairs: no model, no network, deterministic.
+
+    Only lexical overlap is captured; meant for offline runs and tests, not production retrieval.
+    """
+
+    engine = "hashing"
+    default_dimension = 384
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dimension = self.dimension or self.default_dimension
+
+    def embed_batch(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        return vectors
+
+
+EMBEDDERS = {
+    OpenAIEmbedder.engine: OpenAIEmbedder,
+    OnnxEmbedder.engine: OnnxEmbedder,
+    HashingEmbedder.engine: HashingEmbedder,
+}
+
+
+def embedder_key():
+    """Short, filesystem-safe name of the configured embedder, known without loading it."""
+    model = re.sub(r"[^A-Za-z0-9.-]+", "-", os.path.basename(settings.EMBEDDING_MODEL.rstrip("/")))
+    return f"{settings.EMBEDDING_BACKEND}-{model}-{settings.EMBEDDING_DIMENSION or 'native'}"
+
+
+def get_embedder():
+    """Build the embedder selected in settings."""
+    try:
+        embedder_class = EMBEDDERS[settings.EMBEDDING_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {settings.EMBEDDING_BACKEND!r}, choose from {sorted(EMBEDDERS)}")
+
+    embedder = embedder_class(
+        settings.EMBEDDING_MODEL,
+        dimension=settings.EMBEDDING_DIMENSION or None,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+    )
+    logger.info(f"Loaded embedder {embedder.descriptor}")
+    return embedder
+
+
+def embed_elements(embedder, elements):
+    """Attach an 'embeddings' list to every element that has text."""
+    embeddable = [element for element in elements if element.get("text")]
+    vectors = embedder.embed([element["text"] for element in embeddable])
+    for element, vector in zip(embeddable, vectors):
+        element["embeddings"] = vector.tolist()
+    return len(embeddable)
+
+
+def embed_directory(embedder, directory):
+    """Embed every partitioned output file under directory in place; returns the number of elements embedded."""
+    embedded = 0
+    for root, _, files in os.walk(directory):
+        for output_name in files:
+            path = os.path.join(root, output_name)
+            with open(path) as f:
+                elements = json.load(f)
+            embedded += embed_elements(embedder, elements)
+            with open(path, "w") as f:
+                json.dump(elements, f)
+    return embedded
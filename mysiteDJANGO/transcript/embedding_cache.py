@@ -0,0 +1,220 @@
+#persistent embedding cache in front of the configured embedder
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from django.conf import settings
+
+#logging for the embedding cache
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Chunks that differ only in unicode form or whitespace share an embedding."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model_key, text):
+    return hashlib.sha256(f"{model_key}\0{normalize_text(text)}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """Common interface: get_many(keys) -> {key: vector}, put_many({key: vector}), size-bounded LRU."""
+
+    def __init__(self, max_bytes, dtype="float16"):
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def encode(self, vector):
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    def decode(self, data):
+        return np.frombuffer(data, dtype=self.dtype).astype(np.float32)
+
+    def get_many(self, keys):
+        raise NotImplementedError
+
+    def put_many(self, vectors):
+        raise NotImplementedError
+
+
+class DiskEmbeddingCache(EmbeddingCache):
+    """SQLite file on local disk, shared by every worker process on the host."""
+
+    def __init__(self, path, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            #sqlite caps bound parameters per statement
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update((key, self.decode(vector)) for key, vector in rows)
+                self.connection.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [time.time(), *batch]
+                )
+        return found
+
+    def put_many(self, vectors):
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, self.encode(vector), now) for key, vector in vectors.items()],
+            )
+            self._evict()
+
+    def _evict(self):
+        stored = self.connection.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings").fetchone()
+        total_bytes, count = stored
+        if total_bytes <= self.max_bytes or not count:
+            return
+
+        #drop least recently used rows until back under the bound
+        overflow = total_bytes - self.max_bytes
+        evict = int(np.ceil(overflow / (total_bytes / count)))
+        self.connection.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (evict,)
+        )
+        self.evictions += evict
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """Redis shared by every worker; recency is tracked in a sorted set so eviction never touches broker keys."""
+
+    prefix = "embedding_cache"
+
+    def __init__(self, url, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.lru_key = f"{self.prefix}:lru"
+        self.bytes_key = f"{self.prefix}:bytes"
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self.redis.mget([self._key(key) for key in keys])
+        found = {key: self.decode(value) for key, value in zip(keys, values) if value is not None}
+        if found:
+            self.redis.zadd(self.lru_key, {key: time.time() for key in found})
+        return found
+
+    def put_many(self, vectors):
+        if not vectors:
+            return
+        now = time.time()
+        pipeline = self.redis.pipeline()
+        for key, vector in vectors.items():
+            pipeline.set(self._key(key), self.encode(vector))
+        pipeline.zadd(self.lru_key, {key: now for key in vectors})
+        pipeline.incrby(self.bytes_key, sum(len(self.encode(vector)) for vector in vectors.values()))
+        pipeline.execute()
+        self._evict()
+
+    def _evict(self):
+        total_bytes = int(self.redis.get(self.bytes_key) or 0)
+        count = self.redis.zcard(self.lru_key)
+        if total_bytes <= self.max_bytes or not count:
+            return
+
+        evict = int(np.ceil((total_bytes - self.max_bytes) / (total_bytes / count)))
+        oldest = [key.decode() for key in self.redis.zrange(self.lru_key, 0, evict - 1)]
+        freed = sum(self.redis.strlen(self._key(key)) for key in oldest)
+        pipeline = self.redis.pipeline()
+        pipeline.delete(*[self._key(key) for key in oldest])
+        pipeline.zrem(self.lru_key, *oldest)
+        pipeline.decrby(self.bytes_key, freed)
+        pipeline.execute()
+        self.evictions += len(oldest)
+
+
+class CachedEmbedder:
+    """An embedder with a cache in front; only texts never seen with this model reach the model."""
+
+    def __init__(self, embedder, cache, model_key):
+        self.embedder = embedder
+        self.cache = cache
+        self.model_key = model_key
+
+    @property
+    def dimension(self):
+        return self.embedder.dimension
+
+    @property
+    def descriptor(self):
+        return self.embedder.descriptor
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def embed(self, texts):
+        keys = [cache_key(self.model_key, text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+
+        #identical texts within one call are embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.cache.hits += len(keys) - len(missing)
+        self.cache.misses += len(missing)
+
+        if missing:
+            vectors = self.embedder.embed(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        if not keys:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32)
+
+
+def get_cache():
+    """Build the embedding cache selected in settings, or None when caching is off."""
+    max_bytes = settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+    if settings.EMBEDDING_CACHE == "disk":
+        path = os.path.join(settings.EMBEDDING_CACHE_DIR, "embeddings.sqlite3")
+        return DiskEmbeddingCache(path, max_bytes, dtype=settings.EMBEDDING_CACHE_DTYPE)
+    if settings.EMBEDDING_CACHE == "redis":
+        return RedisEmbeddingCache(settings.EMBEDDING_CACHE_REDIS_URL, max_bytes, dtype=settings.EMBEDDING_CACHE_DTYPE)
+    if settings.EMBEDDING_CACHE:
+        raise ValueError(f"Unknown EMBEDDING_CACHE {settings.EMBEDDING_CACHE!r}, choose from 'disk', 'redis' or ''")
+    return None
@@ -0,0 +1,168 @@
+#chunked, batched whisper inference with energy-based voice activity detection
+import logging
+import os
+
+import numpy as np
+import torch
+import whisper
+from whisper.tokenizer import get_tokenizer
+
+from transcript.audio import SAMPLE_RATE, open_audio, to_float
+from transcript.segments import timed_segments
+
+#logging for the transcription engine
+logger = logging.getLogger(__name__)
+
+#vad frames are 30 ms, whisper windows are 30 s
+FRAME_SAMPLES = SAMPLE_RATE * 30 // 1000
+WINDOW_SAMPLES = whisper.audio.N_SAMPLES
+
+#vad tuning, in seconds unless noted
+MIN_SPEECH = 0.25
+MIN_SILENCE = 0.5
+SPEECH_PAD = 0.2
+MAX_MERGE_GAP = 2.0
+THRESHOLD_ABOVE_FLOOR_DB = 12.0
+ABSOLUTE_FLOOR_DB = -55.0
+
+
+def frame_energy(audio, block_frames=2000):
+    """Per-frame RMS energy in dBFS, computed block by block to keep memory flat."""
+    n_frames = len(audio) // FRAME_SAMPLES
+    energy = np.empty(n_frames, dtype=np.float32)
+    for start in range(0, n_frames, block_frames):
+        stop = min(start + block_frames, n_frames)
+        block = to_float(audio[start * FRAME_SAMPLES:stop * FRAME_SAMPLES]).reshape(-1, FRAME_SAMPLES)
+        rms = np.sqrt(np.mean(block ** 2, axis=1))
+        energy[start:stop] = 20 * np.log10(rms + 1e-10)
+    return energy
+
+
+def _runs(mask):
+    """Start/stop frame indices of each run of True values in mask."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def detect_speech(audio):
+    """Return (start_sample, end_sample) speech regions, dropping silence and dead air."""
+    energy = frame_energy(audio)
+    if not len(energy):
+        return []
+
+    #adaptive threshold above the recording's own noise floor
+    threshold = max(np.percentile(energy, 10) + THRESHOLD_ABOVE_FLOOR_DB, ABSOLUTE_FLOOR_DB)
+    speech = energy > threshold
+
+    #fill short pauses between words, then drop clicks and coughs
+    frames_per_second = SAMPLE_RATE / FRAME_SAMPLES
+    starts, stops = _runs(~speech)
+    for start, stop in zip(starts, stops):
+        if start > 0 and stop < len(speech) and stop - start < MIN_SILENCE * frames_per_second:
+            speech[start:stop] = True
+    starts, stops = _runs(speech)
+    keep = (stops - starts) >= MIN_SPEECH * frames_per_second
+
+    pad = int(SPEECH_PAD * SAMPLE_RATE)
+    return [
+        (max(0, start * FRAME_SAMPLES - pad), min(len(audio), stop * FRAME_SAMPLES + pad))
+        for start, stop in zip(starts[keep], stops[keep])
+    ]
+
+
+def _split_long_region(audio, start, end):
+    """Cut a region longer than one window at its quietest frame near each 30 s boundary."""
+    pieces = []
+    search = 5 * SAMPLE_RATE
+    while end - start > WINDOW_SAMPLES:
+        lo = start + WINDOW_SAMPLES - search
+        energy = frame_energy(audio[lo:start + WINDOW_SAMPLES])
+        cut = lo + int(np.argmin(energy)) * FRAME_SAMPLES if len(energy) else start + WINDOW_SAMPLES
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def plan_windows(audio):
+    """Pack speech regions into windows of at most 30 s, never bridging long silences."""
+    regions = []
+    for start, end in detect_speech(audio):
+        regions.extend(_split_long_region(audio, start, end))
+
+    windows = []
+    max_gap = int(MAX_MERGE_GAP * SAMPLE_RATE)
+    for start, end in regions:
+        if windows:
+            window_start, window_end = windows[-1]
+            if start - window_end <= max_gap and end - window_start <= WINDOW_SAMPLES:
+                windows[-1] = (window_start, end)
+                continue
+        windows.append((start, end))
+    return windows
+
+
+class BatchedWhisperEngine:
+    """Transcribe many audio files by batching their speech windows through one model."""
+
+    def __init__(self, model, batch_size=8, language="en"):
+        self.model = model
+        self.batch_size = batch_size
+        #timestamps put each segment where it was said instead of at its (up to 30 s) window
+        self.options = whisper.DecodingOptions(language=language, fp16=False, without_timestamps=False)
+        self.tokenizer = get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, language=language, task="transcribe"
+        )
+
+    def _windows(self, paths):
+        for path in paths:
+            audio = open_audio(path)
+            windows = plan_windows(audio)
+            speech = sum(end - start for start, end in windows) / SAMPLE_RATE
+            logger.info(f"{os.path.basename(path)}: {len(windows)} windows, {speech:.0f}s speech of {len(audio) / SAMPLE_RATE:.0f}s")
+            for start, end in windows:
+                yield path, start, end, to_float(audio[start:end])
+
+    def _decode(self, batch):
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(samples)), self.model.dims.n_mels)
+            for _, _, _, samples in batch
+        ]).to(self.model.device)
+        with torch.no_grad():
+            return whisper.decode(self.model, mels, self.options)
+
+    def transcribe_many(self, paths):
+        """Return {path: {"text", "segments"}} with segments as (start_s, end_s, text)."""
+        results = {path: {"text": "", "segments": []} for path in paths}
+        batch = []
+
+        def flush():
+            for (path, start, end, _), decoded in zip(batch, self._decode(batch)):
+                #whisper's own hallucination guard for windows that are really silence
+                if decoded.no_speech_prob > 0.6 and decoded.avg_logprob < -1.0:
+                    continue
+                offset = start / SAMPLE_RATE
+                file_segments = results[path]["segments"]
+                for segment_start, segment_end, text in timed_segments(decoded.tokens, self.tokenizer, (end - start) / SAMPLE_RATE):
+                    segment_start, segment_end = offset + segment_start, offset + segment_end
+                    previous_end = file_segments[-1][1] if file_segments else 0.0
+                    #speech padding can overlap the previous window: drop repeats, trim the rest
+                    if (segment_start + segment_end) / 2 < previous_end:
+                        continue
+                    file_segments.append((max(segment_start, previous_end), segment_end, text))
+            batch.clear()
+
+        for window in self._windows(paths):
+            batch.append(window)
+            if len(batch) == self.batch_size:
+                flush()
+        if batch:
+            flush()
+
+        for result in results.values():
+            result["text"] = " ".join(text for _, _, text in result["segments"])
+        return results
+
+    def transcribe(self, path):
+        return self.transcribe_many([path])[path]
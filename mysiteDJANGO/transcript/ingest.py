@@ -0,0 +1,119 @@
+#streaming ingestion of class data zips into blob storage
+import logging
+import os
+import zipfile
+
+from django.conf import settings
+
+from transcript import dedup, progress, transfer
+from transcript.segments import segments_name
+
+#logging for zip ingestion
+logger = logging.getLogger(__name__)
+
+def class_folders(class_name):
+    """Blob prefix for a class and its folder mapping by file type (anything else goes to 'Other')."""
+    prefix = class_name.replace(" ", "_")
+    base_azure_path = f'{prefix}_data'
+    folder_mapping = {
+        ".pdf": f'{prefix}_PDFs',
+        ".mp4": f'{prefix}_MP4s',
+    }
+    return base_azure_path, folder_mapping
+
+
+def copy_blob(container_client, source_blob, target_blob):
+    """Server-side copy within the container; returns False if the source is gone."""
+    try:
+        transfer.copy_blob(container_client, source_blob, target_blob)
+    except Exception as e:
+        logger.info(f"Could not copy {source_blob} to {target_blob}: {e}")
+        return False
+    return True
+
+
+def upload_member(container_client, zip_ref, info, blob_name):
+    """Pipe a member's decompressed stream into a chunked blob upload, never reading it whole.
+
+    Memory stays bounded at block size x BLOB_BLOCK_CONCURRENCY.
+    """
+    with zip_ref.open(info) as member:
+        container_client.get_blob_client(blob_name).upload_blob(
+            member,
+            length=info.file_size,
+            overwrite=True,
+            max_concurrency=settings.BLOB_BLOCK_CONCURRENCY,
+        )
+
+
+def ingest_zip(zip_file, class_name, container_client, on_progress=None):
+    """Stream every member of a class zip into blob storage without extracting it to disk.
+
+    zip_file is any seekable binary file object or path. Returns a dict with the class blob
+    prefix and the blob paths the transcription chain needs. on_progress, if given, is called
+    as on_progress(file_name, blob_name, size, status, members) after each member.
+    """
+    base_azure_path, folder_mapping = class_folders(class_name)
+    result = {
+        "class_name": base_azure_path,
+        "MP4_paths": [],
+        "PDF_paths": [],
+        "reused_transcripts": [],
+        "reused": [],
+        "existing": [],
+    }
+
+    with zipfile.ZipFile(zip_file) as zip_ref:
+        #skip directories and that annoying _MAC_OS folder
+        members = [info for info in zip_ref.infolist() if not info.is_dir() and '__MACOSX' not in info.filename]
+
+        for info in members:
+            file_name = os.path.basename(info.filename)
+            file_suffix = os.path.splitext(file_name)[1].lower()
+            folder_name = folder_mapping.get(file_suffix, 'Other')
+            blob_name = f'{base_azure_path}/{folder_name}/{file_name}'
+
+            #first pass hashes the decompressed stream so duplicates never hit the network
+            with zip_ref.open(info) as member:
+                sha256, size = dedup.hash_file(member)
+            #links are only written once the blob holds these bytes, so a failed upload leaves none
+            record = dedup.find_record(sha256)
+
+            status = progress.UPLOADED
+            if file_suffix == ".mp4":
+                #this video was transcribed before, link its transcript instead of re-running whisper
+                transcript_blob = f'{base_azure_path}_transcripts/{os.path.splitext(file_name)[0]}_transcription.txt'
+                if record and record.transcript_blob and (record.transcript_blob == transcript_blob
+                                                          or copy_blob(container_client, record.transcript_blob, transcript_blob)):
+                    dedup.link_existing(record.transcript_blob, base_azure_path, transcript_blob)
+                    #timestamps travel with the transcript; transcripts from before they were kept have none
+                    if record.transcript_blob != transcript_blob:
+                        copy_blob(container_client, segments_name(record.transcript_blob), segments_name(transcript_blob))
+                    result["reused_transcripts"].append(transcript_blob)
+                    result["reused"].append(file_name)
+                    status = progress.REUSED
+                else:
+                    result["MP4_paths"].append(blob_name)
+            elif file_suffix == ".pdf":
+                result["PDF_paths"].append(blob_name)
+
+            #skip the upload only if the blob is known to hold these bytes; a changed file under an
+            #existing name (or a blob from before the content index) is overwritten
+            stored = dedup.record_for_blob(base_azure_path, blob_name)
+            source_blob = dedup.stored_copy(record, blob_name) if record else None
+            if stored and stored.sha256 == sha256 and container_client.get_blob_client(blob_name).exists():
+                result["existing"].append(file_name)
+                status = progress.EXISTING
+
+            #same bytes are already in storage, copy them server-side
+            elif not (source_blob and copy_blob(container_client, source_blob, blob_name)):
+                #second pass streams the member straight into the blob
+                upload_member(container_client, zip_ref, info, blob_name)
+                logger.info(f"Uploaded {blob_name} ({size} bytes)")
+
+            dedup.link_content(sha256, size, base_azure_path, blob_name)
+
+            if on_progress:
+                on_progress(file_name, blob_name, size, status, members)
+
+    return result
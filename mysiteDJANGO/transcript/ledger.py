@@ -0,0 +1,141 @@
+#per-class ingestion ledger: what each document last wrote into the vector index
+import logging
+
+from django.conf import settings
+
+from transcript import lexical
+from transcript.clients import get_redis
+from transcript.dedup import has_chunks, load_chunks
+from transcript.models import ContentLink, ContentRecord, LedgerEntry
+from transcript.vectors import delete_vectors, namespace_for, upsert_elements
+
+#logging for ledger syncs
+logger = logging.getLogger(__name__)
+
+
+def document_prefixes(class_name):
+    """Where a class's indexable documents live, mapped to the file kind indexed from there."""
+    return {
+        f"{class_name}/": "pdf",
+        f"{class_name}_transcripts/": "txt",
+    }
+
+
+def class_documents(container_client, class_name):
+    """{document_id: ContentLink} for every indexable document of the class still in blob storage."""
+    stored = set()
+    for prefix, kind in document_prefixes(class_name).items():
+        stored.update(
+            blob.name
+            for blob in container_client.list_blobs(name_starts_with=prefix)
+            if blob.name.lower().endswith(f".{kind}")
+        )
+
+    links = ContentLink.objects.select_related("record").filter(class_name=class_name, blob_name__in=stored)
+    return {link.blob_name: link for link in links}
+
+
+def diff(class_name, documents):
+    """Compare {document_id: sha256} with the ledger; returns (added, changed, removed) document ids."""
+    entries = dict(LedgerEntry.objects.filter(class_name=class_name).values_list("document_id", "sha256"))
+    added = [document_id for document_id in documents if document_id not in entries]
+    changed = [
+        document_id for document_id, sha256 in documents.items()
+        if document_id in entries and entries[document_id] != sha256
+    ]
+    removed = [document_id for document_id in entries if document_id not in documents]
+    return added, changed, removed
+
+
+def class_lock(class_name):
+    """Redis lock around one class's diff and apply; expires on its own if its worker dies."""
+    return get_redis(settings.LEDGER_LOCK_REDIS_URL).lock(
+        f"ledger_lock:{class_name}",
+        timeout=settings.LEDGER_LOCK_TIMEOUT_S,
+        blocking_timeout=settings.LEDGER_LOCK_TIMEOUT_S,
+    )
+
+
+def sync(index, container_client, class_name):
+    """Bring the class index in line with its documents, touching only what changed since the last run.
+
+    Vectors of removed and changed documents are deleted, then every added or changed document
+    with cached chunks is upserted and recorded. Documents without chunks yet stay pending.
+    The class's lexical index is rebuilt from the same chunks whenever its vectors change.
+    Syncs of one class (two uploads in a row) run one after the other, each diffing what the
+    previous one wrote.
+    """
+    with class_lock(class_name):
+        return _sync(index, container_client, class_name)
+
+
+def _sync(index, container_client, class_name):
+    namespace = namespace_for(class_name)
+    documents = class_documents(container_client, class_name)
+    added, changed, removed = diff(
+        class_name, {document_id: link.record.sha256 for document_id, link in documents.items()}
+    )
+
+    stale = LedgerEntry.objects.filter(class_name=class_name, document_id__in=changed + removed)
+    deleted = delete_vectors(index, [vector_id for entry in stale for vector_id in entry.vector_ids], namespace)
+    LedgerEntry.objects.filter(class_name=class_name, document_id__in=changed).update(chunk_ids=[], vector_ids=[])
+    LedgerEntry.objects.filter(class_name=class_name, document_id__in=removed).delete()
+
+    written = 0
+    pending = []
+    lexical_docs = {}
+    for document_id in added + changed:
+        record = documents[document_id].record
+        if not has_chunks(record):
+            #not partitioned yet, or its batch failed; the next run picks it up
+            pending.append(document_id)
+            continue
+
+        elements = load_chunks(container_client, record)
+        vector_ids = upsert_elements(index, elements, class_name, document_id, record.sha256, namespace)
+        LedgerEntry.objects.update_or_create(
+            class_name=class_name,
+            document_id=document_id,
+            defaults={
+                "sha256": record.sha256,
+                "chunk_ids": [element.get("element_id", "") for element in elements],
+                "vector_ids": vector_ids,
+            },
+        )
+        written += len(vector_ids)
+        lexical_docs[document_id] = lexical.chunk_documents(document_id, vector_ids, elements)
+        logger.info(f"Upserted {len(vector_ids)} vectors for {document_id}")
+
+    try:
+        _sync_lexical(container_client, class_name, changed + removed, lexical_docs)
+    except Exception as e:
+        #the vectors are in place, hybrid queries fall back to vector-only until the next sync
+        logger.warning(f"Lexical index update failed for {class_name}: {e}")
+
+    summary = {
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "pending": len(pending),
+        "vectors_written": written,
+        "vectors_deleted": deleted,
+    }
+    logger.info(f"Ledger sync for {class_name}: {summary}")
+    return summary
+
+
+def _sync_lexical(container_client, class_name, stale_document_ids, lexical_docs):
+    """Update the class's lexical index; its first build takes in every document already in the ledger."""
+    if lexical.index_exists(container_client, class_name):
+        if not stale_document_ids and not lexical_docs:
+            return
+    else:
+        entries = LedgerEntry.objects.filter(class_name=class_name).exclude(document_id__in=list(lexical_docs))
+        records = ContentRecord.objects.in_bulk([entry.sha256 for entry in entries], field_name="sha256")
+        for entry in entries:
+            record = records.get(entry.sha256)
+            if record and entry.vector_ids and has_chunks(record):
+                elements = load_chunks(container_client, record)
+                lexical_docs[entry.document_id] = lexical.chunk_documents(entry.document_id, entry.vector_ids, elements)
+
+    lexical.update_index(container_client, class_name, stale_document_ids, lexical_docs)
@@ -0,0 +1,235 @@
+#per-class BM25 index over the same chunks as the vectors, with memory-mapped posting lists
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from transcript.clients import get_container_client
+from transcript.transfer import download_many, download_to_file, upload_many
+from transcript.vectors import VECTOR_METADATA_KEYS
+
+#logging for the lexical index
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+#words, numbers and dotted/dashed identifiers such as '3.2', 'x-ray' or 'o(n)'s 'n'
+TOKEN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+INDEX_FILES = ("docs.jsonl", "vocab.json", "postings_docs.npy", "postings_scores.npy")
+
+#loaded indexes per class: (checked_at, LexicalIndex or None)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercased terms, plus 'math342' for 'MATH 342' so course codes and numbered items match as a unit."""
+    words = TOKEN.findall(text.lower())
+    tokens = list(words)
+    for first, second in zip(words, words[1:]):
+        if first.isalpha() and second[0].isdigit():
+            tokens.append(f"{first}{second}")
+    return tokens
+
+
+def chunk_documents(document_id, vector_ids, elements):
+    """The lexical side of a document's vectors: one entry per embedded element, under the same id."""
+    embedded = [element for element in elements if element.get("embeddings")]
+    return [
+        {
+            "id": vector_id,
+            "document_id": document_id,
+            "text": element.get("text", ""),
+            "source": {
+                key: value
+                for key, value in element.get("metadata", {}).items()
+                if key in VECTOR_METADATA_KEYS and value is not None
+            },
+        }
+        for vector_id, element in zip(vector_ids, embedded)
+    ]
+
+
+def build(docs, directory):
+    """Write a BM25 index over docs to directory.
+
+    Postings of every term are stored contiguously: the doc numbers in postings_docs.npy and
+    their precomputed BM25 weights in postings_scores.npy, so a query is a few slices and adds.
+    vocab.json maps term -> [offset, document frequency].
+    """
+    postings = defaultdict(list)
+    lengths = []
+    for number, doc in enumerate(docs):
+        tokens = tokenize(doc["text"])
+        lengths.append(len(tokens))
+        for term, frequency in Counter(tokens).items():
+            postings[term].append((number, frequency))
+
+    doc_lengths = np.asarray(lengths, dtype=np.float32)
+    average_length = float(doc_lengths.mean()) if len(docs) and doc_lengths.mean() else 1.0
+
+    vocab = {}
+    doc_arrays, score_arrays = [], []
+    offset = 0
+    for term in sorted(postings):
+        numbers = np.fromiter((number for number, _ in postings[term]), dtype=np.int32)
+        frequencies = np.fromiter((frequency for _, frequency in postings[term]), dtype=np.float32)
+        idf = math.log(1 + (len(docs) - len(numbers) + 0.5) / (len(numbers) + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[numbers] / average_length)
+        doc_arrays.append(numbers)
+        score_arrays.append((idf * frequencies * (BM25_K1 + 1) / (frequencies + norm)).astype(np.float32))
+        vocab[term] = [offset, len(numbers)]
+        offset += len(numbers)
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "postings_docs.npy"), np.concatenate(doc_arrays) if doc_arrays else np.zeros(0, np.int32))
+    np.save(os.path.join(directory, "postings_scores.npy"), np.concatenate(score_arrays) if score_arrays else np.zeros(0, np.float32))
+    with open(os.path.join(directory, "vocab.json"), "w") as f:
+        json.dump(vocab, f, separators=(",", ":"))
+    with open(os.path.join(directory, "docs.jsonl"), "w") as f:
+        for doc in docs:
+            f.write(json.dumps(doc, separators=(",", ":")))
+            f.write("\n")
+
+
+class LexicalIndex:
+    """A built index opened from disk; posting arrays are memory-mapped, not read into memory."""
+
+    def __init__(self, directory):
+        self.postings_docs = np.load(os.path.join(directory, "postings_docs.npy"), mmap_mode="r")
+        self.postings_scores = np.load(os.path.join(directory, "postings_scores.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "vocab.json")) as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(directory, "docs.jsonl")) as f:
+            self.docs = [json.loads(line) for line in f if line.strip()]
+
+    def search(self, query, top_k):
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry:
+                offset, length = entry
+                #a term's posting list holds each doc once, so a plain fancy-index add is exact
+                scores[self.postings_docs[offset:offset + length]] += self.postings_scores[offset:offset + length]
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:top_k]]
+        return [{**self.docs[number], "score": float(scores[number])} for number in top]
+
+
+def _prefix(class_name):
+    return f"{class_name}_lexical"
+
+
+def _remote_meta(container_client, class_name):
+    blob_client = container_client.get_blob_client(f"{_prefix(class_name)}/meta.json")
+    if not blob_client.exists():
+        return None
+    return json.loads(blob_client.download_blob().readall())
+
+
+def index_exists(container_client, class_name):
+    return _remote_meta(container_client, class_name) is not None
+
+
+def update_index(container_client, class_name, stale_document_ids, added):
+    """Rebuild the class's index without stale documents and with added ({document_id: chunk docs}).
+
+    Each build goes under its own blob prefix and meta.json is switched last, so readers never
+    see a half-written build.
+    """
+    meta = _remote_meta(container_client, class_name)
+    scratch = tempfile.mkdtemp(prefix="lexical_")
+    try:
+        docs = []
+        if meta:
+            docs_path = os.path.join(scratch, "previous_docs.jsonl")
+            download_to_file(container_client, f"{_prefix(class_name)}/{meta['build_id']}/docs.jsonl", docs_path)
+            dropped = set(stale_document_ids) | set(added)
+            with open(docs_path) as f:
+                docs = [doc for doc in map(json.loads, filter(str.strip, f)) if doc["document_id"] not in dropped]
+        for chunk_docs in added.values():
+            docs.extend(chunk_docs)
+
+        build_id = uuid.uuid4().hex
+        build_directory = os.path.join(scratch, build_id)
+        build(docs, build_directory)
+        failures = upload_many(container_client, [
+            (os.path.join(build_directory, name), f"{_prefix(class_name)}/{build_id}/{name}") for name in INDEX_FILES
+        ])
+        errors = [error for error in failures.values() if error]
+        if errors:
+            raise errors[0]
+
+        new_meta = {"build_id": build_id, "documents": len(docs), "built_at": time.time()}
+        container_client.get_blob_client(f"{_prefix(class_name)}/meta.json").upload_blob(json.dumps(new_meta), overwrite=True)
+        logger.info(f"Built lexical index {build_id} for {class_name} over {len(docs)} chunks")
+
+        #the previous build is no longer referenced
+        if meta:
+            for name in INDEX_FILES:
+                try:
+                    container_client.delete_blob(f"{_prefix(class_name)}/{meta['build_id']}/{name}")
+                except Exception as e:
+                    logger.info(f"Could not delete old lexical index file {name}: {e}")
+        return new_meta
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _open(class_name):
+    """The class's current index, downloaded to LEXICAL_INDEX_DIR once per build; None if it has none."""
+    container_client = get_container_client()
+    meta = _remote_meta(container_client, class_name)
+    if meta is None:
+        return None
+
+    class_directory = os.path.join(settings.LEXICAL_INDEX_DIR, class_name)
+    directory = os.path.join(class_directory, meta["build_id"])
+    if not os.path.exists(os.path.join(directory, "docs.jsonl")):
+        partial = f"{directory}.partial.{os.getpid()}"
+        os.makedirs(partial, exist_ok=True)
+        #the index files download side by side, as update_index uploads them
+        failures = download_many(container_client, [
+            (f"{_prefix(class_name)}/{meta['build_id']}/{name}", os.path.join(partial, name)) for name in INDEX_FILES
+        ])
+        errors = [error for error in failures.values() if error]
+        if errors:
+            raise errors[0]
+        try:
+            os.rename(partial, directory)
+        except OSError:
+            #another process on this host finished the same build first
+            shutil.rmtree(partial, ignore_errors=True)
+
+        #older builds of the class are dead once the new one is in place
+        for name in os.listdir(class_directory):
+            if name != meta["build_id"] and ".partial." not in name:
+                shutil.rmtree(os.path.join(class_directory, name), ignore_errors=True)
+
+    return LexicalIndex(directory)
+
+
+def search(class_name, query, top_k):
+    """Top BM25 chunks of the class for query; the blob meta is rechecked at most every LEXICAL_REFRESH_S."""
+    with _loaded_lock:
+        checked_at, index = _loaded.get(class_name, (0.0, None))
+    if time.monotonic() - checked_at > settings.LEXICAL_REFRESH_S:
+        index = _open(class_name)
+        with _loaded_lock:
+            _loaded[class_name] = (time.monotonic(), index)
+    return index.search(query, top_k) if index else []
@@ -0,0 +1,113 @@
+#pluggable, streaming LLM providers for answering questions over retrieved chunks
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+
+#logging for answer generation
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are a teaching assistant for a university class. Answer the student's question using only the "
+    "course material below. Cite sources in brackets, e.g. [2]. If the material doesn't cover the question, "
+    "say so instead of guessing."
+)
+
+
+def describe_source(source):
+    """'lecture3.mp4 at 12:05' or 'syllabus.pdf p. 2', for citations and the client's source list."""
+    if "video" in source and "start_s" in source:
+        minutes, seconds = divmod(int(source["start_s"]), 60)
+        return f"{source['video']} at {minutes}:{seconds:02d}"
+    label = source.get("filename", "course material")
+    return f"{label} p. {source['page_number']}" if "page_number" in source else label
+
+
+def build_messages(question, results):
+    context = "\n\n".join(
+        f"[{number}] ({describe_source(result['source'])})\n{result['text']}"
+        for number, result in enumerate(results, start=1)
+    )
+    return [
+        {"role": "system", "content": f"{SYSTEM_PROMPT}\n\nCourse material:\n{context}"},
+        {"role": "user", "content": question},
+    ]
+
+
+class LLMProvider:
+    """Common interface: async stream(messages) yields the answer as text deltas."""
+
+    name = None
+
+    def __init__(self, model, max_tokens=512, temperature=0.2):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    async def stream(self, messages):
+        raise NotImplementedError
+        yield
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions, streamed; one async client per event loop so connections are reused."""
+
+    name = "openai"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = self._clients[loop] = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        return client
+
+    async def stream(self, messages):
+        response = await self._client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubProvider(LLMProvider):
+    """Local, deterministic stand-in: streams the best chunk back word by word. No network, for tests."""
+
+    name = "stub"
+
+    async def stream(self, messages):
+        context = messages[0]["content"].split("Course material:\n", 1)[-1]
+        best = context.split("\n\n", 1)[0].split("\n", 1)[-1] if context.strip() else ""
+        answer = f"From the course material: {best}" if best else "The course material doesn't cover this."
+        for word in answer.split(" ")[:self.max_tokens]:
+            if settings.LLM_STUB_DELAY_MS:
+                await asyncio.sleep(settings.LLM_STUB_DELAY_MS / 1000)
+            yield f"{word} "
+
+
+PROVIDERS = {
+    OpenAIProvider.name: OpenAIProvider,
+    StubProvider.name: StubProvider,
+}
+
+
+def get_provider():
+    """Build the LLM provider selected in settings."""
+    try:
+        provider_class = PROVIDERS[settings.LLM_PROVIDER]
+    except KeyError:
+        raise ValueError(f"Unknown LLM_PROVIDER {settings.LLM_PROVIDER!r}, choose from {sorted(PROVIDERS)}")
+
+    provider = provider_class(settings.LLM_MODEL, max_tokens=settings.LLM_MAX_TOKENS, temperature=settings.LLM_TEMPERATURE)
+    logger.info(f"Loaded LLM provider {provider.name} ({provider.model})")
+    return provider
@@ -0,0 +1,485 @@
+#in-process IVF vector index over memory-mapped arrays, a local stand-in for a pinecone index
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from transcript.quantization import assign, get_codec, kmeans, normalize
+
+#logging for the local vector index
+logger = logging.getLogger(__name__)
+
+#pinecone's name for the '' namespace
+DEFAULT_NAMESPACE = "__default__"
+
+#below this many vectors a flat scan beats training and probing lists
+IVF_MIN_VECTORS = 1024
+
+
+class Match:
+    __slots__ = ("id", "score", "metadata", "values")
+
+    def __init__(self, id, score, metadata=None, values=None):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+        self.values = values
+
+
+class QueryResponse:
+    def __init__(self, matches, namespace):
+        self.matches = matches
+        self.namespace = namespace
+
+
+def list_count(vector_count):
+    """Number of IVF lists for a collection, about sqrt(n); 1 (a flat scan) for small ones."""
+    if vector_count < IVF_MIN_VECTORS:
+        return 1
+    return int(round(np.sqrt(vector_count)))
+
+
+def matches_filter(metadata, query_filter):
+    """Pinecone-style metadata filter: {key: value}, or {key: {'$eq'|'$ne'|'$in'|'$nin': ...}}."""
+    for key, condition in query_filter.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                passed = value == operand
+            elif operator == "$ne":
+                passed = value != operand
+            elif operator == "$in":
+                passed = value in operand
+            elif operator == "$nin":
+                passed = value not in operand
+            else:
+                raise ValueError(f"Unsupported filter operator {operator!r}")
+            if not passed:
+                return False
+    return True
+
+
+class Collection:
+    """One namespace: an immutable IVF generation plus an append-only delta of later writes.
+
+    A generation (gen-NNNNNN/) holds codes.npy, the vectors sorted by IVF list and stored with
+    the collection's codec, the codec's trained state, the list centroids and offsets, and
+    records.jsonl (id, metadata) in the same order. With rerank > 0, lossy codecs also keep a
+    float16 source.npy, used to rerank their best candidates exactly and to re-encode on
+    compaction without compounding error; it costs more disk than the codes save, so it is
+    opt-in. Upserts and deletes append to the generation's delta.jsonl, with
+    vectors in delta.vec. compact() folds the delta into a new generation and switches
+    manifest.json, so readers in other processes never see a partial write; they pick up new
+    delta lines and generations on their next call.
+    """
+
+    def __init__(self, directory, dimension, codec="float16", codec_options=None, compact_after=1000, rerank=0):
+        self.directory = directory
+        self.dimension = dimension
+        self.codec_name = codec
+        self.codec_options = codec_options or {}
+        self.compact_after = compact_after
+        self.rerank = rerank
+        #pending writes keep full precision unless the whole collection is float32
+        self.delta_dtype = np.float32 if codec == "float32" else np.float16
+        self._lock = threading.RLock()
+        self._manifest_stamp = None
+        self.generation = None
+
+    #storage
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _generation_path(self, generation, name):
+        return self._path(f"gen-{generation:06d}", name)
+
+    @contextmanager
+    def _write_lock(self):
+        """Serializes writers across threads and processes (celery workers) for this collection."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path("lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_generation(self, generation, ids, metadata, vectors):
+        directory = self._path(f"gen-{generation:06d}")
+        os.makedirs(directory, exist_ok=True)
+        lists = list_count(len(ids))
+        if lists > 1:
+            centroids = kmeans(vectors, lists)
+            assignment = assign(vectors, centroids)
+        else:
+            centroids = normalize(vectors.mean(axis=0, keepdims=True)) if len(ids) else np.zeros((0, self.dimension), np.float32)
+            assignment = np.zeros(len(ids), dtype=np.int64)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))))
+
+        codec = get_codec(self.codec_name, self.dimension, **self.codec_options)
+        if len(ids):
+            codec.train(vectors)
+        np.save(os.path.join(directory, "codes.npy"), codec.encode(vectors[order]))
+        np.savez(os.path.join(directory, "codec.npz"), **codec.state())
+        if not codec.exact and self.rerank:
+            np.save(os.path.join(directory, "source.npy"), vectors[order].astype(np.float16))
+        np.save(os.path.join(directory, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(directory, "offsets.npy"), offsets.astype(np.int64))
+        with open(os.path.join(directory, "records.jsonl"), "w") as f:
+            for position in order:
+                f.write(json.dumps({"id": ids[position], "metadata": metadata[position]}, separators=(",", ":")))
+                f.write("\n")
+        open(os.path.join(directory, "delta.jsonl"), "w").close()
+        open(os.path.join(directory, "delta.vec"), "wb").close()
+
+        manifest = {"generation": generation, "dimension": self.dimension, "codec": self.codec_name}
+        with open(self._path("manifest.json.tmp"), "w") as f:
+            json.dump(manifest, f)
+        os.replace(self._path("manifest.json.tmp"), self._path("manifest.json"))
+
+    def _ensure_created(self):
+        if not os.path.exists(self._path("manifest.json")):
+            self._write_generation(0, [], [], np.zeros((0, self.dimension), np.float32))
+
+    #reading
+
+    def _load_generation(self, generation):
+        self.codes = np.load(self._generation_path(generation, "codes.npy"), mmap_mode="r")
+        with np.load(self._generation_path(generation, "codec.npz")) as state:
+            self.codec = get_codec(self.codec_name, self.dimension, dict(state) or None, **self.codec_options)
+        source_path = self._generation_path(generation, "source.npy")
+        self.source = np.load(source_path, mmap_mode="r") if os.path.exists(source_path) else None
+        self.centroids = np.load(self._generation_path(generation, "centroids.npy"))
+        self.offsets = np.load(self._generation_path(generation, "offsets.npy"))
+        self.ids, self.metadata = [], []
+        with open(self._generation_path(generation, "records.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.metadata.append(record["metadata"])
+        self.positions = {vector_id: position for position, vector_id in enumerate(self.ids)}
+        self.dead = np.zeros(len(self.ids), dtype=bool)
+        self.delta = {}
+        self._delta_matrix = None
+        self._delta_offset = 0
+        self.generation = generation
+
+    def refresh(self):
+        """Catch up with other processes' writes: a new generation, or new lines in the delta."""
+        with self._lock:
+            for _ in range(3):
+                try:
+                    stat = os.stat(self._path("manifest.json"))
+                except FileNotFoundError:
+                    return
+                stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                try:
+                    if stamp != self._manifest_stamp:
+                        with open(self._path("manifest.json")) as f:
+                            generation = json.load(f)["generation"]
+                        if generation != self.generation:
+                            self._load_generation(generation)
+                        self._manifest_stamp = stamp
+                    self._read_delta()
+                    return
+                except FileNotFoundError:
+                    #compacted away between reading the manifest and opening the generation, retry
+                    self._manifest_stamp = None
+                    self.generation = None
+
+    def _read_delta(self):
+        path = self._generation_path(self.generation, "delta.jsonl")
+        if os.path.getsize(path) <= self._delta_offset:
+            return
+        with open(path, "rb") as f:
+            f.seek(self._delta_offset)
+            data = f.read()
+        #only complete lines, a writer may be mid-append
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return
+
+        row_size = self.dimension * np.dtype(self.delta_dtype).itemsize
+        with open(self._generation_path(self.generation, "delta.vec"), "rb") as vector_file:
+            for line in data.splitlines():
+                entry = json.loads(line)
+                position = self.positions.get(entry["id"])
+                if position is not None:
+                    self.dead[position] = True
+                if entry["op"] == "upsert":
+                    vector_file.seek(entry["row"] * row_size)
+                    vector = np.frombuffer(vector_file.read(row_size), dtype=self.delta_dtype).astype(np.float32)
+                    self.delta[entry["id"]] = (vector, entry["metadata"])
+                else:
+                    self.delta.pop(entry["id"], None)
+        self._delta_offset += len(data)
+        self._delta_matrix = None
+
+    def count(self):
+        self.refresh()
+        if self.generation is None:
+            return 0
+        return int((~self.dead).sum()) + len(self.delta)
+
+    def pending(self):
+        """Writes not yet folded into the IVF lists."""
+        self.refresh()
+        if self.generation is None:
+            return 0
+        return int(self.dead.sum()) + len(self.delta)
+
+    #writing
+
+    def upsert(self, vectors):
+        ids = [vector["id"] for vector in vectors]
+        values = normalize([vector["values"] for vector in vectors])
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}")
+
+        with self._write_lock():
+            self._ensure_created()
+            self.refresh()
+            vector_path = self._generation_path(self.generation, "delta.vec")
+            row_size = self.dimension * np.dtype(self.delta_dtype).itemsize
+            with open(vector_path, "ab") as f:
+                first_row = f.tell() // row_size
+                f.write(values.astype(self.delta_dtype).tobytes())
+            with open(self._generation_path(self.generation, "delta.jsonl"), "a") as f:
+                for row, (vector_id, vector) in enumerate(zip(ids, vectors), start=first_row):
+                    entry = {"op": "upsert", "id": vector_id, "row": row, "metadata": vector.get("metadata", {})}
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._compact_if_large()
+        return len(ids)
+
+    def delete(self, ids):
+        with self._write_lock():
+            if not os.path.exists(self._path("manifest.json")):
+                return 0
+            self.refresh()
+            with open(self._generation_path(self.generation, "delta.jsonl"), "a") as f:
+                for vector_id in ids:
+                    f.write(json.dumps({"op": "delete", "id": vector_id}, separators=(",", ":")) + "\n")
+            self._compact_if_large()
+        return len(ids)
+
+    def _compact_if_large(self):
+        #doubling rule: a delta as large as the lists it shadows is folded in, so rebuilds stay amortized linear
+        self.refresh()
+        if self.pending() >= max(self.compact_after, len(self.ids)):
+            self._compact()
+
+    def compact(self):
+        """Fold the delta into a new generation with freshly trained IVF lists."""
+        with self._write_lock():
+            self._ensure_created()
+            self.refresh()
+            if self.pending():
+                self._compact()
+
+    def export(self):
+        """(ids, metadata, float32 vectors) of every live vector, in no particular order."""
+        with self._lock:
+            self.refresh()
+            if self.generation is None:
+                return [], [], np.zeros((0, self.dimension), np.float32)
+            live = np.flatnonzero(~self.dead)
+            ids = [self.ids[position] for position in live] + list(self.delta)
+            metadata = [self.metadata[position] for position in live] + [entry[1] for entry in self.delta.values()]
+            parts = [self._base_vectors(live)]
+            if self.delta:
+                parts.append(np.stack([entry[0] for entry in self.delta.values()]))
+            return ids, metadata, np.concatenate(parts)
+
+    def size_on_disk(self):
+        """Bytes in the current generation's directory: codes, codec state, lists, records, source and delta."""
+        with self._lock:
+            self.refresh()
+            if self.generation is None:
+                return 0
+            directory = self._path(f"gen-{self.generation:06d}")
+            return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _base_vectors(self, positions):
+        """Full-precision vectors at base positions: the float16 source of lossy codecs, else the codes."""
+        if self.source is not None:
+            return np.asarray(self.source[positions], dtype=np.float32)
+        #an empty generation has an untrained codec with nothing to decode
+        if not len(positions):
+            return np.zeros((0, self.dimension), np.float32)
+        return self.codec.decode(self.codes[positions])
+
+    def _compact(self):
+        ids, metadata, vectors = self.export()
+        previous = self.generation
+        self._write_generation(previous + 1, ids, metadata, vectors)
+        self.refresh()
+        shutil.rmtree(self._path(f"gen-{previous:06d}"), ignore_errors=True)
+        logger.info(f"Compacted {self.directory} to generation {previous + 1}: {len(ids)} vectors in {len(self.centroids)} lists")
+
+    #querying
+
+    def query(self, vector, top_k, nprobe, query_filter=None):
+        """(score, id, metadata, values) of the top_k vectors by cosine similarity, best first."""
+        query_vector = normalize(vector)
+        with self._lock:
+            self.refresh()
+            if self.generation is None:
+                return []
+            candidates = self._search_lists(query_vector, top_k, nprobe, query_filter)
+            candidates.extend(self._search_delta(query_vector, query_filter))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates[:top_k]
+
+    def _search_lists(self, query_vector, top_k, nprobe, query_filter):
+        lists = len(self.centroids)
+        if not len(self.ids) or not lists:
+            return []
+        if lists > nprobe:
+            probed = np.argpartition(-(self.centroids @ query_vector), nprobe)[:nprobe]
+        else:
+            probed = np.arange(lists)
+
+        #each list is one contiguous slice of the memory-mapped codes
+        positions = np.concatenate([np.arange(self.offsets[number], self.offsets[number + 1]) for number in probed])
+        score = self.codec.scorer(query_vector)
+        scores = np.concatenate([score(self.codes[self.offsets[number]:self.offsets[number + 1]]) for number in probed])
+        keep = ~self.dead[positions]
+        if query_filter:
+            keep &= np.fromiter(
+                (matches_filter(self.metadata[position], query_filter) for position in positions), dtype=bool, count=len(positions)
+            )
+        positions, scores = positions[keep], scores[keep]
+
+        #approximate scores pick the candidates, their float16 source settles the order
+        rerank = self.source is not None and self.rerank > 0
+        shortlist = top_k * self.rerank if rerank else top_k
+        if len(positions) > shortlist:
+            best = np.argpartition(-scores, shortlist)[:shortlist]
+            positions, scores = positions[best], scores[best]
+        if rerank and len(positions):
+            positions = np.sort(positions)
+            scores = self._base_vectors(positions) @ query_vector
+            if len(positions) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                positions, scores = positions[best], scores[best]
+        return [
+            (float(score), self.ids[position], self.metadata[position], position)
+            for score, position in zip(scores, positions)
+        ]
+
+    def _search_delta(self, query_vector, query_filter):
+        if not self.delta:
+            return []
+        if self._delta_matrix is None:
+            self._delta_matrix = (list(self.delta), np.stack([entry[0] for entry in self.delta.values()]))
+        ids, matrix = self._delta_matrix
+        scores = matrix @ query_vector
+        return [
+            (float(score), vector_id, self.delta[vector_id][1], None)
+            for score, vector_id in zip(scores, ids)
+            if not query_filter or matches_filter(self.delta[vector_id][1], query_filter)
+        ]
+
+    def values(self, position, vector_id):
+        if position is None:
+            return self.delta[vector_id][0].tolist()
+        return self._base_vectors([position])[0].tolist()
+
+
+class LocalIndex:
+    """Pinecone-Index-shaped access to a directory of per-namespace collections (cosine metric)."""
+
+    def __init__(self, directory, nprobe=8, compact_after=1000, rerank=0):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.compact_after = compact_after
+        self.rerank = rerank
+        with open(os.path.join(directory, "index.json")) as f:
+            config = json.load(f)
+        self.dimension = config["dimension"]
+        self.codec = config["codec"]
+        self.codec_options = config.get("codec_options", {})
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create(directory, dimension, codec="float16", **codec_options):
+        """Create the index directory; returns False if it exists (an error if with another dimension)."""
+        config_path = os.path.join(directory, "index.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                existing = json.load(f)["dimension"]
+            if existing != dimension:
+                raise ValueError(f"Index {directory} has dimension {existing}, the configured embedder produces {dimension}")
+            return False
+        #fails early on an unknown codec or a pq split that doesn't divide the dimension
+        get_codec(codec, dimension, **codec_options)
+        os.makedirs(directory, exist_ok=True)
+        config = {"dimension": dimension, "codec": codec, "codec_options": codec_options, "metric": "cosine"}
+        with open(f"{config_path}.tmp", "w") as f:
+            json.dump(config, f)
+        os.replace(f"{config_path}.tmp", config_path)
+        return True
+
+    def collection(self, namespace=""):
+        namespace = namespace or DEFAULT_NAMESPACE
+        with self._lock:
+            collection = self._collections.get(namespace)
+            if collection is None:
+                directory = os.path.join(self.directory, "namespaces", quote(namespace, safe=""))
+                collection = self._collections[namespace] = Collection(
+                    directory, self.dimension, self.codec, self.codec_options, self.compact_after, self.rerank
+                )
+        return collection
+
+    def upsert(self, vectors, namespace=""):
+        return self.collection(namespace).upsert(vectors) if vectors else 0
+
+    def delete(self, ids, namespace=""):
+        return self.collection(namespace).delete(ids) if ids else 0
+
+    def query(self, vector, top_k=10, namespace="", filter=None, include_metadata=False, include_values=False):
+        collection = self.collection(namespace)
+        results = collection.query(vector, top_k, self.nprobe, filter)
+        matches = [
+            Match(
+                vector_id,
+                score,
+                metadata if include_metadata else None,
+                collection.values(position, vector_id) if include_values else None,
+            )
+            for score, vector_id, metadata, position in results
+        ]
+        return QueryResponse(matches, namespace)
+
+    def compact(self):
+        for namespace in self._namespaces():
+            self.collection(namespace).compact()
+
+    def _namespaces(self):
+        root = os.path.join(self.directory, "namespaces")
+        if not os.path.isdir(root):
+            return []
+        return [unquote(name) for name in sorted(os.listdir(root))]
+
+    def describe_index_stats(self):
+        namespaces = {}
+        for namespace in self._namespaces():
+            count = self.collection(namespace).count()
+            namespaces["" if namespace == DEFAULT_NAMESPACE else namespace] = {"vector_count": count}
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(summary["vector_count"] for summary in namespaces.values()),
+        }
@@ -0,0 +1,88 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from transcript import retrieval
+
+#generic course questions, used when no --questions file is given
+DEFAULT_QUESTIONS = [
+    "What are the main topics covered in this course?",
+    "When is the midterm exam?",
+    "Can you explain the key idea from the first lecture?",
+    "What is the grading policy?",
+    "Which readings are required for next week?",
+    "Summarize the definition introduced in lecture two.",
+]
+
+
+class Command(BaseCommand):
+    help = "Measure question-to-chunks latency for a class and fail if p95 is over the retrieval budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--class", dest="class_choice", required=True, help="Class (group) name, e.g. 'Intro Bio'.")
+        parser.add_argument("--questions", help="File with one question per line.")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+        parser.add_argument("--budget-ms", type=float, default=settings.RETRIEVAL_P95_BUDGET_MS)
+        parser.add_argument(
+            "--user",
+            help="Username to query through the HTTP endpoint (middleware, auth, JSON) instead of calling search directly.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("--requests must be at least 2 to compute latency percentiles.")
+
+        questions = DEFAULT_QUESTIONS
+        if options["questions"]:
+            with open(options["questions"]) as f:
+                questions = [line.strip() for line in f if line.strip()]
+
+        class_name = retrieval.pipeline_class_name(options["class_choice"])
+        retrieval.warm_up(class_name)
+        query = self._endpoint_query(options) if options["user"] else self._direct_query(class_name, options["k"])
+
+        def timed(number):
+            started = time.perf_counter()
+            query(questions[number % len(questions)])
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            latencies = sorted(pool.map(timed, range(options["requests"])))
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+        self.stdout.write(
+            f"{len(latencies)} queries at concurrency {options['concurrency']}: "
+            f"p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms, max {latencies[-1]:.1f} ms"
+        )
+        if p95 > options["budget_ms"]:
+            raise CommandError(f"p95 {p95:.1f} ms is over the {options['budget_ms']:.0f} ms budget")
+        self.stdout.write(f"p95 within the {options['budget_ms']:.0f} ms budget")
+
+    def _direct_query(self, class_name, top_k):
+        return lambda question: retrieval.search(class_name, question, top_k)
+
+    def _endpoint_query(self, options):
+        user = User.objects.get(username=options["user"])
+        url = reverse("class_query", args=[options["class_choice"]])
+        local = threading.local()
+
+        def query(question):
+            #django's test client isn't thread-safe, one per benchmark thread
+            if not hasattr(local, "client"):
+                local.client = Client(HTTP_HOST="localhost")
+                local.client.force_login(user)
+            response = local.client.get(url, {"q": question, "k": options["k"]})
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}: {response.content[:200]!r}")
+
+        return query
@@ -0,0 +1,55 @@
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+#each probe runs in a fresh interpreter so import caches and RSS start from zero
+PROBE_SCRIPT = """
+import os, resource, sys, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysiteDJANGO.settings")
+start = time.perf_counter()
+import django
+django.setup()
+{code}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, rss / 1024 if sys.platform == "darwin" else rss)
+"""
+
+PROBES = [
+    ("django.setup", "pass"),
+    ("web process (import interface.views)", "import interface.views"),
+    (
+        "eager, as before lazy loading (views + every client)",
+        "import interface.views\n"
+        "from transcript import clients\n"
+        "clients.get_blob_service_client(); clients.get_pinecone(); clients.get_transcription_backend()",
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = "Measure import time and peak RSS of a web process against eagerly loading every pipeline client."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        for label, code in PROBES:
+            runs = [self._probe(code) for _ in range(options["repeat"])]
+            seconds = statistics.median(run[0] for run in runs)
+            rss_mb = statistics.median(run[1] for run in runs) / 1024
+            self.stdout.write(f"{label}: {seconds:.2f}s, peak RSS {rss_mb:.0f} MB")
+
+    def _probe(self, code):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE_SCRIPT.format(code=code)],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, rss_kb = result.stdout.strip().splitlines()[-1].split()
+        return float(elapsed), float(rss_kb)
@@ -0,0 +1,58 @@
+import time
+
+import whisper
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transcript.audio import SAMPLE_RATE, open_audio, to_float
+from transcript.backends import BACKENDS
+
+
+class Command(BaseCommand):
+    help = "Compare real-time factor of per-file whisper.transcribe against a transcription backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("audio_files", nargs="+", help="Extracted .pcm files (or anything ffmpeg can read)")
+        parser.add_argument("--backend", default=settings.TRANSCRIPTION_BACKEND, choices=sorted(BACKENDS))
+        parser.add_argument("--model", default=settings.TRANSCRIPTION_MODEL, help="Model size for the backend under test")
+        parser.add_argument("--compute-type", default=settings.TRANSCRIPTION_COMPUTE_TYPE or None)
+        parser.add_argument("--baseline-model", default="base", help="openai-whisper model for the per-file baseline")
+        parser.add_argument("--batch-size", type=int, default=settings.TRANSCRIPTION_BATCH_SIZE)
+        parser.add_argument("--skip-baseline", action="store_true", help="Only time the backend")
+
+    def handle(self, *args, **options):
+        paths = options["audio_files"]
+        audio_seconds = sum(len(open_audio(path)) for path in paths) / SAMPLE_RATE
+        self.stdout.write(f"{len(paths)} files, {audio_seconds:.0f}s of audio")
+
+        baseline = None
+        if not options["skip_baseline"]:
+            #the original per-file call: fp32 openai-whisper, one transcribe() per file
+            model = whisper.load_model(options["baseline_model"], device="cpu")
+            start = time.perf_counter()
+            for path in paths:
+                model.transcribe(to_float(open_audio(path)), fp16=False)
+            baseline = time.perf_counter() - start
+            self._report(f"per-file transcribe ({options['baseline_model']})", baseline, audio_seconds)
+            del model
+
+        backend = BACKENDS[options["backend"]](
+            options["model"],
+            compute_type=options["compute_type"],
+            batch_size=options["batch_size"],
+            language=settings.TRANSCRIPTION_LANGUAGE,
+        )
+        start = time.perf_counter()
+        backend.transcribe_many(paths)
+        elapsed = time.perf_counter() - start
+        self._report(f"{backend.descriptor} batch={options['batch_size']}", elapsed, audio_seconds)
+
+        if baseline:
+            self.stdout.write(self.style.SUCCESS(f"speedup: {baseline / elapsed:.2f}x"))
+
+    def _report(self, label, wall_seconds, audio_seconds):
+        #rtf < 1 is faster than real time, audio-seconds per wall-second is its inverse
+        self.stdout.write(
+            f"{label}: {wall_seconds:.1f}s wall, RTF {wall_seconds / audio_seconds:.3f}, "
+            f"{audio_seconds / wall_seconds:.1f} audio-s/wall-s"
+        )
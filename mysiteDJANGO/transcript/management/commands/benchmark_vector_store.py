@@ -0,0 +1,109 @@
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transcript.local_index import LocalIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the local IVF index with exact brute-force NumPy search: recall@k and query latency "
+        "per nprobe, on a local index's namespace or a synthetic clustered corpus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", help="Local index name under LOCAL_VECTOR_STORE_DIR.")
+        parser.add_argument("--namespace", default="", help="Namespace (class) to benchmark, default ''.")
+        parser.add_argument("--synthetic", type=int, help="Build a throwaway index of this many clustered vectors instead.")
+        parser.add_argument("--dimension", type=int, default=384, help="Dimension of synthetic vectors.")
+        parser.add_argument("--codec", default=settings.LOCAL_VECTOR_STORE_CODEC, help="Vector codec of a synthetic index.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--nprobe", default="1,2,4,8,16,32", help="Comma-separated nprobe values to try.")
+        parser.add_argument(
+            "--noise", type=float, default=0.5, help="Queries are stored vectors plus Gaussian noise of about this norm."
+        )
+
+    def handle(self, *args, **options):
+        if bool(options["index"]) == bool(options["synthetic"]):
+            raise CommandError("Pass exactly one of --index or --synthetic.")
+
+        scratch = None
+        try:
+            if options["synthetic"]:
+                scratch = tempfile.mkdtemp(prefix="vector_benchmark_")
+                index = self._synthetic_index(scratch, options)
+            else:
+                index = LocalIndex(f"{settings.LOCAL_VECTOR_STORE_DIR}/{options['index']}")
+            self._run(index, options)
+        finally:
+            if scratch:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+    def _synthetic_index(self, directory, options):
+        rng = np.random.default_rng(0)
+        count, dimension = options["synthetic"], options["dimension"]
+        #embeddings of course material cluster by topic, uniform noise would flatter nobody
+        centers = rng.standard_normal((max(count // 200, 1), dimension)).astype(np.float32)
+        vectors = centers[rng.integers(len(centers), size=count)] + 1.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+
+        LocalIndex.create(directory, dimension, options["codec"])
+        index = LocalIndex(directory)
+        started = time.perf_counter()
+        for start in range(0, count, 1000):
+            index.upsert([
+                {"id": f"v{number}", "values": vectors[number], "metadata": {}}
+                for number in range(start, min(start + 1000, count))
+            ])
+        index.compact()
+        self.stdout.write(f"Built a {count} x {dimension} {options['codec']} index in {time.perf_counter() - started:.1f} s")
+        return index
+
+    def _run(self, index, options):
+        collection = index.collection(options["namespace"])
+        ids, _, vectors = collection.export()
+        if not ids:
+            raise CommandError("The namespace holds no vectors.")
+        k = min(options["k"], len(ids))
+
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.integers(len(ids), size=options["queries"])]
+        noise = rng.standard_normal(queries.shape) * options["noise"] / np.sqrt(queries.shape[1])
+        queries = (queries + noise).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        exact, exact_latencies = [], []
+        for query in queries:
+            started = time.perf_counter()
+            scores = vectors @ query
+            top = np.argpartition(-scores, k - 1)[:k]
+            exact_latencies.append((time.perf_counter() - started) * 1000)
+            exact.append({ids[position] for position in top})
+
+        self.stdout.write(
+            f"{len(ids)} vectors, {len(collection.centroids)} IVF lists, {collection.pending()} pending writes, "
+            f"{len(queries)} queries, k={k}"
+        )
+        self.stdout.write(f"{'search':<14}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        self.stdout.write(f"{'brute force':<14}{1.0:>10.3f}{self._percentile(exact_latencies, 50):>10.2f}{self._percentile(exact_latencies, 95):>10.2f}")
+
+        for nprobe in [int(value) for value in options["nprobe"].split(",")]:
+            index.nprobe = nprobe
+            recalls, latencies = [], []
+            for query, truth in zip(queries, exact):
+                started = time.perf_counter()
+                response = index.query(vector=query, top_k=k, namespace=options["namespace"])
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(truth & {match.id for match in response.matches}) / k)
+            self.stdout.write(
+                f"{f'ivf nprobe={nprobe}':<14}{statistics.mean(recalls):>10.3f}"
+                f"{self._percentile(latencies, 50):>10.2f}{self._percentile(latencies, 95):>10.2f}"
+            )
+
+    def _percentile(self, values, percent):
+        return float(np.percentile(values, percent))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transcript.clients import get_embedder, get_index, get_vector_store
+
+
+class Command(BaseCommand):
+    help = "Create the shared vector index once, so new classes can start ingesting into their namespace right away."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", default=settings.PINECONE_SHARED_INDEX, help="Index name (default: PINECONE_SHARED_INDEX).")
+        parser.add_argument("--dimension", type=int, help="Vector size (default: the configured embedder's).")
+        parser.add_argument("--timeout", type=int, default=300, help="Seconds to wait for the index to become ready.")
+
+    def handle(self, *args, **options):
+        index_name = options["index"]
+        if not index_name:
+            raise CommandError("Set PINECONE_SHARED_INDEX or pass --index.")
+
+        dimension = options["dimension"] or get_embedder().dimension
+        if get_vector_store().ensure_index(index_name, dimension, timeout=options["timeout"]):
+            self.stdout.write(f"Created shared index {index_name} ({dimension} dimensions)")
+        else:
+            self.stdout.write(f"Shared index {index_name} already exists")
+
+        stats = get_index(index_name).describe_index_stats()
+        for namespace, summary in stats["namespaces"].items():
+            self.stdout.write(f"  {namespace or '(default)'}: {summary['vector_count']} vectors")
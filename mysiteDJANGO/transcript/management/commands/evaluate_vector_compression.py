@@ -0,0 +1,167 @@
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transcript import retrieval
+from transcript.clients import get_container_client, get_embedder
+from transcript.dedup import has_chunks, load_chunks
+from transcript.local_index import LocalIndex
+from transcript.models import ContentRecord, LedgerEntry
+from transcript.quantization import get_codec, normalize, truncate
+
+
+class Command(BaseCommand):
+    help = (
+        "Recall versus memory of shorter (matryoshka-truncated) and quantized embeddings on a class's own "
+        "chunks, against exact search over the full-size vectors. Each setting is built as a real local index, "
+        "so sizes are what it writes to disk and recall is what its IVF search returns, with and without the "
+        "float16 rerank copy; use it to pick EMBEDDING_DIMENSION, LOCAL_VECTOR_STORE_CODEC and "
+        "LOCAL_VECTOR_STORE_RERANK per deployment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--class", dest="class_choices", action="append", required=True,
+            help="Class (group) name, e.g. 'Intro Bio'; repeat to pool several classes.",
+        )
+        parser.add_argument("--questions", help="File with one question per line; default: held-out chunks as queries.")
+        parser.add_argument("--queries", type=int, default=200, help="Held-out chunks to query with, without --questions.")
+        parser.add_argument("--dimensions", default="3072,2048,1536,1024,768,512,256")
+        parser.add_argument("--codecs", default="float32,float16,int8,pq")
+        parser.add_argument("--pq-subspaces", type=int, help="PQ bytes per vector (default: dimension / 8).")
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--nprobe", type=int, default=settings.LOCAL_VECTOR_STORE_NPROBE)
+        parser.add_argument(
+            "--rerank", type=int, default=settings.LOCAL_VECTOR_STORE_RERANK or 4,
+            help="Rerank factor to compare lossy codecs with; they are also measured without reranking.",
+        )
+        parser.add_argument("--max-chunks", type=int, default=100000)
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        vectors = self._class_vectors(options)
+        if len(vectors) <= options["k"]:
+            raise CommandError(f"Only {len(vectors)} embedded chunks found, need more than k={options['k']}.")
+
+        rng = np.random.default_rng(0)
+        if options["questions"]:
+            with open(options["questions"]) as f:
+                questions = [line.strip() for line in f if line.strip()]
+            queries = np.asarray(get_embedder().embed(questions), dtype=np.float32)
+            if queries.shape[1] != vectors.shape[1]:
+                raise CommandError(f"Questions embed to {queries.shape[1]} dimensions, the chunks have {vectors.shape[1]}.")
+            held_out = None
+        else:
+            held_out = rng.choice(len(vectors), min(options["queries"], len(vectors) - options["k"]), replace=False)
+            queries = vectors[held_out]
+
+        k = options["k"]
+        truth = self._top_k(vectors @ queries.T, k, held_out)
+        full_dimension = vectors.shape[1]
+        dimensions = [dimension for dimension in map(int, options["dimensions"].split(",")) if dimension <= full_dimension]
+        self.stdout.write(
+            f"{len(vectors)} chunks at {full_dimension} dimensions, {len(queries)} queries, "
+            f"recall@{k} against exact float32 search at full size"
+        )
+        self.stdout.write(
+            f"{'dimension':>10}{'codec':>9}{'rerank':>8}{'bytes/vec':>11}{'disk MB':>9}{'recall':>9}{'query ms':>10}{'build s':>9}"
+        )
+
+        rows = []
+        for dimension in dimensions:
+            corpus = truncate(vectors, dimension)
+            truncated_queries = truncate(queries, dimension)
+            for name in options["codecs"].split(","):
+                codec_options = {"subspaces": options["pq_subspaces"] or max(dimension // 8, 1)} if name == "pq" else {}
+                try:
+                    codec = get_codec(name, dimension, **codec_options)
+                except ValueError as e:
+                    self.stdout.write(f"{dimension:>10}{name:>9}  skipped: {e}")
+                    continue
+
+                #the float16 copy only exists to rerank lossy codes
+                for rerank in ([0] if codec.exact else [0, options["rerank"]]):
+                    row = self._measure(corpus, truncated_queries, truth, held_out, name, codec_options, rerank, options)
+                    rows.append(row)
+                    self.stdout.write(
+                        f"{dimension:>10}{name:>9}{rerank:>8}{row['bytes_per_vector']:>11.1f}{row['disk_mb']:>9.1f}"
+                        f"{row['recall']:>9.3f}{row['query_ms']:>10.2f}{row['build_s']:>9.1f}"
+                    )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump({"chunks": len(vectors), "queries": len(queries), "k": k, "results": rows}, f, indent=2)
+
+    def _measure(self, corpus, queries, truth, held_out, codec, codec_options, rerank, options):
+        """Build a throwaway local index over corpus and measure its generation on disk and its recall@k."""
+        k = options["k"]
+        directory = tempfile.mkdtemp(prefix="vector_compression_")
+        try:
+            LocalIndex.create(directory, corpus.shape[1], codec, **codec_options)
+            index = LocalIndex(directory, nprobe=options["nprobe"], rerank=rerank)
+            started = time.perf_counter()
+            for start in range(0, len(corpus), 1000):
+                index.upsert([
+                    {"id": str(row), "values": corpus[row], "metadata": {}}
+                    for row in range(start, min(start + 1000, len(corpus)))
+                ])
+            index.compact()
+            build_seconds = time.perf_counter() - started
+            size = index.collection().size_on_disk()
+
+            found = []
+            started = time.perf_counter()
+            for number, query in enumerate(queries):
+                #one extra match, a held-out chunk finds itself first
+                matches = index.query(vector=query, top_k=k + 1 if held_out is not None else k).matches
+                rows = [int(match.id) for match in matches]
+                if held_out is not None:
+                    rows = [row for row in rows if row != held_out[number]]
+                found.append(set(rows[:k]))
+            query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return {
+            "dimension": corpus.shape[1],
+            "codec": codec,
+            "rerank": rerank,
+            "bytes_per_vector": size / len(corpus),
+            "disk_mb": size / 2**20,
+            "recall": float(np.mean([len(a & b) / k for a, b in zip(truth, found)])),
+            "query_ms": query_ms,
+            "build_s": build_seconds,
+        }
+
+    def _class_vectors(self, options):
+        """Normalized embeddings of every chunk the classes' ledgers point at, from the content-hash chunk cache."""
+        container_client = get_container_client()
+        class_names = [retrieval.pipeline_class_name(class_choice) for class_choice in options["class_choices"]]
+        hashes = set(
+            LedgerEntry.objects.filter(class_name__in=class_names).values_list("sha256", flat=True)
+        )
+        vectors = []
+        for record in ContentRecord.objects.filter(sha256__in=hashes):
+            if not has_chunks(record):
+                continue
+            vectors.extend(
+                element["embeddings"] for element in load_chunks(container_client, record) if element.get("embeddings")
+            )
+            if len(vectors) >= options["max_chunks"]:
+                break
+        if not vectors:
+            raise CommandError(f"No embedded chunks for {', '.join(class_names)}; ingest the class first.")
+        return normalize(vectors[:options["max_chunks"]])
+
+    def _top_k(self, scores, k, held_out):
+        """Top k corpus rows per query column; a held-out chunk never counts as its own neighbour."""
+        scores = np.array(scores, dtype=np.float32)
+        if held_out is not None:
+            scores[held_out, np.arange(len(held_out))] = -np.inf
+        top = np.argpartition(-scores, k, axis=0)[:k]
+        return [set(column) for column in top.T]
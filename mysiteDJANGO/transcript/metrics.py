@@ -0,0 +1,261 @@
+#per-task pipeline metrics: timings and work counts, kept in redis for prometheus and per-chain summaries
+import contextvars
+import json
+import logging
+import os
+import time
+
+from celery import Task
+from celery.exceptions import Retry
+from django.conf import settings
+
+from transcript.clients import get_redis
+
+#logging for pipeline metrics
+logger = logging.getLogger(__name__)
+
+#work counted per task run, summed into counters per task and class
+#audio_s is counted once, at extraction; speech_s is the speech whisper decoded out of it
+COUNTS = ("bytes_in", "bytes_out", "audio_s", "speech_s", "pages", "chunks", "vectors")
+
+#wall-time histogram buckets in seconds, from blob copies up to long lectures
+WALL_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600, float("inf"))
+
+PREFIX = "pipeline_metrics"
+
+_current = contextvars.ContextVar("pipeline_task_record", default=None)
+
+
+def _cpu_seconds():
+    #children too, ffmpeg runs as a subprocess of the extraction task
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class TaskRecord:
+    """What one task run did; started and finished by MeteredTask, filled in by the task through record()."""
+
+    def __init__(self, task_name, task_id, chain_id, attempt):
+        self.task = task_name.rsplit(".", 1)[-1]
+        self.task_id = task_id
+        self.chain_id = chain_id
+        #earlier celery retries of this task, 0 on the first run
+        self.attempt = attempt
+        self.retries = 0
+        self.class_name = ""
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.status = "running"
+        self._started = time.perf_counter()
+        self._cpu_started = _cpu_seconds()
+        self.wall_s = self.cpu_s = 0.0
+
+    def finish(self, status):
+        self.status = status
+        self.retries = 1 if status == "retry" else 0
+        self.wall_s = time.perf_counter() - self._started
+        self.cpu_s = _cpu_seconds() - self._cpu_started
+
+    def as_dict(self):
+        return {
+            "task": self.task,
+            "task_id": self.task_id,
+            "chain_id": self.chain_id,
+            "class_name": self.class_name,
+            "status": self.status,
+            "wall_s": round(self.wall_s, 3),
+            "cpu_s": round(self.cpu_s, 3),
+            "attempt": self.attempt,
+            "retries": self.retries,
+            **self.counts,
+        }
+
+
+def record(class_name=None, **counts):
+    """Tag the running task with its class and add to its counts, e.g. record(class_name, pages=12)."""
+    current = _current.get()
+    if current is None:
+        return
+    if class_name:
+        current.class_name = class_name
+    for key, value in counts.items():
+        if key not in current.counts:
+            raise ValueError(f"Unknown metric {key!r}, choose from {COUNTS}")
+        current.counts[key] += value or 0
+
+
+class MeteredTask(Task):
+    """Times every run and exports its record, readable by task id with task_metrics().
+
+    Results keep their type, tuples are what the next step of a chain unpacks; dict results
+    carry the record under 'metrics' as well.
+    """
+
+    def __call__(self, *args, **kwargs):
+        if not settings.PIPELINE_METRICS_ENABLED:
+            return super().__call__(*args, **kwargs)
+
+        current = TaskRecord(self.name, self.request.id, self.request.root_id or self.request.id, self.request.retries or 0)
+        token = _current.set(current)
+        try:
+            result = super().__call__(*args, **kwargs)
+        except Exception as e:
+            current.finish("retry" if isinstance(e, Retry) else "failure")
+            _export(current)
+            raise
+        finally:
+            _current.reset(token)
+
+        current.finish("success")
+        _export(current)
+        if isinstance(result, dict):
+            result = {**result, "metrics": current.as_dict()}
+        return result
+
+
+def _key(*parts):
+    return ":".join((PREFIX,) + parts)
+
+
+def _labels(task, class_name):
+    return f"{task}|{class_name}"
+
+
+def _export(current):
+    """Add the run to the running totals and its chain's records; metrics never fail a task."""
+    entry = current.as_dict()
+    labels = _labels(current.task, current.class_name)
+    try:
+        pipeline = get_redis(settings.PIPELINE_METRICS_REDIS_URL).pipeline()
+        pipeline.hincrby(_key("runs"), f"{labels}|{current.status}", 1)
+        pipeline.hincrbyfloat(_key("totals"), f"{labels}|wall_s", current.wall_s)
+        pipeline.hincrbyfloat(_key("totals"), f"{labels}|cpu_s", current.cpu_s)
+        pipeline.hincrby(_key("totals"), f"{labels}|retries", current.retries)
+        for name in COUNTS:
+            pipeline.hincrbyfloat(_key("totals"), f"{labels}|{name}", current.counts[name])
+        bucket = next(bound for bound in WALL_BUCKETS if current.wall_s <= bound)
+        pipeline.hincrby(_key("wall_buckets"), f"{labels}|{bucket}", 1)
+
+        pipeline.set(_key("task", current.task_id), json.dumps(entry), ex=settings.PIPELINE_METRICS_RETENTION_S)
+        pipeline.rpush(_key("chain", current.chain_id), json.dumps(entry))
+        pipeline.expire(_key("chain", current.chain_id), settings.PIPELINE_METRICS_RETENTION_S)
+        pipeline.zadd(_key("chains"), {current.chain_id: time.time()})
+        pipeline.zremrangebyrank(_key("chains"), 0, -settings.PIPELINE_METRICS_RECENT_CHAINS - 1)
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Could not export metrics for {current.task} {current.task_id}: {e}")
+    logger.info(f"Task metrics: {entry}")
+
+
+def task_metrics(task_id):
+    """The record of a task's latest run, None once it has expired or if it never ran metered."""
+    entry = get_redis(settings.PIPELINE_METRICS_REDIS_URL).get(_key("task", task_id))
+    return json.loads(entry) if entry else None
+
+
+def chain_records(chain_id):
+    redis = get_redis(settings.PIPELINE_METRICS_REDIS_URL)
+    return [json.loads(entry) for entry in redis.lrange(_key("chain", chain_id), 0, -1)]
+
+
+def chain_summary(chain_id):
+    """Totals of every task run under one chain (the ingest job), overall and per task."""
+    records = chain_records(chain_id)
+    fields = ("wall_s", "cpu_s", "retries") + COUNTS
+    per_task = {}
+    for entry in records:
+        totals = per_task.setdefault(entry["task"], dict.fromkeys(("runs",) + fields, 0))
+        totals["runs"] += 1
+        for field in fields:
+            totals[field] += entry[field]
+    return {
+        "chain_id": chain_id,
+        "class_name": next((entry["class_name"] for entry in records if entry["class_name"]), ""),
+        "tasks": per_task,
+        "total": {field: sum(totals[field] for totals in per_task.values()) for field in fields},
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    """Whole numbers as ints, anything else at full precision; :g would round large counters to 6 digits."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_openmetrics():
+    """Every counter, the wall-time histogram and recent chains' totals, in OpenMetrics text format.
+
+    Totals live in redis, so one scrape of any web process covers all celery workers. chain_id
+    appears only on the pipeline_chain_* gauges of the PIPELINE_METRICS_RECENT_CHAINS latest chains.
+    """
+    redis = get_redis(settings.PIPELINE_METRICS_REDIS_URL)
+    runs = {key.decode(): int(value) for key, value in redis.hgetall(_key("runs")).items()}
+    totals = {key.decode(): float(value) for key, value in redis.hgetall(_key("totals")).items()}
+    buckets = {key.decode(): int(value) for key, value in redis.hgetall(_key("wall_buckets")).items()}
+
+    lines = [
+        "# TYPE pipeline_task_runs counter",
+        "# HELP pipeline_task_runs Celery task runs by outcome.",
+    ]
+    for key, value in sorted(runs.items()):
+        task, class_name, status = key.split("|")
+        lines.append(f"pipeline_task_runs_total{_format_labels(task=task, class_name=class_name, status=status)} {value}")
+
+    help_texts = {
+        "wall_s": ("wall_seconds", "Wall-clock time spent in tasks."),
+        "cpu_s": ("cpu_seconds", "CPU time of the worker process and its subprocesses during tasks."),
+        "retries": ("retries", "Task runs that ended in a retry."),
+        "bytes_in": ("bytes_in", "Bytes downloaded from blob storage."),
+        "bytes_out": ("bytes_out", "Bytes uploaded to blob storage."),
+        "audio_s": ("audio_seconds", "Seconds of lecture audio extracted."),
+        "speech_s": ("speech_seconds", "Seconds of speech decoded by whisper."),
+        "pages": ("pages", "Document pages scheduled or partitioned."),
+        "chunks": ("chunks", "Chunks produced and embedded."),
+        "vectors": ("vectors", "Vectors written to the index."),
+    }
+    for field, (name, help_text) in help_texts.items():
+        lines += [f"# TYPE pipeline_task_{name} counter", f"# HELP pipeline_task_{name} {help_text}"]
+        for key, value in sorted(totals.items()):
+            task, class_name, metric = key.split("|")
+            if metric == field:
+                lines.append(f"pipeline_task_{name}_total{_format_labels(task=task, class_name=class_name)} {_format_value(value)}")
+
+    lines += [
+        "# TYPE pipeline_task_duration_seconds histogram",
+        "# HELP pipeline_task_duration_seconds Wall-clock time per task run.",
+    ]
+    series = sorted({_labels(*key.split("|")[:2]) for key in buckets})
+    for labels in series:
+        task, class_name = labels.split("|")
+        cumulative = 0
+        for bound in WALL_BUCKETS:
+            cumulative += buckets.get(f"{labels}|{bound}", 0)
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"pipeline_task_duration_seconds_bucket{_format_labels(task=task, class_name=class_name, le=le)} {cumulative}")
+        lines.append(f"pipeline_task_duration_seconds_count{_format_labels(task=task, class_name=class_name)} {cumulative}")
+        lines.append(f"pipeline_task_duration_seconds_sum{_format_labels(task=task, class_name=class_name)} {_format_value(totals.get(f'{labels}|wall_s', 0))}")
+
+    lines += [
+        "# TYPE pipeline_chain_wall_seconds gauge",
+        "# HELP pipeline_chain_wall_seconds Summed task wall time of a recent ingest chain.",
+    ]
+    chain_lines = {"cpu_s": [], "audio_s": [], "vectors": []}
+    for chain_id in redis.zrevrange(_key("chains"), 0, -1):
+        summary = chain_summary(chain_id.decode())
+        labels = _format_labels(chain_id=summary["chain_id"], class_name=summary["class_name"])
+        lines.append(f"pipeline_chain_wall_seconds{labels} {_format_value(summary['total']['wall_s'])}")
+        for field in chain_lines:
+            chain_lines[field].append(f"{labels} {_format_value(summary['total'][field])}")
+    for field, name in (("cpu_s", "cpu_seconds"), ("audio_s", "audio_seconds"), ("vectors", "vectors")):
+        lines += [f"# TYPE pipeline_chain_{name} gauge", f"# HELP pipeline_chain_{name} Summed over a recent ingest chain."]
+        lines += [f"pipeline_chain_{name}{line}" for line in chain_lines[field]]
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcript', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(db_index=True, max_length=255)),
+                ('file_name', models.CharField(max_length=255)),
+                ('blob_name', models.CharField(max_length=1024)),
+                ('kind', models.CharField(max_length=16)),
+                ('stem', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField(default=0)),
+                ('stage', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
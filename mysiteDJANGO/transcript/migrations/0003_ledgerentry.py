@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcript', '0002_ingestfile'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='contentlink',
+            name='indexed',
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_name', models.CharField(max_length=100)),
+                ('document_id', models.CharField(max_length=1024)),
+                ('sha256', models.CharField(max_length=64)),
+                ('chunk_ids', models.JSONField(default=list)),
+                ('vector_ids', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('class_name', 'document_id')},
+            },
+        ),
+    ]
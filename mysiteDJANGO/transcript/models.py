@@ -1,3 +1,57 @@
 from django.db import models
 
-# Create your models here.
+
+class ContentRecord(models.Model):
+    """One set of file bytes, keyed by SHA-256, and the pipeline outputs derived from it."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    kind = models.CharField(max_length=16)  # lowercased file suffix, e.g. 'mp4', 'pdf', 'txt'
+    source_blob = models.CharField(max_length=1024)  # first blob these bytes were stored under
+    transcript_blob = models.CharField(max_length=1024, blank=True)  # videos: transcript produced from them
+    chunks_blob = models.CharField(max_length=1024, blank=True)  # documents: cached partitioned + embedded chunks
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.kind} {self.sha256[:12]}'
+
+class ContentLink(models.Model):
+    """A content record as it appears in one class, under one blob name."""
+    record = models.ForeignKey(ContentRecord, on_delete=models.CASCADE, related_name='links')
+    class_name = models.CharField(max_length=100)
+    blob_name = models.CharField(max_length=1024)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('class_name', 'blob_name')
+
+    def __str__(self):
+        return f'{self.class_name}: {self.blob_name}'
+
+class IngestFile(models.Model):
+    """Progress of one zip member through an ingest job; job_id is the ingest task id."""
+    job_id = models.CharField(max_length=255, db_index=True)
+    file_name = models.CharField(max_length=255)
+    blob_name = models.CharField(max_length=1024)
+    kind = models.CharField(max_length=16)
+    stem = models.CharField(max_length=255)  # file name without suffix, matches audio/transcript paths
+    size = models.BigIntegerField(default=0)
+    stage = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.file_name}: {self.stage}'
+
+class LedgerEntry(models.Model):
+    """A document as last written into its class's vector index: its bytes, chunks and vector ids."""
+    class_name = models.CharField(max_length=100)
+    document_id = models.CharField(max_length=1024)  # blob name of the document in the class
+    sha256 = models.CharField(max_length=64)
+    chunk_ids = models.JSONField(default=list)  # unstructured element ids, in document order
+    vector_ids = models.JSONField(default=list)  # ids written to the index, deleted when the document changes
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('class_name', 'document_id')
+
+    def __str__(self):
+        return f'{self.class_name}: {self.document_id} ({len(self.vector_ids)} vectors)'
@@ -0,0 +1,126 @@
+#page counting and batch scheduling for the unstructured partition step
+import io
+import logging
+import math
+from collections import OrderedDict
+
+#logging for partition scheduling
+logger = logging.getLogger(__name__)
+
+#pdf trailers, xref tables and the page tree root sit in a handful of small regions
+RANGE_BLOCK_SIZE = 64 * 1024
+RANGE_CACHE_BLOCKS = 32
+
+#plain text (transcripts) has no page tree, estimate pages the way unstructured meters them
+TEXT_PAGE_BYTES = 4000
+
+
+class BlobRangeReader(io.RawIOBase):
+    """Seekable, read-only view of a blob that fetches fixed-size blocks with ranged GETs on demand.
+
+    Recently used blocks are kept in a small LRU so backward scans for the trailer don't refetch.
+    """
+
+    def __init__(self, blob_client, size, block_size=RANGE_BLOCK_SIZE, cache_blocks=RANGE_CACHE_BLOCKS):
+        super().__init__()
+        self.blob_client = blob_client
+        self.size = size
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.position = 0
+        self.bytes_fetched = 0
+        self._blocks = OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self.position = max(0, position)
+        return self.position
+
+    def _block(self, index):
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+
+        offset = index * self.block_size
+        length = min(self.block_size, self.size - offset)
+        block = self.blob_client.download_blob(offset=offset, length=length).readall()
+        self.bytes_fetched += len(block)
+
+        self._blocks[index] = block
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        wanted = min(len(view), self.size - self.position)
+        written = 0
+        while written < wanted:
+            index, start = divmod(self.position, self.block_size)
+            block = self._block(index)
+            length = min(len(block) - start, wanted - written)
+            view[written:written + length] = block[start:start + length]
+            written += length
+            self.position += length
+        return written
+
+
+def count_pages(blob_client, blob_name, size):
+    """Page count of a document blob without downloading it.
+
+    PDFs are opened through ranged reads of the trailer, xref and page tree only; anything
+    else is estimated from its size.
+    """
+    if not blob_name.lower().endswith(".pdf"):
+        return max(1, math.ceil(size / TEXT_PAGE_BYTES))
+
+    from pypdf import PdfReader
+
+    reader = BlobRangeReader(blob_client, size)
+    pages = len(PdfReader(reader).pages)
+    logger.info(f"Counted {pages} pages in {blob_name} reading {reader.bytes_fetched} of {size} bytes")
+    return pages
+
+
+def pack_batches(pages, quota):
+    """Split {document: pages} into the fewest balanced batches of at most quota pages each.
+
+    Documents are placed largest first into the currently lightest batch; when that batch has
+    no room another batch is added and packing starts over. A document over the quota on its
+    own gets a batch to itself.
+    """
+    oversized = [[document] for document, count in pages.items() if count > quota]
+    fitting = sorted(((count, document) for document, count in pages.items() if count <= quota), reverse=True)
+    if not fitting:
+        return oversized
+
+    bins = max(1, math.ceil(sum(count for count, _ in fitting) / quota))
+    while True:
+        loads = [0] * bins
+        batches = [[] for _ in range(bins)]
+        for count, document in fitting:
+            lightest = min(range(bins), key=loads.__getitem__)
+            if loads[lightest] + count > quota:
+                break
+            loads[lightest] += count
+            batches[lightest].append(document)
+        else:
+            return batches + oversized
+        bins += 1
@@ -0,0 +1,65 @@
+#per-file stage tracking for ingest jobs
+import logging
+import os
+
+from django.utils import timezone
+
+from transcript.models import IngestFile
+
+#logging for progress tracking
+logger = logging.getLogger(__name__)
+
+#pipeline stages a file moves through, in order
+UPLOADED = "uploaded"
+EXISTING = "already in class"
+REUSED = "transcript reused"
+STORED = "stored"
+QUEUED = "queued"
+EXTRACTING = "extracting audio"
+TRANSCRIBING = "transcribing"
+TRANSCRIBED = "transcribed"
+PARTITIONING = "partitioning"
+INDEXED = "indexed"
+FAILED = "failed"
+
+
+def path_key(path):
+    """(stem, kind) of the source file behind any pipeline path: video blob, audio, transcript or pdf."""
+    stem, suffix = os.path.splitext(os.path.basename(path))
+    suffix = suffix.lower()
+    if suffix == ".txt" and stem.endswith("_transcription"):
+        return stem[:-len("_transcription")], "mp4"
+    if suffix in (".pcm", ".mp3"):
+        return stem, "mp4"
+    return stem, suffix.lstrip(".")
+
+
+def track_file(job_id, file_name, blob_name, size, stage):
+    stem, kind = path_key(file_name)
+    IngestFile.objects.create(
+        job_id=job_id,
+        file_name=file_name,
+        blob_name=blob_name,
+        kind=kind,
+        stem=stem,
+        size=size,
+        stage=stage,
+    )
+
+
+def mark(job_id, paths, stage):
+    """Move the files behind paths to stage; a no-op for tasks that are not part of an ingest job."""
+    if not job_id:
+        return
+    for path in paths:
+        stem, kind = path_key(path)
+        IngestFile.objects.filter(job_id=job_id, stem=stem, kind=kind).update(stage=stage, updated_at=timezone.now())
+
+
+def mark_all(job_id, from_stages, stage):
+    if job_id:
+        IngestFile.objects.filter(job_id=job_id, stage__in=from_stages).update(stage=stage, updated_at=timezone.now())
+
+
+def job_files(job_id):
+    return list(IngestFile.objects.filter(job_id=job_id).order_by("id").values("file_name", "kind", "size", "stage"))
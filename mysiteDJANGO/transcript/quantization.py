@@ -0,0 +1,231 @@
+#shorter and cheaper vectors: matryoshka truncation, and codecs for vectors stored in the local index
+import numpy as np
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_CLUSTER = 256
+
+#product quantization codebook size, one uint8 code per subspace
+PQ_CENTROIDS = 256
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def truncate(vectors, dimension):
+    """Matryoshka truncation: the leading dimension components, renormalized.
+
+    Only meaningful for models trained for it (text-embedding-3, nomic, mxbai), whose
+    leading components carry most of the signal.
+    """
+    return normalize(np.asarray(vectors)[..., :dimension])
+
+
+def assign(vectors, centroids, spherical=True, block_size=4096):
+    """Nearest centroid of every row (by inner product if spherical, else Euclidean), in bounded blocks."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    squared_norms = None if spherical else (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        products = block @ centroids.T
+        if spherical:
+            assignment[start:start + block_size] = np.argmax(products, axis=1)
+        else:
+            assignment[start:start + block_size] = np.argmin(squared_norms - 2 * products, axis=1)
+    return assignment
+
+
+def kmeans(vectors, clusters, spherical=True, iterations=KMEANS_ITERATIONS, seed=0):
+    """k-means over (a sample of) the rows; spherical keeps centroids on the unit sphere for cosine data."""
+    rng = np.random.default_rng(seed)
+    sample = min(len(vectors), clusters * KMEANS_SAMPLE_PER_CLUSTER)
+    training = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample, replace=False))], dtype=np.float32)
+    centroids = training[rng.choice(len(training), clusters, replace=len(training) < clusters)].copy()
+
+    for _ in range(iterations):
+        assignment = assign(training, centroids, spherical)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=clusters)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(training[order], starts[filled], axis=0)
+        #clusters that lost every point are reseeded from random points
+        sums[~filled] = training[rng.choice(len(training), int((~filled).sum()))]
+        counts[~filled] = 1
+        centroids = normalize(sums) if spherical else sums / counts[:, None]
+    return centroids
+
+
+class Codec:
+    """How vectors are stored: encode(float32 rows) -> codes, and scores of codes against a query.
+
+    Lossy codecs (exact = False) are trained on the vectors they'll store; their state is
+    saved next to the codes with state() and restored with the constructor's state argument.
+    """
+
+    name = None
+    exact = True
+
+    def __init__(self, dimension, state=None):
+        self.dimension = dimension
+
+    def train(self, vectors):
+        pass
+
+    def state(self):
+        return {}
+
+    def encode(self, vectors):
+        raise NotImplementedError
+
+    def decode(self, codes):
+        raise NotImplementedError
+
+    def scorer(self, query):
+        """function(codes) -> approximate inner products of the coded rows with query."""
+        raise NotImplementedError
+
+    def code_size(self):
+        """Bytes per stored vector."""
+        raise NotImplementedError
+
+
+class FloatCodec(Codec):
+    dtype = np.float32
+
+    def encode(self, vectors):
+        return np.asarray(vectors).astype(self.dtype)
+
+    def decode(self, codes):
+        return np.asarray(codes, dtype=np.float32)
+
+    def scorer(self, query):
+        return lambda codes: np.asarray(codes, dtype=np.float32) @ query
+
+    def code_size(self):
+        return self.dimension * np.dtype(self.dtype).itemsize
+
+
+class Float32Codec(FloatCodec):
+    name = "float32"
+    dtype = np.float32
+
+
+class Float16Codec(FloatCodec):
+    """Half precision; for unit vectors the rounding error is far below ranking noise."""
+
+    name = "float16"
+    dtype = np.float16
+
+
+class ScalarQuantizer(Codec):
+    """int8 scalar quantization with a per-dimension range learned from the stored vectors (4x smaller than float32)."""
+
+    name = "int8"
+    exact = False
+
+    def __init__(self, dimension, state=None):
+        super().__init__(dimension)
+        self.low = state["low"] if state else np.full(dimension, -1.0, np.float32)
+        self.step = state["step"] if state else np.full(dimension, 2.0 / 255, np.float32)
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors):
+            self.low = vectors.min(axis=0)
+            self.step = np.maximum(vectors.max(axis=0) - self.low, 1e-6) / 255
+
+    def state(self):
+        return {"low": self.low, "step": self.step}
+
+    def encode(self, vectors):
+        levels = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.step)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return self.low + (np.asarray(codes, dtype=np.float32) + 128) * self.step
+
+    def scorer(self, query):
+        #q . (low + (code + 128) * step) = q . low + 128 q . step + code . (q * step)
+        scaled = (query * self.step).astype(np.float32)
+        offset = float(query @ self.low + 128 * scaled.sum())
+        return lambda codes: np.asarray(codes, dtype=np.float32) @ scaled + offset
+
+    def code_size(self):
+        return self.dimension
+
+
+class ProductQuantizer(Codec):
+    """Product quantization: the vector is split into subspaces, each stored as one byte naming
+    the nearest of 256 learned sub-centroids; queries are scored from per-subspace lookup tables.
+    """
+
+    name = "pq"
+    exact = False
+
+    def __init__(self, dimension, state=None, subspaces=None):
+        super().__init__(dimension)
+        if state:
+            self.codebooks = state["codebooks"]
+            self.subspaces = len(self.codebooks)
+        else:
+            self.subspaces = subspaces or max(dimension // 8, 1)
+            self.codebooks = None
+        if dimension % self.subspaces:
+            raise ValueError(f"PQ subspaces ({self.subspaces}) must divide the dimension ({dimension})")
+        self.width = dimension // self.subspaces
+
+    def _split(self, vectors):
+        return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.subspaces, self.width)
+
+    def train(self, vectors):
+        parts = self._split(vectors)
+        self.codebooks = np.stack([
+            kmeans(parts[:, subspace], min(PQ_CENTROIDS, len(parts)), spherical=False, seed=subspace)
+            for subspace in range(self.subspaces)
+        ])
+
+    def state(self):
+        return {"codebooks": self.codebooks} if self.codebooks is not None else {}
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty((len(parts), self.subspaces), dtype=np.uint8)
+        if not len(parts):
+            return codes
+        for subspace in range(self.subspaces):
+            codes[:, subspace] = assign(parts[:, subspace], self.codebooks[subspace], spherical=False)
+        return codes
+
+    def decode(self, codes):
+        codes = np.asarray(codes)
+        return np.concatenate(
+            [self.codebooks[subspace][codes[:, subspace]] for subspace in range(self.subspaces)], axis=1
+        )
+
+    def scorer(self, query):
+        #(subspaces, centroids) table of sub-products, a score is one lookup per subspace
+        table = np.einsum("scw,sw->sc", self.codebooks, query.reshape(self.subspaces, self.width))
+        columns = np.arange(self.subspaces)
+        return lambda codes: table[columns, np.asarray(codes, dtype=np.intp)].sum(axis=1)
+
+    def code_size(self):
+        return self.subspaces
+
+
+CODECS = {
+    codec.name: codec
+    for codec in (Float32Codec, Float16Codec, ScalarQuantizer, ProductQuantizer)
+}
+
+
+def get_codec(name, dimension, state=None, **options):
+    try:
+        codec_class = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown vector codec {name!r}, choose from {sorted(CODECS)}")
+    if codec_class is ProductQuantizer:
+        return codec_class(dimension, state, subspaces=options.get("subspaces"))
+    return codec_class(dimension, state)
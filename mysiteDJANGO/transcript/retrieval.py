@@ -0,0 +1,112 @@
+#question -> top-k chunks from a class's vector index, optionally fused with its lexical index
+import logging
+import threading
+
+from django.conf import settings
+
+from transcript import lexical
+from transcript.clients import get_embedder, get_index, get_vector_store
+from transcript.ingest import class_folders
+from transcript.vector_store import IndexNotFound
+from transcript.vectors import VECTOR_METADATA_KEYS, class_filter, index_name_for, namespace_for
+
+#logging for retrieval
+logger = logging.getLogger(__name__)
+
+
+def pipeline_class_name(class_choice):
+    """The name the ingest pipeline filed a class under, e.g. 'Intro Bio' -> 'Intro_Bio_data'."""
+    return class_folders(class_choice)[0]
+
+
+def embed_question(question):
+    return get_embedder().embed([question])[0]
+
+
+def search(class_name, question, top_k=None, vector=None):
+    """Return the class's top_k chunks for question, best first, with their source metadata.
+
+    vector is the question's embedding, when the caller already has it. With RETRIEVAL_HYBRID
+    the vector and BM25 rankings are fused by reciprocal rank, and score is the fused score.
+    Raises IndexNotFound if the class has no index yet.
+    """
+    top_k = min(top_k or settings.RETRIEVAL_TOP_K, settings.RETRIEVAL_MAX_TOP_K)
+    if vector is None:
+        vector = embed_question(question)
+    if not settings.RETRIEVAL_HYBRID:
+        return vector_search(class_name, vector, top_k)
+
+    candidates = max(top_k, settings.RETRIEVAL_FUSION_CANDIDATES)
+    dense = vector_search(class_name, vector, candidates)
+    try:
+        sparse = lexical.search(class_name, question, candidates)
+    except Exception as e:
+        logger.warning(f"Lexical search failed for {class_name}, using vectors only: {e}")
+        return dense[:top_k]
+    return fuse([dense, sparse], top_k)
+
+
+def vector_search(class_name, vector, top_k):
+    query = {
+        "vector": vector.tolist(),
+        "top_k": top_k,
+        "namespace": namespace_for(class_name),
+        "include_metadata": True,
+    }
+    #a shared index holds every class, the namespace isolates them and the filter guards older vectors
+    if settings.PINECONE_SHARED_INDEX:
+        query["filter"] = class_filter(class_name)
+    index_name = index_name_for(class_name)
+    try:
+        response = get_index(index_name).query(**query)
+    except Exception as e:
+        if get_vector_store().index_missing(e):
+            raise IndexNotFound(f"{class_name} has no index {index_name} yet") from e
+        raise
+
+    results = []
+    for match in response.matches:
+        metadata = match.metadata or {}
+        results.append({
+            "id": match.id,
+            "score": match.score,
+            "text": metadata.get("text", ""),
+            "source": {key: metadata[key] for key in VECTOR_METADATA_KEYS if key in metadata},
+        })
+    return results
+
+
+def fuse(rankings, top_k):
+    """Reciprocal-rank fusion: each ranking adds 1 / (RRF_K + rank) to a chunk, matched by vector id."""
+    scores, chunks = {}, {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            scores[result["id"]] = scores.get(result["id"], 0.0) + 1.0 / (settings.RRF_K + rank)
+            chunks.setdefault(result["id"], result)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [
+        {"id": chunk_id, "score": scores[chunk_id], "text": chunks[chunk_id]["text"], "source": chunks[chunk_id]["source"]}
+        for chunk_id in best
+    ]
+
+
+def warm_up(class_name=None):
+    """Build the embedder and index connections ahead of the first question, optionally for one class."""
+    get_embedder().embed(["warm up"])
+    if class_name or settings.PINECONE_SHARED_INDEX:
+        get_index(index_name_for(class_name or "")).describe_index_stats()
+    if class_name and settings.RETRIEVAL_HYBRID:
+        lexical.search(class_name, "warm up", 1)
+    logger.info("Retrieval path warmed up")
+
+
+def warm_up_in_background():
+    """Warm the query path without delaying process start; failures only cost the first request its warmth."""
+    def run():
+        try:
+            warm_up()
+        except Exception as e:
+            logger.warning(f"Retrieval warm-up failed: {e}")
+
+    threading.Thread(target=run, name="retrieval-warm-up", daemon=True).start()
@@ -0,0 +1,62 @@
+#timestamped transcript segments, stored next to each transcript as compact JSONL
+import json
+import os
+
+TRANSCRIPT_SUFFIX = "_transcription.txt"
+SEGMENTS_SUFFIX = "_segments.jsonl"
+
+#whisper timestamp tokens count in 20 ms steps (N_SAMPLES_PER_TOKEN / SAMPLE_RATE) from the start of their window
+TIMESTAMP_SECONDS = 0.02
+
+
+def transcript_stem(transcript_name):
+    name = os.path.basename(transcript_name)
+    return name[:-len(TRANSCRIPT_SUFFIX)] if name.endswith(TRANSCRIPT_SUFFIX) else os.path.splitext(name)[0]
+
+
+def segments_name(transcript_name):
+    """'<dir>/<video>_transcription.txt' -> '<dir>/<video>_segments.jsonl', for local paths and blob names."""
+    return os.path.join(os.path.dirname(transcript_name), f"{transcript_stem(transcript_name)}{SEGMENTS_SUFFIX}")
+
+
+def video_name(transcript_name):
+    return f"{transcript_stem(transcript_name)}.mp4"
+
+
+def timed_segments(tokens, tokenizer, window_seconds):
+    """(start_s, end_s, text) within a window from whisper's <|t|> text <|t|> token pairs.
+
+    Timestamps needn't come in pairs: a segment ends at the next timestamp and the one after it
+    starts there, unless another timestamp comes first. Text before the first timestamp starts
+    the window, text after the last one (a window cut mid-sentence) runs to its end.
+    """
+    segments = []
+    start, text_tokens = 0.0, []
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        timestamp = (token - tokenizer.timestamp_begin) * TIMESTAMP_SECONDS
+        if text_tokens:
+            segments.append((start, max(timestamp, start), tokenizer.decode(text_tokens).strip()))
+            text_tokens = []
+        start = timestamp
+    if text_tokens:
+        segments.append((start, max(window_seconds, start), tokenizer.decode(text_tokens).strip()))
+    return [(min(start, window_seconds), min(end, window_seconds), text) for start, end, text in segments if text]
+
+
+def write_segments(path, segments):
+    """One {"start", "end", "text"} object per line, times in seconds rounded to centiseconds."""
+    with open(path, "w") as f:
+        for start, end, text in segments:
+            f.write(json.dumps({"start": round(start, 2), "end": round(end, 2), "text": text}, separators=(",", ":")))
+            f.write("\n")
+
+
+def read_segments(path):
+    with open(path) as f:
+        return [
+            (segment["start"], segment["end"], segment["text"])
+            for segment in map(json.loads, filter(str.strip, f))
+        ]
@@ -1,185 +1,366 @@
 #import celery module
-from celery import shared_task
+from celery import shared_task, chain, chord, group
 
-#import azure tools
-from azure.storage.blob import BlobServiceClient
+#import django settings
 from django.conf import settings
 
-#video-audio-text packages
-from moviepy.editor import VideoFileClip
-import whisper
+#heavy clients (blob storage, pinecone, whisper) are created lazily, once per worker process
+from transcript.clients import (
+    get_container_client,
+    get_embedder,
+    get_index,
+    get_sentence_embedder,
+    get_transcription_backend,
+    get_vector_store,
+)
+
+#streaming audio extraction
+from transcript.audio import SAMPLE_RATE, SAMPLE_WIDTH, extract_audio
+
+#content-addressed reuse of transcripts and embedded chunks
+from transcript import dedup
+
+#concurrent, streamed blob transfers
+from transcript.transfer import copy_many, download_to_file, upload_many
+
+#zip ingestion, per-file progress and per-task metrics
+from transcript import metrics, progress
+from transcript.metrics import MeteredTask
+from transcript.ingest import ingest_zip
+
+#page counting and batch scheduling for partitioning, and the per-class index ledger
+from transcript.partitions import count_pages, pack_batches
+from transcript import answer_cache, ledger
+from transcript.vectors import index_name_for, namespace_for
+from transcript.embedders import embed_directory
+from transcript.chunking import has_text_layer, partition_document, partition_segments
+from transcript import segments
 
 #other misc. imports
 import os
 import re
+import json
 import shutil
 import logging
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 #import numpy
 import numpy as np
 
-#import pinecone
-from pinecone import Pinecone, ServerlessSpec
-
-#import unstructured requirements
-from unstructured_ingest.v2.pipeline.pipeline import Pipeline
-from unstructured_ingest.v2.interfaces import ProcessorConfig
-from unstructured_ingest.v2.processes.partitioner import PartitionerConfig
-from unstructured_ingest.v2.processes.connectors.fsspec.azure import (
-    AzureIndexerConfig,
-    AzureDownloaderConfig,
-    AzureConnectionConfig,
-    AzureAccessConfig
-)
-from unstructured_ingest.v2.processes.connectors.pinecone import (PineconeConnectionConfig, PineconeAccessConfig, PineconeUploaderConfig, PineconeUploadStagerConfig)
-from unstructured_ingest.v2.processes.chunker import ChunkerConfig
-from unstructured_ingest.v2.processes.embedder import EmbedderConfig
-
 #logging for celery tasks
 logger = logging.getLogger(__name__)
 
-#create client
-blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_CONNECTION_STRING)
+def start_pipeline(ingested):
+    """Dispatch the transcription/partition/index workflow for one ingested zip."""
+    blob_class = ingested["class_name"]
+    MP4_paths = ingested["MP4_paths"]
+    PDF_paths = ingested["PDF_paths"]
+    reused_transcripts = ingested["reused_transcripts"]
+
+    # Call the background task to transcribe any mp4 files
+    if MP4_paths:
+        #one extract -> transcribe -> upload chain per video (or per TRANSCRIPTION_FILES_PER_TASK videos,
+        #so a whisper task can fill its encoder batches with windows from several short files)
+        files_per_task = max(settings.TRANSCRIPTION_FILES_PER_TASK, 1)
+        video_chains = group(
+            chain(
+                process_uploaded_files.s(blob_class, MP4_paths[start:start + files_per_task], []),
+                whisper_transcription.s(),
+                upload_transcriptions.s())
+            for start in range(0, len(MP4_paths), files_per_task))
+
+        #fan back in once every video has been transcribed (or dropped)
+        return chord(
+            video_chains,
+            chain(
+                collect_transcriptions.s(blob_class, PDF_paths, reused_transcripts),
+                documents_to_partition.s(),
+                upload_partitions.s(),
+                create_pinecone_index.s(),
+                partition_batches.s())).apply_async()
+
+    data = (blob_class, reused_transcripts, PDF_paths)
+    return chain(
+        documents_to_partition.s(data),
+        upload_partitions.s(),
+        create_pinecone_index.s(),
+        partition_batches.s()).apply_async()
+
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
+def ingest_class_data(self, zip_path, class_name):
+    """Stream an uploaded class zip into blob storage, then start the pipeline; the task id is the job id."""
+    job_id = self.request.id
+    meta = {
+        "class_name": class_name,
+        "stage": "ingesting",
+        "files_total": 0,
+        "files_uploaded": 0,
+        "bytes_total": 0,
+        "bytes_transferred": 0,
+    }
+
+    def on_progress(file_name, blob_name, size, status, members):
+        progress.track_file(job_id, file_name, blob_name, size, status)
+        meta["files_total"] = len(members)
+        meta["bytes_total"] = sum(info.file_size for info in members)
+        meta["files_uploaded"] += 1
+        meta["bytes_transferred"] += size
+        self.update_state(state="PROGRESS", meta=meta)
+
+    try:
+        self.update_state(state="PROGRESS", meta=meta)
+        ingested = ingest_zip(zip_path, class_name, get_container_client(), on_progress=on_progress)
+    finally:
+        #the zip was staged in a per-job scratch directory by the view
+        shutil.rmtree(os.path.dirname(zip_path), ignore_errors=True)
 
-#load whisper model
-whisper_model = whisper.load_model('base')  # Load the model once
+    #everything uploaded, files wait for their pipeline stage
+    progress.mark(job_id, ingested["MP4_paths"] + ingested["PDF_paths"] + ingested["reused_transcripts"], progress.QUEUED)
+    progress.mark_all(job_id, [progress.UPLOADED, progress.EXISTING], progress.STORED)
 
-#pinecone auth services
-pinecone_api_key = settings.PINECONE_API_KEY
-pc = Pinecone(api_key=pinecone_api_key)
+    metrics.record(class_name, bytes_out=meta["bytes_transferred"])
+    workflow = start_pipeline(ingested)
+    meta.update(stage="processing", pipeline_id=workflow.id, reused=ingested["reused"], existing=ingested["existing"])
+    logger.info(f"[{job_id}] Ingested {meta['files_uploaded']} files for {class_name}, pipeline {workflow.id}")
+    return meta
 
-@shared_task(acks_late=True, bind=True)
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
 def process_uploaded_files(self, class_name, MP4_files, PDF_files):  # renamed parameter to avoid confusion
-    container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER)
-    temp_download_dir = f"temp/{class_name}"
+    container_client = get_container_client()
     processed_mp3_files = []  # new name to avoid shadowing
+    metrics.record(class_name)
     
-    try:
-        os.makedirs(temp_download_dir, exist_ok=True)
-        
-        for blob_name in MP4_files:  # iterate over the input files
-            download_path = os.path.join(temp_download_dir, os.path.basename(blob_name))
+    for blob_name in MP4_files:  # iterate over the input files
+        logger.info(f"starting processing for {blob_name}")
+        progress.mark(self.request.root_id, [blob_name], progress.EXTRACTING)
+        base_filename = os.path.splitext(os.path.basename(blob_name))[0]
+
+        #every video gets its own scratch directory so concurrent per-file chains never collide
+        temp_download_dir = os.path.join("temp", class_name, base_filename)
+
+        try:
+            os.makedirs(temp_download_dir, exist_ok=True)
             blob_client = container_client.get_blob_client(blob_name)
-            logger.info(f"starting processing for {blob_name}")
 
-            with open(download_path, "wb") as download_file:
-                download_file.write(blob_client.download_blob().readall())
+            #demux straight from ranged blob reads into 16 kHz PCM, no local video copy
+            if settings.AUDIO_EXTRACTION_MODE == "stream":
+                output_audio_path = os.path.join(temp_download_dir, f"{base_filename}.pcm")
+                extract_audio(blob_client, output_audio_path, settings.AZURE_SAS_TOKEN)
+                processed_mp3_files.append(output_audio_path)
+                metrics.record(audio_s=os.path.getsize(output_audio_path) / (SAMPLE_RATE * SAMPLE_WIDTH))
+                continue
+
+            #legacy path, moviepy is only imported when it is actually used
+            from moviepy.editor import VideoFileClip
+
+            download_path = os.path.join(temp_download_dir, os.path.basename(blob_name))
+            metrics.record(bytes_in=download_to_file(container_client, blob_name, download_path))
             
-            base_filename = os.path.splitext(os.path.basename(blob_name))[0]
             output_audio_path = os.path.join(temp_download_dir, f"{base_filename}.mp3")
             
             try:
                 video_clip = VideoFileClip(download_path)
                 audio_clip = video_clip.audio
                 audio_clip.write_audiofile(output_audio_path)
+                metrics.record(audio_s=audio_clip.duration)
                 audio_clip.close()
                 video_clip.close()
                 processed_mp3_files.append(output_audio_path)  # append to the new list
-            except Exception as e:
-                logger.info(f"Error processing video file {download_path}: {e}")
             finally:
                 os.remove(download_path)
-    except Exception as e:
-        logger.info(f"Error processing uploaded files for {class_name}: {e}")
-        raise
+        except Exception as e:
+            #a bad video is logged and dropped so its siblings in the group still finish
+            logger.info(f"Error processing video file {blob_name}: {e}")
+            shutil.rmtree(temp_download_dir, ignore_errors=True)
+            progress.mark(self.request.root_id, [blob_name], progress.FAILED)
     
+    progress.mark(self.request.root_id, processed_mp3_files, progress.TRANSCRIBING)
     logger.info("beginning whisper transcription")
     data = (class_name, processed_mp3_files, PDF_files)  # return the processed files
     logger.info(f"PROCESS FILES END - Returning data: {data}")
 
     return data
 
-@shared_task(acks_late=True, bind=True)
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
 def whisper_transcription(self, data):
     logger.info(f"WHISPER START - Received data type: {type(data)}")
     logger.info(f"WHISPER START - Raw data: {data}")
     
     class_name, mp3_files, PDF_files = data
-    temp_transcript_dir = f"temp/{class_name}/transcripts"
-    os.makedirs(temp_transcript_dir, exist_ok=True)
-    
     transcript_files = []
+    transcription_engine = get_transcription_backend()
+    metrics.record(class_name)
+
+    #speech windows from every file share encoder batches, silence is never decoded
+    try:
+        transcriptions = transcription_engine.transcribe_many(mp3_files)
+    except Exception as e:
+        logger.info(f"Batched transcription failed, retrying files one at a time: {e}")
+        transcriptions = {}
+        for audio_path in mp3_files:
+            try:
+                transcriptions[audio_path] = transcription_engine.transcribe(audio_path)
+            except Exception as e:
+                logger.info(f"Error transcribing audio file {audio_path}: {e}")
 
     for audio_path in mp3_files:
         try:
+            if audio_path not in transcriptions:
+                progress.mark(self.request.root_id, [audio_path], progress.FAILED)
+                continue
+
+            #transcripts live next to the audio in the file's scratch directory
+            temp_transcript_dir = os.path.join(os.path.dirname(audio_path), "transcripts")
+            os.makedirs(temp_transcript_dir, exist_ok=True)
+
             transcription_name = os.path.splitext(os.path.basename(audio_path))[0]
             transcription_file = os.path.join(temp_transcript_dir, f"{transcription_name}_transcription.txt")
 
-            # Transcribe and write to file
-            transcription_text = whisper_model.transcribe(audio_path, fp16=False)["text"].strip()
+            # Write transcription to file
+            transcription_text = transcriptions[audio_path]["text"].strip()
             with open(transcription_file, "w") as f:
                 f.write(transcription_text)
 
+            #timestamped segments sit next to the text, so chunks can point back into the lecture
+            segments.write_segments(segments.segments_name(transcription_file), transcriptions[audio_path]["segments"])
+            metrics.record(speech_s=sum(end - start for start, end, _ in transcriptions[audio_path]["segments"]))
+
+            #record which engine/model/precision produced this transcript
+            with open(f"{os.path.splitext(transcription_file)[0]}.json", "w") as f:
+                json.dump(transcription_engine.descriptor, f)
+
             transcript_files.append(transcription_file)
         except Exception as e:
-            logger.info(f"Error transcribing audio file {audio_path}: {e}")
+            logger.info(f"Error writing transcription for {audio_path}: {e}")
+            progress.mark(self.request.root_id, [audio_path], progress.FAILED)
+        finally:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
     
     # Proceed to upload transcriptions
     logger.info("Uploading transcriptions to Azure blob storage")
     data = (class_name, transcript_files, PDF_files)
     return data
     
-@shared_task(acks_late=True, bind=True)
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
 def upload_transcriptions(self, data):
     class_name, transcript_files, PDF_files = data
-    temp_download_dir = f'temp/{class_name}'
     transcript_paths = []
 
-    try:
-        container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER)
-        
-        for transcript_file in transcript_files:
-            try:
-                blob_name = f"{class_name}_transcripts/{os.path.basename(transcript_file)}"
-                blob_client = container_client.get_blob_client(blob_name)
+    container_client = get_container_client()
+
+    uploads = []
+    sidecars = []
+    metadata = {}
+    for transcript_file in transcript_files:
+        blob_name = f"{class_name}_transcripts/{os.path.basename(transcript_file)}"
+        uploads.append((transcript_file, blob_name))
+
+        segments_file = segments.segments_name(transcript_file)
+        if os.path.exists(segments_file):
+            sidecars.append((segments_file, segments.segments_name(blob_name)))
+
+        #engine descriptor written by whisper_transcription travels as blob metadata
+        descriptor_file = f"{os.path.splitext(transcript_file)[0]}.json"
+        if os.path.exists(descriptor_file):
+            with open(descriptor_file) as f:
+                metadata[transcript_file] = {key: str(value) for key, value in json.load(f).items()}
+
+    #all transcripts and their segments go up concurrently
+    failures = upload_many(container_client, uploads + sidecars, metadata)
+    metrics.record(class_name, bytes_out=sum(os.path.getsize(path) for (path, _), error in failures.items() if not error))
+    for (segments_file, blob_name) in sidecars:
+        if failures[(segments_file, blob_name)]:
+            logger.info(f"Error uploading {segments_file}: {failures[(segments_file, blob_name)]}")
+
+    for transcript_file, blob_name in uploads:
+        try:
+            if failures[(transcript_file, blob_name)]:
+                raise failures[(transcript_file, blob_name)]
+            transcript_paths.append(blob_name)
 
-                with open(transcript_file, "rb") as data:
-                    blob_client.upload_blob(data, overwrite=True)
-                    transcript_paths.append(blob_name)
+            #hash the transcript and remember which video it came from
+            dedup.register_transcript(class_name, transcript_file, blob_name)
+            progress.mark(self.request.root_id, [blob_name], progress.TRANSCRIBED)
 
-                os.remove(transcript_file)  # Clean up local file after upload
-            except Exception as e:
-                logger.info(f"Error uploading {transcript_file}: {e}")
+        except Exception as e:
+            logger.info(f"Error uploading {transcript_file}: {e}")
+            progress.mark(self.request.root_id, [transcript_file], progress.FAILED)
 
-        logger.info(f"Successfully uploaded {len(transcript_files)} transcripts for {class_name}")
-    except Exception as e:
-        logger.info(f"Error uploading transcripts for {class_name}: {e}")
-        raise
-    try:
-        shutil.rmtree(temp_download_dir)
-        logger.info(f"Temporary directory {temp_download_dir} cleared.")
-    except Exception as e:
-        logger.info(f"Error clearing temporary directory {temp_download_dir}: {e}")
-        raise
+        #clear this file's scratch directory (temp/<class>/<video>/)
+        temp_download_dir = os.path.dirname(os.path.dirname(transcript_file))
+        try:
+            shutil.rmtree(temp_download_dir)
+            logger.info(f"Temporary directory {temp_download_dir} cleared.")
+        except Exception as e:
+            logger.info(f"Error clearing temporary directory {temp_download_dir}: {e}")
+
+    logger.info(f"Successfully uploaded {len(transcript_paths)} transcripts for {class_name}")
     
     #callling partition now
     logger.info("preparing documents to partition")
     data = class_name, transcript_paths, PDF_files
     return data
 
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
+def collect_transcriptions(self, results, class_name, PDF_files, reused_transcripts=()):
+    """Chord callback: merge the per-video transcription results back into one partition job."""
+    #transcripts of videos already seen elsewhere were copied in by the view
+    transcript_paths = list(reused_transcripts)
+    metrics.record(class_name)
+    for result in results:
+        #failed videos come back with an empty transcript list
+        if result:
+            transcript_paths.extend(result[1])
+
+    logger.info(f"Collected {len(transcript_paths)} of {len(results)} transcripts for {class_name}")
+    data = (class_name, transcript_paths, PDF_files)
+    return data
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
 def num_pages(blob_path):
-    page_count = 0
     try:
-        container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER)
+        container_client = get_container_client()
         blob_client = container_client.get_blob_client(blob_path)
 
         # Get blob properties
-        blob_properties = blob_client.get_blob_properties()
-        blob_size = blob_properties.size  # Size in bytes
-
-        # Calculate pages
-        size_in_100kb_units = blob_size / (100 * 1024)  # Convert to 100KB units
-        pages = int(size_in_100kb_units) + 1  # Add 1 to account for partial pages
-        
-        logger.info(f"Successfully calculated page count for blob '{blob_path}': {pages} pages")
-        return pages
-
+        blob_size = blob_client.get_blob_properties().size  # Size in bytes
     except Exception as e:
         logger.error(f"Failed to calculate page count for blob '{blob_path}': {e}")
         return 0
 
-@shared_task(ack_late=True, bind=True)
+    try:
+        pages = count_pages(blob_client, blob_path, blob_size)
+    except Exception as e:
+        #unreadable page tree, fall back to estimating 100KB per page
+        pages = int(blob_size / (100 * 1024)) + 1
+        logger.warning(f"Could not read page tree of '{blob_path}', estimating {pages} pages: {e}")
+
+    logger.info(f"Successfully calculated page count for blob '{blob_path}': {pages} pages")
+    return pages
+
+def partition_route(blob_path):
+    """'local' for transcripts and text-layer pdfs, 'remote' for anything that needs OCR or layout analysis."""
+    if not settings.LOCAL_PARTITIONING:
+        return "remote"
+    if blob_path.lower().endswith(".txt"):
+        return "local"
+
+    try:
+        blob_client = get_container_client().get_blob_client(blob_path)
+        blob_size = blob_client.get_blob_properties().size
+        return "local" if has_text_layer(blob_client, blob_size) else "remote"
+    except Exception as e:
+        logger.warning(f"Could not check text layer of '{blob_path}', sending it to the API: {e}")
+        return "remote"
+
+@shared_task(ack_late=True, bind=True, base=MeteredTask)
 def documents_to_partition(self, data):
     #unpacking data
     logger.info("Determining documents to partition")
@@ -187,166 +368,153 @@ def documents_to_partition(self, data):
     
     #combining the paths for processing
     data_paths = transcript_paths + PDF_files
-
-    #the azure container with the blobs for pdfs
-    container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER)
-
-    #storage for documents < 1000 pages
-    partition_bucket = []
-    queue = []
-    
-    page_count = 0
-
-    #iterate through each blob and determine if it is image heavy
-    temp_part_dir = f"temp/{class_name}_partitions"
-    os.makedirs(temp_part_dir, exist_ok=True)
-
+    progress.mark(self.request.root_id, data_paths, progress.PARTITIONING)
+
+    #documents stay in blob storage, only their names are batched here
+    documents = []
+    for blob in data_paths:
+        #documents with these exact bytes were already partitioned and embedded
+        record = dedup.record_for_blob(class_name, blob)
+        if record and dedup.has_chunks(record):
+            logger.info(f"Reusing cached chunks for {blob} ({record.sha256[:12]})")
+            continue
+        documents.append(blob)
+
+    #page counts and text-layer checks come from ranged reads of each pdf, fetched concurrently
     try:
-        for blob in data_paths:
-            number_of_pages = num_pages(blob)
-            download_path = os.path.join(temp_part_dir, os.path.basename(blob))
-            blob_client = container_client.get_blob_client(blob)
-
-            try:
-                with open(download_path, "wb") as download_file:
-                    download_file.write(blob_client.download_blob().readall())
-                
-                if page_count + number_of_pages < 1000:
-                    partition_bucket.append(download_path)
-                    page_count += number_of_pages
-                    logger.info(f"Added {blob} to partition bucket, page count = {page_count}")
-                else:
-                    if not queue:
-                        logger.info(f"Starting queue with {blob}")
-                    queue.append(download_path)
-                    page_count = number_of_pages
-
-            except Exception as e:
-                logger.error(f"Failed to process {blob}: {e}")
-                continue 
-    
-        logger.info(f"PDFS for {class_name} have been processed")
-
+        with ThreadPoolExecutor(max_workers=settings.BLOB_TRANSFER_WORKERS) as pool:
+            routes = dict(zip(documents, pool.map(partition_route, documents)))
+            local_documents = [blob for blob in documents if routes[blob] == "local"]
+            remote_documents = [blob for blob in documents if routes[blob] == "remote"]
+            pages = dict(zip(remote_documents, pool.map(num_pages, remote_documents)))
     except Exception as e:
         logger.error(f"An error occurred proccessing pdfs: {e}")
         raise
-    
-    partition_docs = (partition_bucket, queue)
-    logger.info("Uploading partition documents to Azure Blob Storage")
-    data = (class_name, partition_docs, temp_part_dir)
+
+    #balanced batches under the unstructured page quota, every one of them gets partitioned
+    batches = pack_batches(pages, settings.UNSTRUCTURED_PAGE_QUOTA)
+    metrics.record(class_name, pages=sum(pages.values()))
+    for number, batch in enumerate(batches):
+        logger.info(f"Batch {number} for {class_name}: {len(batch)} documents, {sum(pages[blob] for blob in batch)} pages")
+
+    logger.info(f"PDFS for {class_name} have been processed, {len(local_documents)} will be partitioned locally")
+    data = (class_name, batches, local_documents)
     return data       
 
-@shared_task(acks_late=True, bind=True)
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
 def upload_partitions(self, data):
-    class_name, paritition_docs, temp_part_dir = data
-    partition_bucket, queue = paritition_docs
-    temp_download_dir = temp_part_dir
+    class_name, batches, local_documents = data
+    metrics.record(class_name)
 
-    logger.info("UPLOADING PARTITIONS")
-    try:
-        container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER)
-        
-        for document in partition_bucket:
-            try:
-                blob_name = f"{class_name}_partition_bucket/{os.path.basename(document)}"
-                blob_client = container_client.get_blob_client(blob_name)
-
-                with open(document, "rb") as data:
-                    blob_client.upload_blob(data, overwrite=True)
+    #one prefix per batch and job, so concurrent jobs and earlier runs never share a bucket
+    job_prefix = f"{class_name}_partition_bucket/{self.request.root_id or self.request.id}"
+    batch_prefixes = [(f"{job_prefix}/batch_{number:03d}/", batch) for number, batch in enumerate(batches)]
 
-                os.remove(document)  # Clean up local file after upload
-            except Exception as e:
-                logger.info(f"Error uploading {document}: {e}")
+    logger.info("COPYING PARTITIONS")
+    try:
+        container_client = get_container_client()
 
-        logger.info(f"Successfully uploaded {len(partition_bucket)} partitions for {class_name}")
+        copies = [
+            (blob, f"{prefix}{os.path.basename(blob)}")
+            for prefix, batch in batch_prefixes
+            for blob in batch
+        ]
 
-        for document in queue:
-            try:
-                blob_name = f"{class_name}_partition_queue/{os.path.basename(document)}"
-                blob_client = container_client.get_blob_client(blob_name)
+        #server-side copies, no document bytes cross this worker's network interface
+        failures = copy_many(container_client, copies)
+        for (blob, blob_name), error in failures.items():
+            if error:
+                logger.info(f"Error copying {blob} to {blob_name}: {error}")
 
-                with open(document, "rb") as data:
-                    blob_client.upload_blob(data, overwrite=True)
-                os.remove(document)  # Clean up local file after upload
-            
-            except Exception as e:
-                logger.info(f"Error uploading {document}: {e}")
-        logger.info(f"Successfully uploaded {len(partition_bucket)} partitions for {class_name}")
+        logger.info(f"Successfully copied {len(copies)} documents in {len(batch_prefixes)} batches for {class_name}")
 
     except Exception as e:
-        logger.info(f"Error uploading partitions for {class_name}: {e}")
+        logger.info(f"Error copying partitions for {class_name}: {e}")
         raise
     
-    try:
-        shutil.rmtree(temp_part_dir)
-    except OSError as e:
-        logger.warning(f"Failed to delete {temp_part_dir}: {e}", exc_info=True)
-    return class_name
+    data = (class_name, batch_prefixes, local_documents)
+    return data
 
-@shared_task(ack_late=True, bind=True)
-def create_pinecone_index(self, class_name):
-    logger.info(f"[{self.request.id}] Creating Pinecone index for class: {class_name}")
-    index_name = class_name.lower().replace("_", "-").replace(" ", "-").strip()
-    try:
-        existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
-        logger.debug(f"Existing indexes: {existing_indexes}")
-
-        if index_name not in existing_indexes:
-            logger.debug(f"Creating new index {index_name} with dimension 3072")
-            pc.create_index(
-                name=index_name,
-                dimension=3072,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-            )
-            logger.info(f"[{self.request.id}] Created Pinecone index: {index_name}")
+@shared_task(ack_late=True, bind=True, base=MeteredTask)
+def create_pinecone_index(self, data):
+    class_name, batch_prefixes, local_documents = data
+    index_name = index_name_for(class_name)
+    metrics.record(class_name)
+    data = (class_name, index_name, batch_prefixes, local_documents)
 
-            while not pc.describe_index(index_name).status["ready"]:
-                logger.debug(f"Waiting for index {index_name} to be ready...")
-                time.sleep(1)
+    #the shared index is bootstrapped once (manage.py bootstrap_vector_index), a new class only needs a namespace
+    if settings.PINECONE_SHARED_INDEX:
+        logger.info(f"[{self.request.id}] Using shared index {index_name}, namespace {namespace_for(class_name)}")
+        return data
 
-            index = pc.Index(index_name)
-            stats = index.describe_index_stats()
+    logger.info(f"[{self.request.id}] Creating Pinecone index for class: {class_name}")
+    try:
+        if get_vector_store().ensure_index(index_name, get_embedder().dimension):
             logger.info(f"[{self.request.id}] Pinecone index ready: {index_name}")
-            logger.debug(f"Initial index stats: {stats}")
-            data = (class_name, index_name)
-            return data
         else:
             logger.info(f"[{self.request.id}] Index already exists: {index_name}")
-            index = pc.Index(index_name)
-            stats = index.describe_index_stats()
-            logger.debug(f"Existing index stats: {stats}")
-            data = (class_name, index_name)
-            return data
+
+        stats = get_index(index_name).describe_index_stats()
+        logger.debug(f"Index stats: {stats}")
+        return data
 
     except Exception as e:
         logger.error(f"[{self.request.id}] Error creating Pinecone index: {e}", exc_info=True)
         raise
 
-@shared_task(ack_late=True, bind=True)
+@shared_task(ack_late=True, bind=True, base=MeteredTask)
+def partition_batches(self, data):
+    """Partition every batch in parallel, then upsert the class's new chunks once they're all done."""
+    class_name, index_name, batch_prefixes, local_documents = data
+    index_step = index_chunks.s(class_name, index_name)
+    metrics.record(class_name)
+
+    #everything was cached already, go straight to the upsert
+    if not batch_prefixes and not local_documents:
+        return index_step.delay([]).id
+
+    logger.info(f"Dispatching {len(batch_prefixes)} partition batches and {len(local_documents)} local documents for {class_name}")
+    runs = group(
+        [unstructured_pipeline.s((class_name, prefix, batch)) for prefix, batch in batch_prefixes]
+        + [local_partition.s((class_name, blob)) for blob in local_documents]
+    )
+    return chord(runs)(index_step).id
+
+@shared_task(ack_late=True, bind=True, base=MeteredTask)
 def unstructured_pipeline(self, data):
-    class_name, index_name = data
+    #unstructured pulls in a large dependency tree, keep it out of web and manage.py imports
+    from unstructured_ingest.v2.pipeline.pipeline import Pipeline
+    from unstructured_ingest.v2.interfaces import ProcessorConfig
+    from unstructured_ingest.v2.processes.partitioner import PartitionerConfig
+    from unstructured_ingest.v2.processes.connectors.fsspec.azure import (
+        AzureIndexerConfig,
+        AzureDownloaderConfig,
+        AzureConnectionConfig,
+        AzureAccessConfig
+    )
+    from unstructured_ingest.v2.processes.connectors.local import LocalUploaderConfig
+    from unstructured_ingest.v2.processes.chunker import ChunkerConfig
+
+    class_name, prefix, batch = data
+    metrics.record(class_name)
     
     #logging pipeline initialization
-    logger.info(f"Processing data from {class_name}, Uploading to Pinecone Index: {index_name}\n")
+    logger.info(f"Processing {len(batch)} documents from {class_name} under {prefix}\n")
     
-    #set up temporary directories
-    partition_directory = f"temp/{class_name}_unstructured/"
+    #set up temporary directories, one pair per batch run
+    partition_directory = f"temp/{class_name}_unstructured/{self.request.id}/"
+    output_directory = f"temp/{class_name}_unstructured_output/{self.request.id}/"
     os.makedirs(partition_directory, exist_ok=True)
+    container_client = get_container_client()
 
     try:
         #beginning pipeline
         logger.info(f"[{self.request.id}] Starting partition_documents task for class: {class_name}")
         
-        #reporting intial index stats
-        index = pc.Index(index_name)
-        initial_stats = index.describe_index_stats()
-        logger.info(f"Initial index stats: {initial_stats}")
-        
         #pipeline
         Pipeline.from_configs(
             context=ProcessorConfig(),
-            indexer_config=AzureIndexerConfig(remote_url=f"az://django-container/{class_name}_partition_bucket/"),
+            indexer_config=AzureIndexerConfig(remote_url=f"az://django-container/{prefix}"),
             downloader_config=AzureDownloaderConfig(download_dir = partition_directory),
             source_connection_config=AzureConnectionConfig(
                 access_config=AzureAccessConfig(
@@ -377,51 +545,165 @@ def unstructured_pipeline(self, data):
                 chunkmultipage_sections=True,
                 chunk_overlap=100,  # Try increasing overlap
             ),
-            embedder_config=EmbedderConfig(
-                embedding_provider="openai",
-                embedding_model_name="text-embedding-3-large",
-                embedding_api_key=settings.OPENAI_API_KEY,
-            ),
-            destination_connection_config=PineconeConnectionConfig(
-                access_config=PineconeAccessConfig(
-                    api_key=settings.PINECONE_API_KEY
-                ),
-                index_name= index_name
-            ),
-            
-            stager_config=PineconeUploadStagerConfig(),
-            uploader_config=PineconeUploaderConfig()
+            #chunks land on disk, embedded below and cached by content hash before upsert
+            uploader_config=LocalUploaderConfig(output_dir=output_directory)
         ).run()
         
-        #report completion
-        logger.info(f"[{self.request.id}] Partitioning completed for class: {class_name}")
+        #embed with the configured embedder, then cache this batch's chunks under their content hash
+        embedder = get_embedder()
+        embedded = embed_directory(embedder, output_directory)
+        logger.info(f"Embedded {embedded} chunks for {prefix}")
+        metrics.record(chunks=embedded, bytes_in=directory_size(partition_directory))
+        if hasattr(embedder, "stats"):
+            logger.info(f"Embedding cache: {embedder.stats}")
+        dedup.cache_chunks(container_client, class_name, output_directory)
+        logger.info(f"[{self.request.id}] Partitioning completed for {prefix}")
+        return {
+            "prefix": prefix,
+            "documents": len(batch),
+            "ok": True,
+            "embedding_cache": getattr(embedder, "stats", None),
+        }
+    
+    except Exception as e:
+        #a failed batch must not stop the others from being indexed
+        logger.error(f"[{self.request.id}] Error partitioning documents: {e}", exc_info=True)
+        progress.mark(self.request.root_id, batch, progress.FAILED)
+        return {"prefix": prefix, "documents": len(batch), "ok": False}
+    finally:
+        # Clean up temp directories and the batch's copies in the partition bucket
+        for directory in (partition_directory, output_directory):
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            logger.info(f"Cleaned up temporary directory: {directory}")
+        for blob in batch:
+            try:
+                container_client.delete_blob(f"{prefix}{os.path.basename(blob)}")
+            except Exception as e:
+                logger.warning(f"Failed to delete partition copy of {blob}: {e}")
+
+@shared_task(acks_late=True, bind=True, base=MeteredTask)
+def local_partition(self, data):
+    """Partition, chunk and embed one transcript or text-layer pdf in-process, without the unstructured API."""
+    class_name, blob = data
+    file_name = os.path.basename(blob)
+    metrics.record(class_name)
+
+    #scratch per run: the source document, and its elements in the same layout the unstructured pipeline writes
+    scratch_directory = f"temp/{class_name}_local/{self.request.id}/"
+    output_directory = os.path.join(scratch_directory, "output")
+    os.makedirs(output_directory, exist_ok=True)
+    container_client = get_container_client()
+
+    try:
+        document_path = os.path.join(scratch_directory, file_name)
+        metrics.record(bytes_in=download_to_file(container_client, blob, document_path))
+
+        #transcripts with timestamped segments are chunked on segment boundaries
+        segment_list = None
+        if blob.endswith(segments.TRANSCRIPT_SUFFIX):
+            segments_path = segments.segments_name(document_path)
+            try:
+                metrics.record(bytes_in=download_to_file(container_client, segments.segments_name(blob), segments_path))
+                segment_list = segments.read_segments(segments_path)
+                os.remove(segments_path)
+            except Exception as e:
+                logger.info(f"No segments for {blob}, chunking its plain text: {e}")
+
+        if segment_list:
+            elements = partition_segments(
+                segment_list,
+                file_name,
+                segments.video_name(blob),
+                get_sentence_embedder(),
+                similarity_threshold=settings.LOCAL_CHUNK_SIMILARITY_THRESHOLD,
+            )
+        else:
+            elements = partition_document(
+                document_path,
+                file_name,
+                get_sentence_embedder(),
+                similarity_threshold=settings.LOCAL_CHUNK_SIMILARITY_THRESHOLD,
+            )
+        with open(os.path.join(output_directory, f"{file_name}.json"), "w") as f:
+            json.dump(elements, f)
+
+        embedder = get_embedder()
+        embed_directory(embedder, output_directory)
+        metrics.record(
+            chunks=len(elements),
+            pages=len({element["metadata"]["page_number"] for element in elements if "page_number" in element["metadata"]}),
+        )
+        dedup.cache_chunks(container_client, class_name, output_directory)
+        logger.info(f"[{self.request.id}] Partitioned {blob} locally into {len(elements)} chunks")
+        return {
+            "prefix": blob,
+            "documents": 1,
+            "ok": True,
+            "embedding_cache": getattr(embedder, "stats", None),
+        }
+
+    except Exception as e:
+        logger.error(f"[{self.request.id}] Error partitioning {blob} locally: {e}", exc_info=True)
+        progress.mark(self.request.root_id, [blob], progress.FAILED)
+        return {"prefix": blob, "documents": 1, "ok": False}
+    finally:
+        shutil.rmtree(scratch_directory, ignore_errors=True)
+
+@shared_task(ack_late=True, bind=True, base=MeteredTask)
+def index_chunks(self, results, class_name, index_name):
+    """Sync the class index with its ledger, upserting from the content-hash chunk cache."""
+    container_client = get_container_client()
+    logger.info(f"Uploading to Pinecone Index: {index_name} after {len(results)} partition batches")
+
+    try:
+        #reporting intial index stats, counted in the class's namespace since indexes may be shared
+        index = get_index(index_name)
+        namespace = namespace_for(class_name)
+        initial_stats = index.describe_index_stats()
+        initial_count = initial_stats["namespaces"].get(namespace, {}).get("vector_count", 0)
+        logger.info(f"Initial index stats: {initial_stats}")
+
+        #diff the class against its ledger: retract removed and changed documents, upsert the rest
+        summary = ledger.sync(index, container_client, class_name)
+        metrics.record(class_name, vectors=summary["vectors_written"])
+        #a local index folds the sync's writes into its lists now rather than on a later write
+        if summary["vectors_written"] or summary["vectors_deleted"]:
+            try:
+                get_vector_store().optimize(index_name)
+            except Exception as e:
+                logger.warning(f"Could not optimize index {index_name}: {e}")
+
+        #answers cached for this class may rest on chunks that just changed
+        if summary["vectors_written"] or summary["vectors_deleted"]:
+            try:
+                answer_cache.invalidate(class_name)
+            except Exception as e:
+                logger.warning(f"Could not invalidate cached answers for {class_name}: {e}")
 
         # Verify upload success
         logger.info("Pipeline execution completed. Verifying results...")
         final_stats = index.describe_index_stats()
         logger.info(f"Final index stats: {final_stats}")
         
-        if final_stats['total_vector_count'] == initial_stats['total_vector_count']:
+        final_count = final_stats["namespaces"].get(namespace, {}).get("vector_count", 0)
+        
+        if final_count == initial_count:
             logger.warning("No new vectors were added to the index")
-            logger.debug(f"Initial count: {initial_stats['total_vector_count']}")
-            logger.debug(f"Final count: {final_stats['total_vector_count']}")
+            logger.debug(f"Initial count: {initial_count}")
+            logger.debug(f"Final count: {final_count}")
         else:
-            vectors_added = final_stats['total_vector_count'] - initial_stats['total_vector_count']
+            vectors_added = final_count - initial_count
             logger.info(f"Successfully added {vectors_added} vectors to the index")
             
-        logger.info(f"[{self.request.id}] Partitioning completed for class: {class_name}")
+        logger.info(f"[{self.request.id}] Indexing completed for class: {class_name}")
+        progress.mark_all(self.request.root_id, [progress.PARTITIONING], progress.INDEXED)
     
     except Exception as e:
-        logger.error(f"[{self.request.id}] Error partitioning documents: {e}", exc_info=True)
+        logger.error(f"[{self.request.id}] Error indexing documents: {e}", exc_info=True)
+        progress.mark_all(self.request.root_id, [progress.PARTITIONING], progress.FAILED)
         raise
-    finally:
-        # Clean up temp directory
-        if os.path.exists(partition_directory):
-            shutil.rmtree(partition_directory)
-        logger.info(f"Cleaned up temporary directory: {partition_directory}")
-
-
-
-        
-    
 
+    summary["batches"] = len(results)
+    summary["failed_batches"] = sum(1 for result in results if not result["ok"])
+    return summary
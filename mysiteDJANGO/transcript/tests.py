@@ -1,3 +1,693 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import time
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from transcript import answer_cache, dedup, ledger, lexical, metrics, retrieval
+from transcript.chunking import chunk_spans, partition_segments
+from transcript.local_index import IVF_MIN_VECTORS, LocalIndex
+from transcript.quantization import ProductQuantizer, ScalarQuantizer, get_codec, normalize, truncate
+from transcript.ingest import ingest_zip
+from transcript.models import ContentLink, LedgerEntry
+from transcript.partitions import pack_batches
+from transcript.segments import timed_segments
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+        self.url = name
+
+    def exists(self):
+        return self.name in self.container.blobs
+
+    def upload_blob(self, data, overwrite=False, **kwargs):
+        self.container.blobs[self.name] = data.read() if hasattr(data, "read") else data
+
+    def start_copy_from_url(self, url):
+        self.container.blobs[self.name] = self.container.blobs[url]
+        return {"copy_status": "success"}
+
+    def download_blob(self):
+        return SimpleNamespace(readall=lambda: self.container.blobs[self.name])
+
+
+class FakeContainerClient:
+    """In-memory stand-in for an Azure container client, enough for ingestion, copies and listings."""
+
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+
+    def list_blobs(self, name_starts_with=""):
+        return [SimpleNamespace(name=name) for name in sorted(self.blobs) if name.startswith(name_starts_with)]
+
+
+def class_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, data in files.items():
+            zip_file.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+class IngestZipTests(TestCase):
+    def setUp(self):
+        self.container = FakeContainerClient()
+        self.blob_name = "Intro_Bio_data/Intro_Bio_PDFs/syllabus.pdf"
+
+    def test_unchanged_file_is_not_uploaded_again(self):
+        ingest_zip(class_zip({"syllabus.pdf": b"old"}), "Intro Bio", self.container)
+        result = ingest_zip(class_zip({"syllabus.pdf": b"old"}), "Intro Bio", self.container)
+        self.assertEqual(result["existing"], ["syllabus.pdf"])
+
+    def test_changed_file_under_existing_name_overwrites_blob_and_link(self):
+        ingest_zip(class_zip({"syllabus.pdf": b"old"}), "Intro Bio", self.container)
+        result = ingest_zip(class_zip({"syllabus.pdf": b"new"}), "Intro Bio", self.container)
+
+        self.assertEqual(result["existing"], [])
+        self.assertEqual(self.container.blobs[self.blob_name], b"new")
+        new_sha, _ = dedup.hash_file(io.BytesIO(b"new"))
+        self.assertEqual(dedup.record_for_blob("Intro_Bio_data", self.blob_name).sha256, new_sha)
+
+    def test_failed_upload_leaves_no_link(self):
+        with mock.patch.object(FakeBlobClient, "upload_blob", side_effect=ConnectionError("upload failed")):
+            with self.assertRaises(ConnectionError):
+                ingest_zip(class_zip({"syllabus.pdf": b"old"}), "Intro Bio", self.container)
+        self.assertFalse(ContentLink.objects.exists())
+
+    def test_same_bytes_under_new_name_are_copied(self):
+        ingest_zip(class_zip({"syllabus.pdf": b"same"}), "Intro Bio", self.container)
+        ingest_zip(class_zip({"outline.pdf": b"same"}), "Intro Bio", self.container)
+        self.assertEqual(self.container.blobs["Intro_Bio_data/Intro_Bio_PDFs/outline.pdf"], b"same")
+
+
+@mock.patch("transcript.ledger._sync_lexical")
+class LedgerSyncTests(TestCase):
+    class_name = "Intro_Bio_data"
+
+    def setUp(self):
+        self.container = FakeContainerClient()
+        self.index = mock.Mock()
+
+    def store(self, file_name, data, chunks=2):
+        """Put a document in the class's blob storage with its embedded chunks cached."""
+        blob_name = f"{self.class_name}/{self.class_name[:-5]}_PDFs/{file_name}"
+        self.container.blobs[blob_name] = data
+        sha256, size = dedup.hash_file(io.BytesIO(data))
+        record, _ = dedup.link_content(sha256, size, self.class_name, blob_name)
+        record.chunks_blob = dedup.chunks_blob_name(sha256)
+        record.save(update_fields=["chunks_blob"])
+        elements = [{"element_id": f"e{number}", "text": f"{file_name} {number}", "embeddings": [1.0, 0.0]} for number in range(chunks)]
+        self.container.blobs[record.chunks_blob] = json.dumps(elements).encode()
+        return blob_name
+
+    def sync(self):
+        self.index.reset_mock()
+        return ledger._sync(self.index, self.container, self.class_name)
+
+    def upserted(self):
+        return [vector["id"] for call in self.index.upsert.call_args_list for vector in call.kwargs["vectors"]]
+
+    def deleted(self):
+        return [vector_id for call in self.index.delete.call_args_list for vector_id in call.kwargs["ids"]]
+
+    def vector_ids(self, document_id):
+        return LedgerEntry.objects.get(class_name=self.class_name, document_id=document_id).vector_ids
+
+    def test_added_documents_are_upserted_and_recorded(self, sync_lexical):
+        syllabus = self.store("syllabus.pdf", b"syllabus", chunks=3)
+        summary = self.sync()
+
+        self.assertEqual((summary["added"], summary["vectors_written"], summary["vectors_deleted"]), (1, 3, 0))
+        self.assertEqual(self.deleted(), [])
+        entry = LedgerEntry.objects.get(class_name=self.class_name, document_id=syllabus)
+        self.assertEqual(entry.vector_ids, self.upserted())
+        self.assertEqual(entry.chunk_ids, ["e0", "e1", "e2"])
+        self.assertEqual(entry.sha256, dedup.record_for_blob(self.class_name, syllabus).sha256)
+
+    def test_unchanged_documents_are_left_alone(self, sync_lexical):
+        self.store("syllabus.pdf", b"syllabus")
+        self.sync()
+        summary = self.sync()
+
+        self.assertEqual((summary["added"], summary["changed"], summary["removed"]), (0, 0, 0))
+        self.index.upsert.assert_not_called()
+        self.index.delete.assert_not_called()
+
+    def test_changed_document_replaces_its_vectors(self, sync_lexical):
+        syllabus = self.store("syllabus.pdf", b"first draft", chunks=3)
+        self.sync()
+        old_ids = self.vector_ids(syllabus)
+
+        self.store("syllabus.pdf", b"final version", chunks=2)
+        summary = self.sync()
+
+        self.assertEqual(summary["changed"], 1)
+        self.assertEqual(sorted(self.deleted()), sorted(old_ids))
+        self.assertEqual(self.vector_ids(syllabus), self.upserted())
+        self.assertEqual(len(self.upserted()), 2)
+        self.assertTrue(set(self.upserted()).isdisjoint(old_ids))
+        self.assertEqual(sync_lexical.call_args.args[2], [syllabus])
+
+    def test_removed_document_loses_vectors_and_ledger_row(self, sync_lexical):
+        syllabus = self.store("syllabus.pdf", b"syllabus")
+        self.store("outline.pdf", b"outline")
+        self.sync()
+        old_ids = self.vector_ids(syllabus)
+
+        del self.container.blobs[syllabus]
+        summary = self.sync()
+
+        self.assertEqual((summary["removed"], summary["vectors_deleted"]), (1, 2))
+        self.assertEqual(sorted(self.deleted()), sorted(old_ids))
+        self.assertEqual(self.upserted(), [])
+        self.assertFalse(LedgerEntry.objects.filter(class_name=self.class_name, document_id=syllabus).exists())
+
+    def test_documents_without_chunks_stay_pending(self, sync_lexical):
+        syllabus = self.store("syllabus.pdf", b"syllabus")
+        record = dedup.record_for_blob(self.class_name, syllabus)
+        record.chunks_blob = ""
+        record.save(update_fields=["chunks_blob"])
+
+        summary = self.sync()
+        self.assertEqual((summary["added"], summary["pending"]), (1, 1))
+        self.assertFalse(LedgerEntry.objects.exists())
+
+    def test_identical_documents_keep_their_own_vectors(self, sync_lexical):
+        syllabus = self.store("syllabus.pdf", b"same bytes")
+        outline = self.store("outline.pdf", b"same bytes")
+        self.sync()
+        syllabus_ids, outline_ids = self.vector_ids(syllabus), self.vector_ids(outline)
+        self.assertTrue(set(syllabus_ids).isdisjoint(outline_ids))
+
+        del self.container.blobs[syllabus]
+        summary = self.sync()
+
+        self.assertEqual(summary["removed"], 1)
+        self.assertEqual(sorted(self.deleted()), sorted(syllabus_ids))
+        self.assertEqual(self.vector_ids(outline), outline_ids)
+
+
+class FakeTokenizer:
+    """Text tokens are indexes into words, timestamp tokens count 20 ms steps from timestamp_begin."""
+
+    timestamp_begin = 100
+    words = ["hello", "class", "today", "eigenvalues"]
+
+    def decode(self, tokens):
+        return " ".join(self.words[token] for token in tokens)
+
+    def at(self, seconds):
+        return self.timestamp_begin + round(seconds / 0.02)
+
+
+class TimedSegmentsTests(SimpleTestCase):
+    tokenizer = FakeTokenizer()
+
+    def segments(self, *tokens, window_seconds=30.0):
+        return timed_segments(tokens, self.tokenizer, window_seconds)
+
+    def test_paired_timestamps(self):
+        at = self.tokenizer.at
+        self.assertEqual(
+            self.segments(at(0), 0, 1, at(2), at(2), 2, at(5.5)),
+            [(0.0, 2.0, "hello class"), (2.0, 5.5, "today")],
+        )
+
+    def test_shared_timestamp_ends_one_segment_and_starts_the_next(self):
+        at = self.tokenizer.at
+        self.assertEqual(self.segments(at(1), 0, at(3), 1, at(4)), [(1.0, 3.0, "hello"), (3.0, 4.0, "class")])
+
+    def test_unpaired_ends_run_to_the_window_edges(self):
+        at = self.tokenizer.at
+        self.assertEqual(self.segments(0, at(2), 1, window_seconds=10.0), [(0.0, 2.0, "hello"), (2.0, 10.0, "class")])
+        self.assertEqual(self.segments(3, window_seconds=10.0), [(0.0, 10.0, "eigenvalues")])
+
+    def test_times_stay_inside_the_window(self):
+        at = self.tokenizer.at
+        self.assertEqual(self.segments(at(8), 0, at(12), window_seconds=10.0), [(8.0, 10.0, "hello")])
+        #a timestamp before the start never gives a negative duration
+        self.assertEqual(self.segments(at(5), 0, at(3), window_seconds=10.0), [(5.0, 5.0, "hello")])
+
+
+class PartitionSegmentsTests(SimpleTestCase):
+    class Embedder:
+        def embed(self, texts):
+            return [np.ones(2, dtype=np.float32) / np.sqrt(2)] * len(texts)
+
+    def test_overlong_segment_is_split_with_interpolated_times(self):
+        text = " ".join(["word"] * 100)
+        elements = partition_segments(
+            [(10.0, 20.0, text)], "lecture_transcription.txt", "lecture.mp4", self.Embedder(),
+            max_characters=120, new_after_n_chars=100, combine_under_n_chars=0, overlap=0,
+        )
+
+        self.assertGreater(len(elements), 1)
+        self.assertTrue(all(len(element["text"]) <= 120 for element in elements))
+        self.assertEqual(" ".join(element["text"] for element in elements), text)
+        times = [(element["metadata"]["start_s"], element["metadata"]["end_s"]) for element in elements]
+        self.assertEqual((times[0][0], times[-1][1]), (10.0, 20.0))
+        self.assertTrue(all(previous[1] == current[0] for previous, current in zip(times, times[1:])))
+
+
+class PackBatchesTests(SimpleTestCase):
+    def test_balanced_batches_under_quota(self):
+        pages = {"a.pdf": 600, "b.pdf": 500, "c.pdf": 400, "d.pdf": 300}
+        batches = pack_batches(pages, 1000)
+
+        self.assertEqual(sorted(map(sorted, batches)), [["a.pdf", "d.pdf"], ["b.pdf", "c.pdf"]])
+        self.assertTrue(all(sum(pages[document] for document in batch) <= 1000 for batch in batches))
+
+    def test_adds_a_batch_when_the_fewest_do_not_fit(self):
+        #1800 pages fit two batches by total, but three 600-page documents never share one
+        pages = {"a.pdf": 600, "b.pdf": 600, "c.pdf": 600}
+        self.assertEqual(sorted(map(sorted, pack_batches(pages, 1000))), [["a.pdf"], ["b.pdf"], ["c.pdf"]])
+
+    def test_oversized_document_gets_its_own_batch(self):
+        batches = pack_batches({"book.pdf": 1500, "syllabus.pdf": 10}, 1000)
+        self.assertEqual(batches, [["syllabus.pdf"], ["book.pdf"]])
+
+    def test_no_documents(self):
+        self.assertEqual(pack_batches({}, 1000), [])
+
+
+class ChunkSpansTests(SimpleTestCase):
+    #six 50-character units and two orthogonal topics
+    texts = [f"{'x' * 49}{number}" for number in range(6)]
+    topic_a, topic_b = np.eye(2, dtype=np.float32)
+
+    def spans(self, vectors, max_characters=1000, new_after_n_chars=800, combine_under_n_chars=60, overlap=0):
+        return chunk_spans(self.texts, vectors, 0.5, max_characters, new_after_n_chars, combine_under_n_chars, overlap)
+
+    def test_splits_where_the_topic_changes(self):
+        vectors = [self.topic_a] * 3 + [self.topic_b] * 3
+        self.assertEqual(self.spans(vectors), [(0, 2), (3, 5)])
+
+    def test_short_chunks_are_combined_regardless_of_topic(self):
+        vectors = [self.topic_a, self.topic_b] + [self.topic_b] * 4
+        self.assertEqual(self.spans(vectors)[0], (0, 5))
+
+    def test_length_limits(self):
+        vectors = [self.topic_a] * 6
+        self.assertEqual(self.spans(vectors, max_characters=120), [(0, 1), (2, 3), (4, 5)])
+        self.assertEqual(self.spans(vectors, new_after_n_chars=100), [(0, 1), (2, 3), (4, 5)])
+
+    def test_overlap_repeats_trailing_units(self):
+        vectors = [self.topic_a] * 6
+        self.assertEqual(
+            self.spans(vectors, max_characters=120, overlap=60),
+            [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)],
+        )
+
+    def test_boundaries_are_deterministic(self):
+        vectors = list(np.random.default_rng(0).normal(size=(6, 8)).astype(np.float32))
+        vectors = [vector / np.linalg.norm(vector) for vector in vectors]
+        self.assertEqual(self.spans(vectors), self.spans(vectors))
+
+
+class LexicalIndexTests(SimpleTestCase):
+    docs = [
+        {"id": "v1", "document_id": "syllabus.pdf", "text": "MATH 342 meets on Tuesdays. The midterm is in week 8.", "source": {}},
+        {"id": "v2", "document_id": "lecture1.txt", "text": "Eigenvalues and eigenvectors of a matrix.", "source": {}},
+        {"id": "v3", "document_id": "lecture2.txt", "text": "The midterm covers eigenvalues. Eigenvalues again, eigenvalues everywhere.", "source": {}},
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        lexical.build(self.docs, self.directory)
+        self.index = lexical.LexicalIndex(self.directory)
+
+    def ids(self, query, top_k=10):
+        return [result["id"] for result in self.index.search(query, top_k)]
+
+    def test_ranks_by_term_frequency(self):
+        self.assertEqual(self.ids("eigenvalues"), ["v3", "v2"])
+
+    def test_rare_terms_outweigh_common_ones(self):
+        #'tuesdays' appears once in the corpus, 'midterm' twice
+        self.assertEqual(self.ids("midterm tuesdays")[0], "v1")
+
+    def test_course_codes_match_as_one_term(self):
+        self.assertIn("math342", lexical.tokenize("MATH 342"))
+        self.assertEqual(self.ids("math342"), ["v1"])
+
+    def test_no_match_and_top_k(self):
+        self.assertEqual(self.ids("photosynthesis"), [])
+        self.assertEqual(len(self.ids("eigenvalues midterm", top_k=1)), 1)
+
+
+class FuseTests(SimpleTestCase):
+    @staticmethod
+    def ranking(*ids):
+        return [{"id": chunk_id, "text": chunk_id, "source": {}} for chunk_id in ids]
+
+    def test_chunks_ranked_by_both_sides_come_first(self):
+        fused = retrieval.fuse([self.ranking("a", "b", "c"), self.ranking("c", "d")], 10)
+        self.assertEqual(fused[0]["id"], "c")
+        self.assertEqual({result["id"] for result in fused}, {"a", "b", "c", "d"})
+
+    def test_scores_are_reciprocal_ranks(self):
+        with self.settings(RRF_K=60):
+            fused = retrieval.fuse([self.ranking("a"), self.ranking("b", "a")], 1)
+        self.assertEqual([result["id"] for result in fused], ["a"])
+        self.assertAlmostEqual(fused[0]["score"], 1 / 61 + 1 / 62)
+
+
+class LocalIndexTests(SimpleTestCase):
+    dimension = 16
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        LocalIndex.create(self.directory, self.dimension, "float32")
+        self.index = LocalIndex(self.directory, compact_after=1000)
+        self.vectors = np.random.default_rng(0).normal(size=(50, self.dimension)).astype(np.float32)
+
+    def upsert(self, numbers, namespace="", **metadata):
+        self.index.upsert([
+            {"id": f"v{number}", "values": self.vectors[number], "metadata": {"number": number, **metadata}}
+            for number in numbers
+        ], namespace=namespace)
+
+    def top_id(self, vector, **kwargs):
+        return self.index.query(vector=vector, top_k=1, **kwargs).matches[0].id
+
+    def test_query_before_and_after_compaction(self):
+        self.upsert(range(50))
+        self.assertEqual(self.top_id(self.vectors[7]), "v7")
+        self.assertEqual(self.index.collection().pending(), 50)
+
+        self.index.compact()
+        self.assertEqual(self.index.collection().pending(), 0)
+        self.assertEqual(self.index.describe_index_stats()["total_vector_count"], 50)
+        self.assertEqual(self.top_id(self.vectors[7]), "v7")
+
+    def test_delete_and_replace(self):
+        self.upsert(range(50))
+        self.index.compact()
+        self.index.delete(["v7"])
+        self.assertNotEqual(self.top_id(self.vectors[7]), "v7")
+
+        #upserting an existing id replaces its vector
+        self.index.upsert([{"id": "v8", "values": self.vectors[7], "metadata": {}}])
+        self.assertEqual(self.top_id(self.vectors[7]), "v8")
+
+        self.index.compact()
+        self.assertEqual(self.index.describe_index_stats()["total_vector_count"], 49)
+        self.assertEqual(self.top_id(self.vectors[7]), "v8")
+
+    def test_metadata_filter(self):
+        self.upsert(range(0, 25), source="a.pdf")
+        self.upsert(range(25, 50), source="b.pdf")
+        self.index.compact()
+
+        response = self.index.query(vector=self.vectors[3], top_k=10, filter={"source": {"$in": ["b.pdf"]}}, include_metadata=True)
+        self.assertEqual(len(response.matches), 10)
+        self.assertTrue(all(match.metadata["source"] == "b.pdf" for match in response.matches))
+        self.assertEqual(self.top_id(self.vectors[3], filter={"source": "a.pdf"}), "v3")
+
+    def test_namespaces_are_separate(self):
+        self.upsert(range(10), namespace="Intro_Bio_data")
+        self.upsert(range(10, 30), namespace="Chem_data")
+
+        stats = self.index.describe_index_stats()
+        self.assertEqual(stats["namespaces"], {"Chem_data": {"vector_count": 20}, "Intro_Bio_data": {"vector_count": 10}})
+        self.assertIn(self.top_id(self.vectors[12], namespace="Intro_Bio_data"), {f"v{number}" for number in range(10)})
+        self.assertEqual(self.top_id(self.vectors[12], namespace="Chem_data"), "v12")
+
+    def test_probing_every_list_is_exact(self):
+        vectors = np.random.default_rng(1).normal(size=(IVF_MIN_VECTORS * 2, self.dimension)).astype(np.float32)
+        self.index.upsert([{"id": f"w{number}", "values": vector} for number, vector in enumerate(vectors)])
+        self.index.compact()
+        lists = len(self.index.collection().centroids)
+        self.assertGreater(lists, 1)
+
+        self.index.nprobe = lists
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        query = normalized[5] + normalized[6]
+        expected = [f"w{number}" for number in np.argsort(-(normalized @ query))[:5]]
+        self.assertEqual([match.id for match in self.index.query(vector=query, top_k=5).matches], expected)
+
+    def test_create_rejects_another_dimension(self):
+        self.assertFalse(LocalIndex.create(self.directory, self.dimension, "float32"))
+        with self.assertRaises(ValueError):
+            LocalIndex.create(self.directory, self.dimension * 2, "float32")
+
+
+class CodecTests(SimpleTestCase):
+    dimension = 32
+
+    def setUp(self):
+        self.vectors = normalize(np.random.default_rng(0).normal(size=(600, self.dimension)))
+        self.query = self.vectors[0]
+
+    def test_float16_round_trip(self):
+        codec = get_codec("float16", self.dimension)
+        np.testing.assert_allclose(codec.decode(codec.encode(self.vectors)), self.vectors, atol=1e-3)
+        self.assertEqual(codec.code_size(), self.dimension * 2)
+
+    def test_int8_round_trip_within_half_a_step(self):
+        codec = get_codec("int8", self.dimension)
+        codec.train(self.vectors)
+        codes = codec.encode(self.vectors)
+
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertTrue(np.all(np.abs(codec.decode(codes) - self.vectors) <= codec.step / 2 + 1e-6))
+        np.testing.assert_allclose(codec.scorer(self.query)(codes), codec.decode(codes) @ self.query, rtol=1e-4, atol=1e-4)
+
+        restored = ScalarQuantizer(self.dimension, codec.state())
+        np.testing.assert_array_equal(restored.encode(self.vectors), codes)
+
+    def test_pq_lookup_scores_match_decoded_vectors(self):
+        codec = get_codec("pq", self.dimension, subspaces=8)
+        codec.train(self.vectors)
+        codes = codec.encode(self.vectors)
+
+        self.assertEqual(codes.shape, (len(self.vectors), 8))
+        self.assertEqual(codec.code_size(), 8)
+        np.testing.assert_allclose(codec.scorer(self.query)(codes), codec.decode(codes) @ self.query, rtol=1e-4, atol=1e-5)
+
+        restored = ProductQuantizer(self.dimension, codec.state())
+        np.testing.assert_array_equal(restored.encode(self.vectors), codes)
+        self.assertEqual(len(codec.encode(self.vectors[:0])), 0)
+
+    def test_pq_reconstruction_is_closer_than_the_zero_vector(self):
+        codec = get_codec("pq", self.dimension, subspaces=8)
+        codec.train(self.vectors)
+        error = np.linalg.norm(codec.decode(codec.encode(self.vectors)) - self.vectors, axis=1).mean()
+        self.assertLess(error, 1.0)
+
+    def test_invalid_codecs(self):
+        with self.assertRaises(ValueError):
+            get_codec("pq", self.dimension, subspaces=5)
+        with self.assertRaises(ValueError):
+            get_codec("int4", self.dimension)
+
+    def test_truncate_renormalizes(self):
+        shortened = truncate(self.vectors, 8)
+        self.assertEqual(shortened.shape, (len(self.vectors), 8))
+        np.testing.assert_allclose(np.linalg.norm(shortened, axis=1), 1.0, rtol=1e-5)
+
+    def test_local_index_reranks_lossy_codes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        LocalIndex.create(directory, self.dimension, "int8")
+        index = LocalIndex(directory, rerank=4)
+        index.upsert([{"id": f"v{number}", "values": vector} for number, vector in enumerate(self.vectors)])
+        index.compact()
+
+        match = index.query(vector=self.vectors[42], top_k=1).matches[0]
+        self.assertEqual(match.id, "v42")
+        self.assertAlmostEqual(match.score, 1.0, places=2)
+
+    def test_lossy_codes_keep_no_float16_copy_by_default(self):
+        sizes = {}
+        for rerank in (0, 4):
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+            LocalIndex.create(directory, self.dimension, "int8")
+            index = LocalIndex(directory, rerank=rerank)
+            index.upsert([{"id": f"v{number}", "values": vector} for number, vector in enumerate(self.vectors)])
+            index.compact()
+            sizes[rerank] = index.collection().size_on_disk()
+            self.assertEqual(index.query(vector=self.vectors[7], top_k=1).matches[0].id, "v7")
+
+        #the rerank copy is two bytes per dimension on top of the one-byte codes
+        self.assertGreaterEqual(sizes[4] - sizes[0], len(self.vectors) * self.dimension * 2)
+
+
+class RenderOpenMetricsTests(SimpleTestCase):
+    def render(self, totals):
+        redis = mock.Mock()
+        hashes = {metrics._key("runs"): {}, metrics._key("totals"): totals, metrics._key("wall_buckets"): {}}
+        redis.hgetall.side_effect = lambda key: hashes[key]
+        redis.zrevrange.return_value = []
+        with mock.patch("transcript.metrics.get_redis", return_value=redis):
+            return metrics.render_openmetrics()
+
+    def test_counters_keep_full_precision(self):
+        text = self.render({
+            b"upload_files|Intro_Bio_data|bytes_out": b"1234567891",
+            b"upload_files|Intro_Bio_data|cpu_s": b"0.123456789",
+        })
+        self.assertIn('pipeline_task_bytes_out_total{task="upload_files",class_name="Intro_Bio_data"} 1234567891\n', text)
+        self.assertIn('pipeline_task_cpu_seconds_total{task="upload_files",class_name="Intro_Bio_data"} 0.123456789\n', text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis commands the answer cache uses; pipelines run immediately."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.stream_ids = 0
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+    def _get(self, key, default):
+        if key in self.expiry and self.expiry[key] <= time.time():
+            self.delete(key)
+        return self.data.setdefault(key, default)
+
+    def get(self, key):
+        value = self._get(key, None)
+        return value.encode() if isinstance(value, str) else value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        if ex:
+            self.expiry[key] = time.time() + ex
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def hset(self, key, field, value):
+        self._get(key, {})[field.encode()] = value
+
+    def hgetall(self, key):
+        return dict(self._get(key, {}))
+
+    def hmget(self, key, fields):
+        return [self._get(key, {}).get(field.encode()) for field in fields]
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self._get(key, {}).pop(field.encode(), None)
+
+    def hlen(self, key):
+        return len(self._get(key, {}))
+
+    def hkeys(self, key):
+        return list(self._get(key, {}))
+
+    def zadd(self, key, mapping):
+        self._get(key, {}).update({member.encode(): score for member, score in mapping.items()})
+
+    def zrem(self, key, *members):
+        for member in members:
+            self._get(key, {}).pop(member.encode(), None)
+
+    def zcard(self, key):
+        return len(self._get(key, {}))
+
+    def zpopmin(self, key, count):
+        members = sorted(self._get(key, {}).items(), key=lambda item: item[1])[:count]
+        for member, _ in members:
+            del self.data[key][member]
+        return members
+
+    def zrangebyscore(self, key, low, high):
+        return [member for member, score in sorted(self._get(key, {}).items(), key=lambda item: item[1]) if low <= score <= high]
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.stream_ids += 1
+        entry_id = f"{self.stream_ids}-0".encode()
+        self._get(key, []).append((entry_id, {name.encode(): value.encode() for name, value in fields.items()}))
+        return entry_id
+
+    def xrange(self, key, min="-", max="+"):
+        entries = self._get(key, [])
+        return [entry for entry in entries if min == "-" or int(entry[0].split(b"-")[0]) >= int(min.split(b"-")[0])]
+
+    def xrevrange(self, key, count=None):
+        return list(reversed(self._get(key, [])))[:count]
+
+
+@override_settings(ANSWER_CACHE_THRESHOLD=0.95, ANSWER_CACHE_TTL_S=60, ANSWER_CACHE_MAX_ENTRIES=1000)
+class AnswerCacheTests(SimpleTestCase):
+    class_name = "Intro_Bio_data"
+    midterm, office_hours = np.eye(4, dtype=np.float32)[:2]
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch("transcript.answer_cache._redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        mirrors = mock.patch.dict(answer_cache._mirrors, clear=True)
+        mirrors.start()
+        self.addCleanup(mirrors.stop)
+
+    def store(self, question, vector, answer):
+        answer_cache.store(self.class_name, question, vector, answer, [])
+
+    def test_similar_question_hits(self):
+        self.store("When is the midterm?", self.midterm, "Week 8.")
+        nearby = normalize(self.midterm + 0.05 * self.office_hours)
+
+        self.assertEqual(answer_cache.lookup(self.class_name, nearby)["answer"], "Week 8.")
+        self.assertEqual(answer_cache.stats(self.class_name)["hits"], 1)
+
+    def test_different_question_misses(self):
+        self.store("When is the midterm?", self.midterm, "Week 8.")
+
+        self.assertIsNone(answer_cache.lookup(self.class_name, self.office_hours))
+        self.assertEqual(answer_cache.stats(self.class_name)["misses"], 1)
+
+    def test_expired_answers_miss_and_their_vectors_are_purged(self):
+        now = time.time()
+        with mock.patch("time.time", return_value=now):
+            self.store("When is the midterm?", self.midterm, "Week 8.")
+        with mock.patch("time.time", return_value=now + 61):
+            self.store("When are office hours?", self.office_hours, "Tuesdays.")
+            self.assertEqual(answer_cache.stats(self.class_name)["entries"], 1)
+            self.assertIsNone(answer_cache.lookup(self.class_name, self.midterm))
+
+    def test_mirror_catches_up_without_reloading(self):
+        self.store("When is the midterm?", self.midterm, "Week 8.")
+        with mock.patch.object(self.redis, "hgetall", wraps=self.redis.hgetall) as hgetall, \
+                mock.patch.object(self.redis, "hmget", wraps=self.redis.hmget) as hmget:
+            self.assertIsNone(answer_cache.lookup(self.class_name, self.office_hours))
+            self.store("When are office hours?", self.office_hours, "Tuesdays.")
+            self.assertEqual(answer_cache.lookup(self.class_name, self.office_hours)["answer"], "Tuesdays.")
+
+            #the first lookup read every vector, the second only the new one
+            self.assertEqual(hgetall.call_count, 1)
+            self.assertEqual(hmget.call_count, 1)
+            self.assertEqual(len(hmget.call_args.args[1]), 1)
+
+        answer_cache.invalidate(self.class_name)
+        self.assertIsNone(answer_cache.lookup(self.class_name, self.midterm))
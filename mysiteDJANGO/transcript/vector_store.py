@@ -0,0 +1,115 @@
+#where vectors live: pinecone, or a local IVF index on disk, selected by VECTOR_STORE
+import logging
+import os
+
+from django.conf import settings
+
+#logging for vector store selection
+logger = logging.getLogger(__name__)
+
+
+class IndexNotFound(ValueError):
+    """The index (a class's, or the shared one) hasn't been created yet."""
+
+
+class VectorStore:
+    """Common interface: ensure_index(name, dimension) and index(name) -> a Pinecone-Index-shaped object.
+
+    Indexes support upsert(vectors, namespace), delete(ids, namespace), query(...) returning
+    .matches, and describe_index_stats(), so the ledger and retrieval work against either store.
+    """
+
+    name = None
+
+    def ensure_index(self, index_name, dimension, timeout=300):
+        """Create the index if it doesn't exist; returns True if created."""
+        raise NotImplementedError
+
+    def index(self, index_name):
+        raise NotImplementedError
+
+    def index_missing(self, error):
+        """Whether error, raised opening or querying an index, means the index doesn't exist."""
+        return isinstance(error, IndexNotFound)
+
+    def optimize(self, index_name):
+        """Called after a sync's writes; stores that buffer writes fold them in here."""
+
+
+class PineconeStore(VectorStore):
+    name = "pinecone"
+
+    def ensure_index(self, index_name, dimension, timeout=300):
+        from transcript.clients import get_pinecone
+        from transcript.vectors import ensure_index
+        return ensure_index(get_pinecone(), index_name, dimension, timeout=timeout)
+
+    def index(self, index_name):
+        from transcript.clients import get_pinecone
+        return get_pinecone().Index(index_name)
+
+    def index_missing(self, error):
+        #pinecone hands out handles to any name, the first request to a missing index is a 404
+        from pinecone.exceptions import NotFoundException
+        return isinstance(error, NotFoundException)
+
+
+class LocalStore(VectorStore):
+    """Per-index directories under LOCAL_VECTOR_STORE_DIR; no network, shared by processes on one host."""
+
+    name = "local"
+
+    def __init__(self, directory, codec="float16", codec_options=None, nprobe=8, compact_after=1000, rerank=0):
+        self.directory = directory
+        self.codec = codec
+        self.codec_options = codec_options or {}
+        self.nprobe = nprobe
+        self.compact_after = compact_after
+        self.rerank = rerank
+
+    def _path(self, index_name):
+        return os.path.join(self.directory, index_name)
+
+    def ensure_index(self, index_name, dimension, timeout=300):
+        from transcript.local_index import LocalIndex
+        return LocalIndex.create(self._path(index_name), dimension, self.codec, **self.codec_options)
+
+    def index(self, index_name):
+        from transcript.local_index import LocalIndex
+        if not os.path.exists(os.path.join(self._path(index_name), "index.json")):
+            raise IndexNotFound(f"Local index {index_name} does not exist, create it with bootstrap_vector_index or an ingest")
+        return LocalIndex(self._path(index_name), nprobe=self.nprobe, compact_after=self.compact_after, rerank=self.rerank)
+
+    def optimize(self, index_name):
+        self.index(index_name).compact()
+
+
+STORES = {
+    PineconeStore.name: PineconeStore,
+    LocalStore.name: LocalStore,
+}
+
+
+def _codec_options():
+    if settings.LOCAL_VECTOR_STORE_CODEC == "pq" and settings.LOCAL_VECTOR_STORE_PQ_SUBSPACES:
+        return {"subspaces": settings.LOCAL_VECTOR_STORE_PQ_SUBSPACES}
+    return {}
+
+
+def get_store():
+    """Build the vector store selected in settings."""
+    if settings.VECTOR_STORE == LocalStore.name:
+        store = LocalStore(
+            settings.LOCAL_VECTOR_STORE_DIR,
+            codec=settings.LOCAL_VECTOR_STORE_CODEC,
+            codec_options=_codec_options(),
+            nprobe=settings.LOCAL_VECTOR_STORE_NPROBE,
+            compact_after=settings.LOCAL_VECTOR_STORE_COMPACT_AFTER,
+            rerank=settings.LOCAL_VECTOR_STORE_RERANK,
+        )
+    elif settings.VECTOR_STORE == PineconeStore.name:
+        store = PineconeStore()
+    else:
+        raise ValueError(f"Unknown VECTOR_STORE {settings.VECTOR_STORE!r}, choose from {sorted(STORES)}")
+    logger.info(f"Using vector store {store.name}")
+    return store
@@ -0,0 +1,136 @@
+#turning embedded unstructured elements into pinecone vectors, and writing them concurrently
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+#logging for vector writes
+logger = logging.getLogger(__name__)
+
+#element metadata worth keeping on a vector, pinecone rejects nulls and nested objects
+VECTOR_METADATA_KEYS = ("filename", "filetype", "page_number", "video", "start_s", "end_s")
+
+#pinecone caps deletes at 1000 ids per request
+DELETE_BATCH_SIZE = 1000
+
+
+def vector_id(class_name, document_id, sha256, chunk_index):
+    """Stable id for a chunk, so re-running a document overwrites its vectors instead of duplicating them.
+
+    Two documents of a class can hold the same bytes, so the document is part of the id (hashed, to
+    keep ids short whatever the blob name); otherwise removing one would delete the other's vectors.
+    """
+    document_key = hashlib.sha256(document_id.encode()).hexdigest()[:16]
+    return f"{class_name}:{sha256}:{document_key}:{chunk_index:05d}"
+
+
+def index_name_for(class_name):
+    """The shared index when one is configured, else the class's own index."""
+    if settings.PINECONE_SHARED_INDEX:
+        return settings.PINECONE_SHARED_INDEX
+    return class_name.lower().replace("_", "-").replace(" ", "-").strip()
+
+
+def namespace_for(class_name):
+    """Namespace holding a class's vectors; '' (the default namespace) unless namespaces are per class."""
+    if settings.PINECONE_SHARED_INDEX or settings.PINECONE_NAMESPACE_PER_CLASS:
+        return class_name
+    return ""
+
+
+def class_filter(class_name):
+    """Metadata filter restricting a query to one class's vectors, for indexes shared across classes."""
+    return {"class_name": {"$eq": class_name}}
+
+
+def ensure_index(pc, index_name, dimension, timeout=300):
+    """Create a serverless index if it doesn't exist and wait until it's ready; returns True if created.
+
+    dimension follows the configured embedder; an existing index of another dimension is an error.
+    """
+    from pinecone import ServerlessSpec
+
+    if index_name in [index_info["name"] for index_info in pc.list_indexes()]:
+        existing = pc.describe_index(index_name).dimension
+        if existing != dimension:
+            raise ValueError(f"Index {index_name} has dimension {existing}, the configured embedder produces {dimension}")
+        return False
+
+    pc.create_index(
+        name=index_name,
+        dimension=dimension,
+        metric="cosine",
+        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+    )
+
+    #readiness usually takes a few seconds, back off instead of hammering describe_index
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    while not pc.describe_index(index_name).status["ready"]:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index {index_name} was not ready after {timeout}s")
+        logger.debug(f"Waiting for index {index_name} to be ready...")
+        time.sleep(delay)
+        delay = min(delay * 2, 8)
+    return True
+
+
+def element_to_vector(element, class_name, document_id, sha256, chunk_index):
+    metadata = {
+        key: value
+        for key, value in element.get("metadata", {}).items()
+        if key in VECTOR_METADATA_KEYS and value is not None
+    }
+    metadata["text"] = element.get("text", "")
+    metadata["element_type"] = element.get("type", "")
+    metadata["class_name"] = class_name
+    metadata["sha256"] = sha256
+    return {
+        "id": vector_id(class_name, document_id, sha256, chunk_index),
+        "values": element["embeddings"],
+        "metadata": metadata,
+    }
+
+
+def _write_batches(function, items, batch_size):
+    """Call function(batch) for every batch of items on a bounded pool; re-raises the first failure."""
+    batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+    if not batches:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(settings.VECTOR_WRITE_WORKERS, len(batches))) as pool:
+        futures = [pool.submit(function, batch) for batch in batches]
+    for future in futures:
+        future.result()
+
+
+def upsert_vectors(index, vectors, namespace=""):
+    _write_batches(
+        lambda batch: index.upsert(vectors=batch, namespace=namespace),
+        vectors,
+        settings.VECTOR_UPSERT_BATCH_SIZE,
+    )
+    return len(vectors)
+
+
+def delete_vectors(index, vector_ids, namespace=""):
+    """Delete vectors by id in batches; returns the number of ids deleted."""
+    _write_batches(
+        lambda batch: index.delete(ids=batch, namespace=namespace),
+        vector_ids,
+        DELETE_BATCH_SIZE,
+    )
+    return len(vector_ids)
+
+
+def upsert_elements(index, elements, class_name, document_id, sha256, namespace=""):
+    """Upsert a document's embedded elements under deterministic ids; returns the ids written."""
+    vectors = [
+        element_to_vector(element, class_name, document_id, sha256, chunk_index)
+        for chunk_index, element in enumerate(elements)
+        if element.get("embeddings")
+    ]
+    upsert_vectors(index, vectors, namespace)
+    return [vector["id"] for vector in vectors]